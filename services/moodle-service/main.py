@@ -5,24 +5,244 @@ This service provides REST API endpoints for interacting with Moodle platform.
 It uses Selenium for web scraping to fetch course and assignment data.
 """
 
-from fastapi import FastAPI, HTTPException, Depends, Header
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import uvicorn
+import asyncio
+import hashlib
+import json
+import atexit
 import os
+import re
+import time
 from dotenv import load_dotenv
 from scraper.adapter import MoodleService
+from scraper.driver_pool import DriverPool
+from scraper.session_cache import SessionCache
+from scraper.selector_cache import SelectorCache
+from scraper.snapshot_cache import SnapshotCache, user_key
+from scraper.snapshot_store import SnapshotStore
+from scraper.executor import OperationCancelled, ServiceExecutor
+from scraper.jobs import SyncJobManager
+from scraper.delta import DeltaStore
+from scraper.single_flight import SingleFlight
+from scraper.api_client_registry import APIClientRegistry
+from scraper.resilience import CircuitBreakerRegistry, CircuitOpenError, RetryPolicy
+from scraper.rate_limiter import RateLimiterRegistry
+from scraper.scheduler import SyncScheduler
+from scraper.metrics import QUEUE_WAIT_SECONDS, StatsGaugeCollector, register_collector, stats_value
+from scraper.tracing import configure_logging, configure_tracing, request_context, span, tracing_stats
 
 # Load environment variables
 load_dotenv()
 
+# Logging: level, and "text" or "json" lines (each tagged with the request/job ID)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Tracing spans are appended to this JSON lines file (empty disables tracing)
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+
+log_listener = configure_logging(LOG_LEVEL, LOG_FORMAT)
+atexit.register(log_listener.stop)
+configure_tracing(TRACE_EXPORT_PATH)
+
+# Accepted client-supplied X-Request-ID values (others are replaced)
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Scrape mode: "selenium" drives Chrome for every page, "http" logs in with
+# Chrome once and fetches course pages over plain HTTP
+MOODLE_SCRAPE_MODE = os.getenv("MOODLE_SCRAPE_MODE", "selenium").lower()
+
+# Concurrent per-course scraping
+SCRAPE_COURSE_WORKERS = int(os.getenv("SCRAPE_COURSE_WORKERS", 3))
+SCRAPE_COURSE_TIMEOUT = float(os.getenv("SCRAPE_COURSE_TIMEOUT", 60))
+
+# Chrome driver pool configuration (DRIVER_POOL_SIZE=0 disables pooling)
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", 2))
+DRIVER_POOL_MIN_IDLE = int(os.getenv("DRIVER_POOL_MIN_IDLE", 1))
+DRIVER_POOL_IDLE_TIMEOUT = float(os.getenv("DRIVER_POOL_IDLE_TIMEOUT", 300))
+DRIVER_POOL_MAX_PAGES = int(os.getenv("DRIVER_POOL_MAX_PAGES", 200))
+# SSO sites whose storage is cleared when a pooled browser changes user (comma-separated origins)
+DRIVER_POOL_SSO_ORIGINS = [
+    origin.strip() for origin in os.getenv("DRIVER_POOL_SSO_ORIGINS", "https://inccu.nccu.edu.tw").split(",") if origin.strip()
+]
+
+# Login session cache (SESSION_CACHE_TTL=0 disables caching)
+SESSION_CACHE_DIR = os.getenv("SESSION_CACHE_DIR", "~/.cache/moodle-service/sessions")
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", 4 * 3600))
+SESSION_CACHE_KEY = os.getenv("SESSION_CACHE_KEY")
+
+# Learned login / course-list selectors per Moodle site
+SELECTOR_CACHE_PATH = os.getenv("SELECTOR_CACHE_PATH", "~/.cache/moodle-service/selectors.json")
+
+# Concurrent course content requests during an API-mode sync
+MOODLE_API_CONCURRENCY = int(os.getenv("MOODLE_API_CONCURRENCY", 4))
+# Seconds an unused Web Services client (and its cached token) is kept
+API_CLIENT_IDLE_TIMEOUT = float(os.getenv("API_CLIENT_IDLE_TIMEOUT", 900))
+
+# Retries of idempotent WS calls and page loads (capped exponential backoff with jitter)
+MOODLE_RETRY_ATTEMPTS = int(os.getenv("MOODLE_RETRY_ATTEMPTS", 3))
+MOODLE_RETRY_BASE_DELAY = float(os.getenv("MOODLE_RETRY_BASE_DELAY", 0.5))
+MOODLE_RETRY_MAX_DELAY = float(os.getenv("MOODLE_RETRY_MAX_DELAY", 8))
+# Per-site circuit breaker: open after N consecutive failures, probe again after the timeout
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30))
+
+# Politeness limit per Moodle site, shared by all users (MOODLE_RATE_LIMIT=0 disables it)
+MOODLE_RATE_LIMIT = float(os.getenv("MOODLE_RATE_LIMIT", 5))
+MOODLE_RATE_BURST = int(os.getenv("MOODLE_RATE_BURST", 10))
+
+# Per-user snapshot cache serving the read endpoints
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", 300))
+SNAPSHOT_STALE_TTL = float(os.getenv("SNAPSHOT_STALE_TTL", 1800))
+SNAPSHOT_MAX_ENTRIES = int(os.getenv("SNAPSHOT_MAX_ENTRIES", 100))
+
+# Durable SQLite snapshot store surviving restarts (empty SNAPSHOT_STORE_PATH disables it)
+SNAPSHOT_STORE_PATH = os.getenv("SNAPSHOT_STORE_PATH", "~/.cache/moodle-service/snapshots.db")
+SNAPSHOT_STORE_KEEP = int(os.getenv("SNAPSHOT_STORE_KEEP", 3))
+SNAPSHOT_STORE_MAX_AGE = float(os.getenv("SNAPSHOT_STORE_MAX_AGE", 7 * 86400))
+
+# Blocking Moodle calls run on a bounded worker pool, off the event loop
+SERVICE_MAX_CONCURRENCY = int(os.getenv("SERVICE_MAX_CONCURRENCY", max(DRIVER_POOL_SIZE, 1)))
+
+# Seconds a finished background sync job is kept for polling
+SYNC_JOB_RETENTION = float(os.getenv("SYNC_JOB_RETENTION", 3600))
+
+# Delta sync cursors remembered per user (older cursors get a full result)
+DELTA_CURSORS_PER_USER = int(os.getenv("DELTA_CURSORS_PER_USER", 5))
+
+# Background sync of registered users (SCHEDULER_WORKERS=0 disables it)
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", 1))
+SCHEDULER_INTERVAL = float(os.getenv("SCHEDULER_INTERVAL", 900))
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", 0.1))
+SCHEDULER_DEADLINE_WINDOW = float(os.getenv("SCHEDULER_DEADLINE_WINDOW", 48 * 3600))
+SCHEDULER_RETRY_DELAY = float(os.getenv("SCHEDULER_RETRY_DELAY", 60))
+SCHEDULER_MAX_BACKOFF = float(os.getenv("SCHEDULER_MAX_BACKOFF", 3600))
+
+# Sync progress event stream: check for new events / send keepalive comments (seconds)
+SSE_POLL_INTERVAL = 0.5
+SSE_KEEPALIVE_INTERVAL = 15
+
+service_executor = ServiceExecutor(max_workers=SERVICE_MAX_CONCURRENCY)
+snapshot_cache = SnapshotCache(
+    ttl=SNAPSHOT_TTL,
+    stale_ttl=SNAPSHOT_STALE_TTL,
+    max_entries=SNAPSHOT_MAX_ENTRIES,
+    executor=service_executor
+)
+sync_jobs = SyncJobManager(service_executor, retention=SYNC_JOB_RETENTION)
+single_flight = SingleFlight()
+retry_policy = RetryPolicy(
+    max_attempts=MOODLE_RETRY_ATTEMPTS,
+    base_delay=MOODLE_RETRY_BASE_DELAY,
+    max_delay=MOODLE_RETRY_MAX_DELAY
+)
+circuit_breakers = CircuitBreakerRegistry(
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=CIRCUIT_RESET_TIMEOUT
+)
+rate_limiters = RateLimiterRegistry(rate=MOODLE_RATE_LIMIT, burst=MOODLE_RATE_BURST) if MOODLE_RATE_LIMIT > 0 else None
+api_clients = APIClientRegistry(
+    idle_timeout=API_CLIENT_IDLE_TIMEOUT,
+    retry_policy=retry_policy,
+    circuit_breakers=circuit_breakers,
+    rate_limiters=rate_limiters
+)
+delta_store = DeltaStore(cursors_per_user=DELTA_CURSORS_PER_USER, max_users=SNAPSHOT_MAX_ENTRIES)
+sync_scheduler: Optional[SyncScheduler] = None
+snapshot_store: Optional[SnapshotStore] = None
+driver_pool: Optional[DriverPool] = None
+session_cache: Optional[SessionCache] = None
+selector_cache: Optional[SelectorCache] = None
+
+# Gauges read from the components' stats() on each /metrics scrape
+_BREAKER_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+gauges = StatsGaugeCollector()
+gauges.add("moodle_driver_pool_idle", "Idle pooled browsers", [],
+           lambda: stats_value(driver_pool.stats() if driver_pool else None, "idle"))
+gauges.add("moodle_driver_pool_leased", "Pooled browsers in use", [],
+           lambda: stats_value(driver_pool.stats() if driver_pool else None, "leased"))
+gauges.add("moodle_executor_active", "Service calls running", [],
+           lambda: stats_value(service_executor.stats(), "active"))
+gauges.add("moodle_executor_queued", "Service calls waiting for a worker", [],
+           lambda: stats_value(service_executor.stats(), "queued"))
+gauges.add("moodle_scheduler_users", "Users registered for background sync", [],
+           lambda: stats_value(sync_scheduler.stats() if sync_scheduler else None, "users"))
+gauges.add("moodle_scheduler_running", "Background syncs running", [],
+           lambda: stats_value(sync_scheduler.stats() if sync_scheduler else None, "running"))
+gauges.add("moodle_scheduler_due", "Background syncs due but not started", [],
+           lambda: stats_value(sync_scheduler.stats() if sync_scheduler else None, "due"))
+gauges.add("moodle_api_clients", "Cached Web Service clients", [],
+           lambda: stats_value(api_clients.stats(), "clients"))
+gauges.add("moodle_single_flight_in_flight", "Coalesced calls in flight", [],
+           lambda: stats_value(single_flight.stats(), "in_flight"))
+gauges.add("moodle_snapshot_cache_entries", "Snapshots held in memory", [],
+           lambda: stats_value(snapshot_cache.stats(), "entries"))
+gauges.add("moodle_rate_limit_waiting", "Requests waiting for a rate limit token", ["base_url"],
+           lambda: [({"base_url": name}, s["waiting"]) for name, s in (rate_limiters.stats() if rate_limiters else {}).items()])
+gauges.add("moodle_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["base_url"],
+           lambda: [({"base_url": name}, _BREAKER_STATE_VALUES[s["state"]]) for name, s in circuit_breakers.stats().items()])
+register_collector(gauges)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start shared resources on startup and release them on shutdown"""
+    global driver_pool, session_cache, selector_cache, sync_scheduler, snapshot_store
+    selector_cache = SelectorCache(SELECTOR_CACHE_PATH)
+    if SNAPSHOT_STORE_PATH:
+        snapshot_store = SnapshotStore(SNAPSHOT_STORE_PATH, keep=SNAPSHOT_STORE_KEEP, max_age=SNAPSHOT_STORE_MAX_AGE)
+        snapshot_cache.store = snapshot_store
+    if SESSION_CACHE_TTL > 0:
+        session_cache = SessionCache(SESSION_CACHE_DIR, ttl=SESSION_CACHE_TTL, key=SESSION_CACHE_KEY)
+    if DRIVER_POOL_SIZE > 0:
+        driver_pool = DriverPool(
+            size=DRIVER_POOL_SIZE,
+            min_idle=DRIVER_POOL_MIN_IDLE,
+            idle_timeout=DRIVER_POOL_IDLE_TIMEOUT,
+            max_pages=DRIVER_POOL_MAX_PAGES,
+            sso_origins=DRIVER_POOL_SSO_ORIGINS
+        )
+        driver_pool.start()
+    if SCHEDULER_WORKERS > 0:
+        sync_scheduler = SyncScheduler(
+            run_scheduled_sync,
+            workers=SCHEDULER_WORKERS,
+            interval=SCHEDULER_INTERVAL,
+            jitter=SCHEDULER_JITTER,
+            deadline_window=SCHEDULER_DEADLINE_WINDOW,
+            retry_delay=SCHEDULER_RETRY_DELAY,
+            max_backoff=SCHEDULER_MAX_BACKOFF,
+            forget=lambda base_url, username, password: snapshot_cache.delete_user(user_key(base_url, username, password))
+        )
+        sync_scheduler.start()
+    try:
+        yield
+    finally:
+        if sync_scheduler:
+            sync_scheduler.close()
+            sync_scheduler = None
+        service_executor.shutdown()
+        api_clients.close()
+        if snapshot_store:
+            snapshot_cache.store = None
+            snapshot_store.close()
+            snapshot_store = None
+        if driver_pool:
+            driver_pool.close()
+            driver_pool = None
+
 # Create FastAPI app
 app = FastAPI(
     title="Moodle Integration Service",
     description="REST API for Moodle course and assignment data extraction",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -35,6 +255,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Tag the request's logs and spans with its X-Request-ID (generated when absent)"""
+    request_id = request.headers.get("X-Request-ID", "")
+    with request_context(request_id if REQUEST_ID_PATTERN.match(request_id) else None) as request_id:
+        with span("http.request", method=request.method, path=request.url.path) as current:
+            response = await call_next(request)
+            current.set(status=response.status_code)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 # API Key Authentication
 API_KEY = os.getenv("API_KEY", "default-secret-key")
 
@@ -44,6 +275,83 @@ def verify_api_key(x_api_key: str = Header(...)):
         raise HTTPException(status_code=403, detail="Invalid API Key")
     return x_api_key
 
+def create_service(base_url: str, username: str, password: str) -> MoodleService:
+    """Create a MoodleService backed by the shared driver pool and session cache"""
+    # 政大 Moodle 未啟用 Web Services API，使用 Selenium
+    return MoodleService(
+        base_url=base_url,
+        username=username,
+        password=password,
+        headless=True,
+        use_api=False,  # 政大不支援 API，使用 Selenium
+        driver_pool=driver_pool,
+        session_cache=session_cache,
+        browserless=MOODLE_SCRAPE_MODE == "http",
+        course_workers=SCRAPE_COURSE_WORKERS,
+        course_timeout=SCRAPE_COURSE_TIMEOUT,
+        selector_cache=selector_cache,
+        snapshot_cache=snapshot_cache,
+        snapshot_store=snapshot_store,
+        delta_store=delta_store,
+        single_flight=single_flight,
+        api_concurrency=MOODLE_API_CONCURRENCY,
+        api_clients=api_clients,
+        retry_policy=retry_policy,
+        circuit_breakers=circuit_breakers,
+        rate_limiters=rate_limiters
+    )
+
+def run_scheduled_sync(base_url: str, username: str, password: str) -> Dict[str, Any]:
+    """
+    Run a background scheduler sync on the service executor
+
+    Scheduled syncs thus share SERVICE_MAX_CONCURRENCY and the driver pool
+    with request traffic instead of starting browsers on top of it.
+    """
+    future, _ = service_executor.submit(create_service(base_url, username, password).sync_all)
+    return future.result()
+
+async def run_service(fn, *args, request: Request, response: Response, **kwargs):
+    """
+    Run a blocking MoodleService call on the service executor
+
+    Reports the time spent waiting for a worker in the X-Queue-Wait header,
+    cancels the call when the client disconnects and answers 503 while the
+    Moodle site's circuit breaker is open.
+    """
+    try:
+        result, queue_wait = await service_executor.run(fn, *args, request=request, **kwargs)
+    except OperationCancelled:
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))})
+    QUEUE_WAIT_SECONDS.observe(queue_wait)
+    response.headers["X-Queue-Wait"] = f"{queue_wait:.3f}"
+    return result
+
+def make_etag(body: Any) -> str:
+    """Strong ETag of a response body (hash of its canonical JSON)"""
+    payload = json.dumps(body, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32] + '"'
+
+def conditional_response(body: Any, response: Response, if_none_match: Optional[str]) -> Any:
+    """
+    Tag a response body with an ETag, answering 304 when the client already has it
+
+    Bodies come from the snapshot cache when it is populated, so a matching
+    If-None-Match is answered without scraping.
+    """
+    etag = make_etag(body)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    if if_none_match:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in candidates or etag in candidates:
+            # Keep headers already set on the response (e.g. X-Queue-Wait)
+            headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+            return Response(status_code=304, headers=headers)
+    return body
+
 # Request/Response Models
 class LoginRequest(BaseModel):
     username: str = Field(..., description="Moodle username/student ID")
@@ -92,12 +400,78 @@ class SyncResponse(BaseModel):
     courses_count: int
     assignments_count: int
     data: Dict[str, Any]
+    stats: Optional[Dict[str, Any]] = None
+
+class DeltaSyncRequest(SyncRequest):
+    since: Optional[str] = Field(None, description="Cursor returned by the previous delta sync")
+
+class DeltaSyncResponse(BaseModel):
+    success: bool
+    message: str
+    courses_count: int
+    assignments_count: int
+    cursor: Optional[str] = None
+    full: bool
+    changes_count: int
+    delta: Dict[str, Any]
+    synced_at: Optional[str] = None
+    stats: Optional[Dict[str, Any]] = None
+
+class ScheduledUserResponse(BaseModel):
+    user_id: str
+    base_url: str
+    username: str
+    running: bool
+    urgent: bool
+    next_run_in: float
+    syncs: int
+    failures: int
+    registered_at: str
+    last_run_at: Optional[str] = None
+    last_success_at: Optional[str] = None
+    last_error: Optional[str] = None
+    next_deadline: Optional[str] = None
+
+class SyncJobResponse(BaseModel):
+    job_id: str
+    status: str
+    progress: Dict[str, Any]
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    result: Optional[SyncResponse] = None
+    error: Optional[str] = None
 
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "moodle-integration-service"}
+    breakers = circuit_breakers.stats()
+    return {
+        "status": "degraded" if any(b["state"] != "closed" for b in breakers.values()) else "healthy",
+        "service": "moodle-integration-service",
+        "driver_pool": driver_pool.stats() if driver_pool else None,
+        "session_cache": session_cache.stats() if session_cache else None,
+        "selector_cache": selector_cache.stats() if selector_cache else None,
+        "snapshot_cache": snapshot_cache.stats(),
+        "snapshot_store": await run_in_threadpool(snapshot_store.stats) if snapshot_store else None,
+        "executor": service_executor.stats(),
+        "sync_jobs": sync_jobs.stats(),
+        "delta_store": delta_store.stats(),
+        "single_flight": single_flight.stats(),
+        "api_clients": api_clients.stats(),
+        "retries": retry_policy.stats(),
+        "circuit_breakers": breakers,
+        "rate_limits": rate_limiters.stats() if rate_limiters else None,
+        "scheduler": sync_scheduler.stats() if sync_scheduler else None,
+        "tracing": tracing_stats()
+    }
+
+# Prometheus metrics endpoint
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics (latency histograms, error/retry counters, pool and queue gauges)"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 # Root endpoint
 @app.get("/")
@@ -114,6 +488,8 @@ async def root():
 @app.post("/api/moodle/login", response_model=LoginResponse)
 async def login(
     request: LoginRequest,
+    http_request: Request,
+    response: Response,
     api_key: str = Depends(verify_api_key)
 ):
     """
@@ -126,22 +502,21 @@ async def login(
         if not base_url:
             raise HTTPException(status_code=400, detail="Moodle base URL is required")
 
-        # 政大 Moodle 未啟用 Web Services API，使用 Selenium
-        service = MoodleService(
-            base_url=base_url,
-            username=request.username,
-            password=request.password,
-            headless=True,
-            use_api=False  # 政大不支援 API，使用 Selenium
-        )
+        service = create_service(base_url, request.username, request.password)
 
-        result = service.login()
+        result = await run_service(service.login, request=http_request, response=response)
         return LoginResponse(**result)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
 
 @app.get("/api/moodle/courses", response_model=List[Course])
 async def get_courses(
+    http_request: Request,
+    response: Response,
+    refresh: bool = False,
+    if_none_match: Optional[str] = Header(None),
     api_key: str = Depends(verify_api_key)
 ):
     """
@@ -149,6 +524,8 @@ async def get_courses(
 
     Returns a list of courses the authenticated user is enrolled in.
     Uses credentials from environment variables.
+    Served from the latest snapshot unless refresh=true.
+    Supports conditional requests via ETag / If-None-Match.
     """
     try:
         base_url = os.getenv("MOODLE_BASE_URL")
@@ -161,23 +538,24 @@ async def get_courses(
                 detail="Moodle credentials not configured in environment"
             )
 
-        # 政大 Moodle 未啟用 Web Services API，使用 Selenium
-        service = MoodleService(
-            base_url=base_url,
-            username=username,
-            password=password,
-            headless=True,
-            use_api=False  # 政大不支援 API，使用 Selenium
-        )
+        service = create_service(base_url, username, password)
 
-        courses = service.get_courses()
-        return courses
+        courses = await run_service(
+            service.get_courses, refresh=refresh, request=http_request, response=response
+        )
+        return conditional_response(courses, response, if_none_match)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch courses: {str(e)}")
 
 @app.get("/api/moodle/courses/{course_id}", response_model=CourseDetail)
 async def get_course_detail(
     course_id: str,
+    http_request: Request,
+    response: Response,
+    refresh: bool = False,
+    if_none_match: Optional[str] = Header(None),
     api_key: str = Depends(verify_api_key)
 ):
     """
@@ -185,6 +563,8 @@ async def get_course_detail(
 
     Returns course details including all course contents and activities.
     Uses credentials from environment variables.
+    Served from the latest snapshot unless refresh=true.
+    Supports conditional requests via ETag / If-None-Match.
     """
     try:
         base_url = os.getenv("MOODLE_BASE_URL")
@@ -197,21 +577,16 @@ async def get_course_detail(
                 detail="Moodle credentials not configured in environment"
             )
 
-        # 政大 Moodle 未啟用 Web Services API，使用 Selenium
-        service = MoodleService(
-            base_url=base_url,
-            username=username,
-            password=password,
-            headless=True,
-            use_api=False  # 政大不支援 API，使用 Selenium
-        )
+        service = create_service(base_url, username, password)
 
-        course = service.get_course_detail(course_id)
+        course = await run_service(
+            service.get_course_detail, course_id, refresh=refresh, request=http_request, response=response
+        )
 
         if not course:
             raise HTTPException(status_code=404, detail="Course not found")
 
-        return course
+        return conditional_response(course, response, if_none_match)
     except HTTPException:
         raise
     except Exception as e:
@@ -219,7 +594,11 @@ async def get_course_detail(
 
 @app.get("/api/moodle/assignments", response_model=List[Assignment])
 async def get_assignments(
+    http_request: Request,
+    response: Response,
     course_id: Optional[str] = None,
+    refresh: bool = False,
+    if_none_match: Optional[str] = Header(None),
     api_key: str = Depends(verify_api_key)
 ):
     """
@@ -227,6 +606,8 @@ async def get_assignments(
 
     Optionally filter by course_id.
     Uses credentials from environment variables.
+    Served from the latest snapshot unless refresh=true.
+    Supports conditional requests via ETag / If-None-Match.
     """
     try:
         base_url = os.getenv("MOODLE_BASE_URL")
@@ -239,23 +620,24 @@ async def get_assignments(
                 detail="Moodle credentials not configured in environment"
             )
 
-        # 政大 Moodle 未啟用 Web Services API，使用 Selenium
-        service = MoodleService(
-            base_url=base_url,
-            username=username,
-            password=password,
-            headless=True,
-            use_api=False  # 政大不支援 API，使用 Selenium
-        )
+        service = create_service(base_url, username, password)
 
-        assignments = service.get_assignments(course_id=course_id)
-        return assignments
+        assignments = await run_service(
+            service.get_assignments, course_id=course_id, refresh=refresh,
+            request=http_request, response=response
+        )
+        return conditional_response(assignments, response, if_none_match)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch assignments: {str(e)}")
 
 @app.post("/api/moodle/sync", response_model=SyncResponse)
 async def sync_moodle_data(
     request: SyncRequest,
+    http_request: Request,
+    response: Response,
+    wait: bool = True,
     api_key: str = Depends(verify_api_key)
 ):
     """
@@ -264,32 +646,237 @@ async def sync_moodle_data(
     This endpoint scrapes all courses and assignments from Moodle
     and returns the complete dataset. This can take several minutes
     depending on the number of courses.
+
+    With wait=false the sync runs as a background job: the response is
+    202 with a job ID to poll at GET /api/moodle/sync/{job_id}. A sync
+    already running for the same user is reused instead of starting another.
     """
     try:
         base_url = request.base_url or os.getenv("MOODLE_BASE_URL")
         if not base_url:
             raise HTTPException(status_code=400, detail="Moodle base URL is required")
 
-        # 政大 Moodle 未啟用 Web Services API，使用 Selenium
-        service = MoodleService(
-            base_url=base_url,
-            username=request.username,
-            password=request.password,
-            headless=True,
-            use_api=False  # 政大不支援 API，使用 Selenium
-        )
+        service = create_service(base_url, request.username, request.password)
 
-        result = service.sync_all()
+        if not wait:
+            job, created = sync_jobs.submit(
+                user_key(base_url, request.username, request.password),
+                service.sync_all
+            )
+            return JSONResponse(
+                status_code=202,
+                content={**job.to_dict(), "deduplicated": not created},
+                headers={"Location": f"/api/moodle/sync/{job.id}"}
+            )
+
+        result = await run_service(service.sync_all, request=http_request, response=response)
         return SyncResponse(**result)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Sync failed: {str(e)}")
 
+@app.post("/api/moodle/sync/delta", response_model=DeltaSyncResponse)
+async def delta_sync_moodle_data(
+    request: DeltaSyncRequest,
+    http_request: Request,
+    response: Response,
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Perform a full sync but return only changes since a previous sync
+
+    Pass the cursor from the previous response as "since". The delta lists
+    added, changed and removed courses, sections, activities and assignments.
+    Without a cursor, or with one that has expired, "full" is true and
+    everything is reported as added.
+    """
+    try:
+        base_url = request.base_url or os.getenv("MOODLE_BASE_URL")
+        if not base_url:
+            raise HTTPException(status_code=400, detail="Moodle base URL is required")
+
+        service = create_service(base_url, request.username, request.password)
+
+        result = await run_service(service.sync_delta, request.since, request=http_request, response=response)
+        return DeltaSyncResponse(**result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Delta sync failed: {str(e)}")
+
+@app.post("/api/moodle/sync/stream")
+async def stream_sync_moodle_data(
+    request: SyncRequest,
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Perform a full sync, streaming results as NDJSON
+
+    Emits one {"type": "course", "course": ..., "assignments": [...]} line per
+    course as soon as it has been parsed (in completion order), followed by a
+    {"type": "summary", ...} line with the sync_all() counts. The sync is
+    cancelled if the client disconnects.
+    """
+    base_url = request.base_url or os.getenv("MOODLE_BASE_URL")
+    if not base_url:
+        raise HTTPException(status_code=400, detail="Moodle base URL is required")
+
+    service = create_service(base_url, request.username, request.password)
+
+    loop = asyncio.get_running_loop()
+    records: asyncio.Queue = asyncio.Queue()
+
+    def on_record(record: Dict[str, Any]):
+        loop.call_soon_threadsafe(records.put_nowait, record)
+
+    future, cancel_event = service_executor.submit(service.stream_sync, on_record)
+    finished = asyncio.wrap_future(future)
+
+    def ndjson(record: Dict[str, Any]) -> str:
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    async def record_stream():
+        try:
+            while not finished.done():
+                next_record = asyncio.ensure_future(records.get())
+                await asyncio.wait({next_record, finished}, return_when=asyncio.FIRST_COMPLETED)
+                if next_record.done():
+                    yield ndjson(next_record.result())
+                else:
+                    next_record.cancel()
+
+            while not records.empty():
+                yield ndjson(records.get_nowait())
+
+            try:
+                summary = finished.result()
+            except Exception as e:
+                summary = {"type": "summary", "success": False, "message": f"Sync failed: {str(e)}"}
+            yield ndjson(summary)
+        finally:
+            service_executor.cancel(future, cancel_event)
+
+    return StreamingResponse(record_stream(), media_type="application/x-ndjson")
+
+@app.get("/api/moodle/sync/{job_id}", response_model=SyncJobResponse)
+async def get_sync_job(
+    job_id: str,
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Get status, progress and result of a background sync job
+
+    Finished jobs are kept for SYNC_JOB_RETENTION seconds.
+    """
+    job = sync_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return job.to_dict()
+
+@app.get("/api/moodle/sync/{job_id}/events")
+async def stream_sync_job_events(
+    job_id: str,
+    http_request: Request,
+    last_event_id: Optional[str] = Header(None),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Stream progress of a background sync job as Server-Sent Events
+
+    Each event is named after its phase (browser_start, login, course_list,
+    course_done, finished) and carries elapsed seconds plus courses_done /
+    courses_total. The stream ends with a "complete" event holding the job
+    status. Reconnecting clients resume after the Last-Event-ID header.
+    """
+    if sync_jobs.events_since(job_id) is None:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+
+    async def event_stream():
+        nonlocal after
+        last_sent = time.monotonic()
+        while not await http_request.is_disconnected():
+            state = sync_jobs.events_since(job_id, after)
+            if state is None:
+                return
+            events, done = state
+            for event in events:
+                after = event["seq"]
+                yield f"id: {event['seq']}\nevent: {event['phase']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                last_sent = time.monotonic()
+            if done:
+                return
+            if time.monotonic() - last_sent > SSE_KEEPALIVE_INTERVAL:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def require_scheduler() -> SyncScheduler:
+    if not sync_scheduler:
+        raise HTTPException(status_code=503, detail="Background sync scheduler is disabled")
+    return sync_scheduler
+
+@app.post("/api/moodle/scheduler/users", response_model=ScheduledUserResponse, status_code=201)
+async def register_scheduled_user(
+    request: SyncRequest,
+    response: Response,
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Register a user for periodic background sync
+
+    The user's data is re-synced every SCHEDULER_INTERVAL seconds (users with
+    an assignment due within SCHEDULER_DEADLINE_WINDOW first), keeping the
+    snapshot cache warm so reads never wait on a scrape. Failed syncs are
+    retried with exponential backoff. Credentials are kept in memory only,
+    so users have to be registered again after a restart. Registering an
+    already scheduled user returns it with status 200; a new password
+    replaces the old one.
+
+    Deadline priority only applies in API mode: scraped assignments carry no
+    due dates, so in Selenium mode users are synced in next-run order.
+    """
+    scheduler = require_scheduler()
+    base_url = request.base_url or os.getenv("MOODLE_BASE_URL")
+    if not base_url:
+        raise HTTPException(status_code=400, detail="Moodle base URL is required")
+
+    user, created = await run_in_threadpool(scheduler.register, base_url, request.username, request.password)
+    if not created:
+        response.status_code = 200
+    return scheduler.user_dict(user)
+
+@app.get("/api/moodle/scheduler/users", response_model=List[ScheduledUserResponse])
+async def list_scheduled_users(api_key: str = Depends(verify_api_key)):
+    """List users registered for background sync and the state of their syncs"""
+    return require_scheduler().users()
+
+@app.delete("/api/moodle/scheduler/users/{user_id}", status_code=204)
+async def unregister_scheduled_user(
+    user_id: str,
+    api_key: str = Depends(verify_api_key)
+):
+    """Stop background sync for a user (and forget their credentials and stored snapshots)"""
+    scheduler = require_scheduler()
+    if not await run_in_threadpool(scheduler.unregister, user_id):
+        raise HTTPException(status_code=404, detail="Scheduled user not found")
+    return Response(status_code=204)
+
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.detail}
+        content={"detail": exc.detail},
+        headers=getattr(exc, "headers", None)
     )
 
 @app.exception_handler(Exception)
@@ -3,14 +3,34 @@ Adapter module to convert Moodle scraper output to API response format
 Supports both Selenium scraping and Moodle Web Services API
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Optional, Tuple, Union
 from datetime import datetime
+import threading
+import time
 from .moodle_scraper import MoodleScraper
+from .http_scraper import MoodleHTTPScraper
 from .moodle_api_client import MoodleAPIClient
+from .api_client_registry import APIClientRegistry
+from .sync_planner import CourseContentsCallback, SyncPlanner
+from .driver_pool import DriverPool
+from .session_cache import SessionCache
+from .selector_cache import SelectorCache
+from .snapshot_cache import SnapshotCache, user_key
+from .snapshot_store import KIND_SYNC, SnapshotStore
+from .progress import ProgressCallback, ProgressReporter
+from .delta import DeltaStore, count_changes, diff
+from .single_flight import SingleFlight
+from .resilience import CircuitBreakerRegistry, CircuitOpenError, RetryPolicy
+from .rate_limiter import RateLimiterRegistry
+from .metrics import MODE_API, MODE_HTTP, MODE_SELENIUM, SYNC_SECONDS
+from .tracing import span
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Activity types (as scraped) that are assignments
+ASSIGNMENT_TYPES = ["assign", "assignment", "作業"]
+
 
 class MoodleAdapter:
     """Adapter to convert scraped data to API response format"""
@@ -24,9 +44,9 @@ class MoodleAdapter:
             course_data: Raw course data from scraper
 
         Returns:
-            Formatted course data
+            Formatted course data ("error" is kept when the course page failed to load)
         """
-        return {
+        course = {
             "id": course_data.get("id", ""),
             "name": course_data.get("name", ""),
             "url": course_data.get("url", ""),
@@ -34,6 +54,9 @@ class MoodleAdapter:
             "teacher": course_data.get("teacher", ""),
             "semester": course_data.get("semester", ""),
         }
+        if course_data.get("error"):
+            course["error"] = course_data["error"]
+        return course
 
     @staticmethod
     def convert_course_content(content_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -67,6 +90,33 @@ class MoodleAdapter:
 
         return formatted_contents
 
+    @staticmethod
+    def convert_api_course_content(content_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Convert course content from Web Services API format to API format
+
+        Args:
+            content_data: Sections from MoodleAPIClient.get_course_contents()
+
+        Returns:
+            Formatted course contents
+        """
+        return [
+            {
+                "section_name": section['name'],
+                "activities": [
+                    {
+                        "type": activity['modname'],
+                        "name": activity['name'],
+                        "url": activity.get('url', ''),
+                        "description": activity.get('description', ''),
+                    }
+                    for activity in section['activities']
+                ]
+            }
+            for section in content_data
+        ]
+
     @staticmethod
     def convert_assignment(assignment_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -89,6 +139,28 @@ class MoodleAdapter:
             "description": assignment_data.get("description", ""),
         }
 
+    @staticmethod
+    def convert_api_assignment(assignment_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Convert assignment data from Web Services API format to API format
+
+        Args:
+            assignment_data: Assignment from MoodleAPIClient.get_assignments()
+
+        Returns:
+            Formatted assignment data
+        """
+        return {
+            "id": assignment_data['id'],
+            "course_id": assignment_data['course_id'],
+            "course_name": assignment_data['course_name'],
+            "name": assignment_data['name'],
+            "due_date": datetime.fromtimestamp(assignment_data['duedate']).isoformat() if assignment_data.get('duedate') else None,
+            "status": "pending",  # API doesn't provide status, would need separate call
+            "url": assignment_data['url'],
+            "description": assignment_data.get('intro', ''),
+        }
+
     @staticmethod
     def extract_assignments_from_courses(courses_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -111,21 +183,38 @@ class MoodleAdapter:
                 for section in course["sections"]:
                     for activity in section.get("activities", []):
                         # If activity is an assignment
-                        if activity.get("type", "").lower() in ["assign", "assignment", "作業"]:
-                            assignment = {
-                                "id": activity.get("url", "").split("id=")[-1] if "id=" in activity.get("url", "") else "",
-                                "course_id": course_id,
-                                "course_name": course_name,
-                                "name": activity.get("name", ""),
-                                "due_date": activity.get("due_date", None),
-                                "status": activity.get("status", "pending"),
-                                "url": activity.get("url", ""),
-                                "description": activity.get("description", ""),
-                            }
-                            assignments.append(assignment)
+                        if (activity.get("type") or "").lower() in ASSIGNMENT_TYPES:
+                            assignments.append(
+                                MoodleAdapter.activity_to_assignment(course_id, course_name, activity)
+                            )
 
         return assignments
 
+    @staticmethod
+    def activity_to_assignment(course_id: str, course_name: str, activity: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Convert a scraped assignment activity to API format
+
+        Args:
+            course_id: ID of the activity's course
+            course_name: Name of the activity's course
+            activity: Activity with name, url and (optionally) due_date, status, description
+
+        Returns:
+            Formatted assignment
+        """
+        url = activity.get("url") or ""
+        return {
+            "id": url.split("id=")[-1] if "id=" in url else "",
+            "course_id": course_id,
+            "course_name": course_name,
+            "name": activity.get("name") or "",
+            "due_date": activity.get("due_date", None),
+            "status": activity.get("status", "pending"),
+            "url": url,
+            "description": activity.get("description", ""),
+        }
+
 
 class MoodleService:
     """Service class to handle Moodle operations"""
@@ -137,7 +226,22 @@ class MoodleService:
         password: str = None,
         token: str = None,
         headless: bool = True,
-        use_api: bool = True
+        use_api: bool = True,
+        driver_pool: Optional[DriverPool] = None,
+        session_cache: Optional[SessionCache] = None,
+        browserless: bool = False,
+        course_workers: int = 1,
+        course_timeout: Optional[float] = None,
+        selector_cache: Optional[SelectorCache] = None,
+        snapshot_cache: Optional[SnapshotCache] = None,
+        delta_store: Optional[DeltaStore] = None,
+        single_flight: Optional[SingleFlight] = None,
+        api_concurrency: int = 4,
+        api_clients: Optional[APIClientRegistry] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+        rate_limiters: Optional[RateLimiterRegistry] = None,
+        snapshot_store: Optional[SnapshotStore] = None
     ):
         """
         Initialize Moodle service
@@ -149,6 +253,21 @@ class MoodleService:
             token: Web Service Token (optional, if available)
             headless: Whether to run browser in headless mode (for Selenium)
             use_api: Whether to use Web Services API (True) or Selenium scraper (False)
+            driver_pool: Shared Chrome driver pool (Selenium mode, headless only)
+            session_cache: Encrypted login cookie cache (Selenium mode)
+            browserless: Log in with Selenium only, then fetch pages over HTTP (Selenium mode)
+            course_workers: Number of courses scraped concurrently (Selenium mode)
+            course_timeout: Per-course scrape timeout in seconds (Selenium mode)
+            selector_cache: Learned login/course-list selector cache (Selenium mode)
+            snapshot_cache: Per-user cache of scrape_all() results (Selenium mode)
+            delta_store: Content hashes of previous syncs, for sync_delta()
+            single_flight: Shares identical concurrent scrapes/API calls between callers
+            api_concurrency: Concurrent course content requests during sync (API mode)
+            api_clients: Shared API clients with cached tokens (API mode)
+            retry_policy: Retries of idempotent WS calls and page loads
+            circuit_breakers: Per-site breakers that fail fast while Moodle is down
+            rate_limiters: Per-site request rate limits shared by every user of a site
+            snapshot_store: Durable store of scrape_all()/sync_all() results, serving reads while fresh
         """
         self.base_url = base_url
         self.username = username
@@ -156,19 +275,265 @@ class MoodleService:
         self.token = token
         self.headless = headless
         self.use_api = use_api
+        self.driver_pool = driver_pool
+        self.session_cache = session_cache
+        self.browserless = browserless
+        self.course_workers = course_workers
+        self.course_timeout = course_timeout
+        self.selector_cache = selector_cache
+        self.snapshot_cache = snapshot_cache
+        self.snapshot_store = snapshot_store
+        self.delta_store = delta_store or DeltaStore()
+        self.single_flight = single_flight
+        self.api_concurrency = api_concurrency
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = circuit_breakers.get(base_url) if circuit_breakers else None
+        self.rate_limiter = rate_limiters.get(base_url) if rate_limiters else None
         self.adapter = MoodleAdapter()
 
-        # Initialize API client if using API mode
-        if self.use_api:
+        # Initialize API client if using API mode (shared per account when a registry is given)
+        if self.use_api and api_clients:
+            self.api_client = api_clients.get(base_url, username, password, token)
+        elif self.use_api:
             self.api_client = MoodleAPIClient(
                 base_url=base_url,
                 username=username,
                 password=password,
-                token=token
+                token=token,
+                retry_policy=self.retry_policy,
+                breaker=self.breaker,
+                rate_limiter=self.rate_limiter
             )
         else:
             self.api_client = None
 
+    @property
+    def mode(self) -> str:
+        """How Moodle is accessed: MODE_API, MODE_HTTP (browserless) or MODE_SELENIUM"""
+        if self.use_api:
+            return MODE_API
+        return MODE_HTTP if self.browserless else MODE_SELENIUM
+
+    def _create_scraper(self, reporter: Optional[ProgressReporter] = None) -> Union[MoodleScraper, MoodleHTTPScraper]:
+        """Create a scraper bound to this service's credentials"""
+        scraper_cls = MoodleHTTPScraper if self.browserless else MoodleScraper
+        return scraper_cls(
+            self.base_url,
+            self.username,
+            self.password,
+            self.headless,
+            driver_pool=self.driver_pool,
+            session_cache=self.session_cache,
+            course_workers=self.course_workers,
+            course_timeout=self.course_timeout,
+            selector_cache=self.selector_cache,
+            progress=reporter,
+            retry_policy=self.retry_policy,
+            breaker=self.breaker,
+            rate_limiter=self.rate_limiter
+        )
+
+    def _plan_sync(self, reporter: ProgressReporter, on_course: Optional[CourseContentsCallback] = None) -> Dict[str, Any]:
+        """
+        Fetch everything an API-mode sync needs with one call per resource
+
+        Site info, enrolments and assignments are fetched once; course contents
+        are fetched concurrently (api_concurrency at a time). The token cached
+        by the (shared) API client is reused, and a token the planner had to
+        fetch again after invalidtoken is written back to it.
+
+        Returns:
+            SyncPlanner.run() result, including WS call and byte counts
+        """
+        token = self.api_client.token
+        planner = SyncPlanner(
+            self.base_url,
+            self.username,
+            self.password,
+            token=token,
+            max_concurrency=self.api_concurrency,
+            retry_policy=self.retry_policy,
+            breaker=self.breaker,
+            rate_limiter=self.rate_limiter
+        )
+        try:
+            return planner.run_sync(on_course, reporter)
+        finally:
+            self.api_client.replace_token(token, planner.token)
+
+    def _coalesce(self, op: str, fn: Callable[[], Any], **params: Any) -> Any:
+        """
+        Run fn, sharing it with identical concurrent calls for the same user
+
+        Args:
+            op: Operation name
+            fn: Call to run
+            **params: Operation parameters (part of the coalescing key)
+        """
+        if not self.single_flight:
+            return fn()
+        account = user_key(self.base_url, self.username or "", self.password or self.token or "")
+        key = "|".join([account, op, *(f"{name}={value}" for name, value in sorted(params.items()))])
+        return self.single_flight.do(key, fn, op=op)
+
+    def _scrape_all(self, reporter: Optional[ProgressReporter] = None) -> Dict[str, Any]:
+        """Run a full scrape with a fresh scraper"""
+        def scrape_all() -> Dict[str, Any]:
+            with self._create_scraper(reporter) as scraper:
+                return scraper.scrape_all()
+
+        # A scrape reporting progress or streaming courses cannot be shared:
+        # callers joining it would miss the events already emitted
+        if reporter and (reporter.callback or reporter.on_course):
+            return scrape_all()
+        return self._coalesce("scrape_all", scrape_all)
+
+    def _get_snapshot(self, refresh: bool = False, reporter: Optional[ProgressReporter] = None) -> Dict[str, Any]:
+        """
+        Get the latest scrape_all() result, from the snapshot cache when possible
+
+        Args:
+            refresh: Force a new scrape and replace the cached snapshot
+            reporter: Receives progress (and finished courses) of a new scrape
+
+        Returns:
+            Raw scraper output
+        """
+        if not self.snapshot_cache:
+            return self._scrape_all(reporter)
+
+        key = user_key(self.base_url, self.username, self.password)
+        return self.snapshot_cache.get_or_load(key, lambda: self._scrape_all(reporter), refresh=refresh)
+
+    def _get_course_snapshot(self, course_id: str, refresh: bool = False) -> Dict[str, Any]:
+        """
+        Get scraper output containing only one course
+
+        Served from a fresh full snapshot when one is cached (or stored, reading
+        only that course from the store's course index); a course missing from
+        it is not found, without scraping. Otherwise only that course page is
+        scraped, reusing cached course metadata so the course list does not
+        have to be loaded.
+
+        Args:
+            course_id: Course ID to fetch
+            refresh: Force a new scrape of the course
+
+        Returns:
+            Raw scraper output whose "courses" holds at most that course
+        """
+        course_meta = None
+        key = user_key(self.base_url, self.username, self.password)
+
+        if self.snapshot_cache:
+            cached = self.snapshot_cache.get_course(key, course_id)
+            if cached:
+                course, age = cached
+                if not refresh and age <= self.snapshot_cache.ttl:
+                    # A fresh full snapshot without the course means the user is not enrolled in it
+                    return {"courses": [course] if course else []}
+                if course:
+                    course_meta = {"id": course["id"], "name": course["name"], "url": course["url"]}
+
+        def scrape_course() -> Dict[str, Any]:
+            def run() -> Dict[str, Any]:
+                with self._create_scraper() as scraper:
+                    return scraper.scrape_course(course_id, course_meta)
+            return self._coalesce("scrape_course", run, course_id=course_id)
+
+        if not self.snapshot_cache:
+            return scrape_course()
+        # Single-course results only live in memory; the store keeps full snapshots
+        return self.snapshot_cache.get_or_load(
+            f"{key}|course:{course_id}", scrape_course, refresh=refresh, persist=False
+        )
+
+    def _convert_plan(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a SyncPlanner result to sync_all() data (courses with contents, assignments)"""
+        return {
+            "courses": [
+                {**course, "contents": self.adapter.convert_api_course_content(plan["contents"].get(course['id']) or [])}
+                for course in plan["courses"]
+            ],
+            "assignments": [self.adapter.convert_api_assignment(a) for a in plan["assignments"]],
+            "synced_at": datetime.now().isoformat()
+        }
+
+    def _persist_sync(self, data: Dict[str, Any]):
+        """Write sync_all() data to the snapshot store (API mode)"""
+        if not self.snapshot_store or not data.get("courses"):
+            return
+        try:
+            self.snapshot_store.put(self._store_key(), data, kind=KIND_SYNC)
+        except Exception as e:
+            logger.error(f"Failed to persist sync snapshot: {e}")
+
+    def _store_key(self) -> str:
+        """Snapshot store key of this account (a token stands in for the password in API mode)"""
+        return user_key(self.base_url, self.username or "", self.password or self.token or "")
+
+    def _stored_course(self, course_id: str, refresh: bool = False) -> Optional[Tuple[Optional[Dict[str, Any]], float]]:
+        """
+        One course of the latest sync_all() data from the store's course index while it is fresh (API mode)
+
+        Returns:
+            (course or None if the snapshot lacks it, age), or None when missing, stale or refreshing
+        """
+        if refresh or not self.snapshot_store or not self.snapshot_cache:
+            return None
+        try:
+            loaded = self.snapshot_store.get_course(self._store_key(), course_id, KIND_SYNC)
+        except Exception as e:
+            logger.error(f"Failed to read snapshot store: {e}")
+            return None
+        if loaded and loaded[1] <= self.snapshot_cache.ttl:
+            return loaded
+        return None
+
+    def _stored_assignments(self, course_id: Optional[str], refresh: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """
+        Assignments from the store's activity index while the stored snapshot is fresh (Selenium mode)
+
+        Only used when the snapshot is not in memory; the in-memory snapshot is cheaper to filter.
+
+        Returns:
+            Assignments, or None when missing, stale or refreshing
+        """
+        if refresh or not self.snapshot_store or not self.snapshot_cache:
+            return None
+        key = user_key(self.base_url, self.username, self.password)
+        if self.snapshot_cache.peek(key):
+            return None
+        try:
+            loaded = self.snapshot_store.activities(key, course_id=course_id, types=ASSIGNMENT_TYPES)
+        except Exception as e:
+            logger.error(f"Failed to read snapshot store: {e}")
+            return None
+        if not loaded or loaded[1] > self.snapshot_cache.ttl:
+            return None
+        return [
+            self.adapter.activity_to_assignment(row["course_id"], row["course_name"] or "", row)
+            for row in loaded[0]
+        ]
+
+    def _stored_sync(self, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Latest sync_all() data from the snapshot store while it is fresh (API mode)
+
+        Returns:
+            {"courses", "assignments", "synced_at"}, or None when missing, stale or refreshing
+        """
+        if refresh or not self.snapshot_store or not self.snapshot_cache:
+            return None
+        try:
+            loaded = self.snapshot_store.latest(self._store_key(), KIND_SYNC)
+        except Exception as e:
+            logger.error(f"Failed to read snapshot store: {e}")
+            return None
+        if loaded and loaded[1] <= self.snapshot_cache.ttl:
+            return loaded[0]
+        return None
+
     def login(self) -> Dict[str, Any]:
         """
         Login to Moodle (or test API connection)
@@ -193,19 +558,24 @@ class MoodleService:
                     }
             else:
                 # Use Selenium scraper
-                with MoodleScraper(self.base_url, self.username, self.password, self.headless) as scraper:
-                    if scraper.login():
-                        return {
+                def scraper_login() -> bool:
+                    with self._create_scraper() as scraper:
+                        return scraper.login()
+
+                if self._coalesce("login", scraper_login):
+                    return {
                             "success": True,
                             "message": "Successfully logged in to Moodle",
                             "session_id": "selenium-session"
                         }
-                    else:
-                        return {
-                            "success": False,
-                            "message": "Login failed",
-                            "session_id": None
-                        }
+                else:
+                    return {
+                        "success": False,
+                        "message": "Login failed",
+                        "session_id": None
+                    }
+        except CircuitOpenError:
+            raise
         except Exception as e:
             return {
                 "success": False,
@@ -213,208 +583,224 @@ class MoodleService:
                 "session_id": None
             }
 
-    def get_courses(self) -> List[Dict[str, Any]]:
+    def get_courses(self, refresh: bool = False) -> List[Dict[str, Any]]:
         """
         Get all enrolled courses
 
+        Args:
+            refresh: Bypass the snapshot cache and store and fetch again
+
         Returns:
             List of courses
         """
         try:
             if self.use_api:
+                stored = self._stored_sync(refresh)
+                if stored:
+                    return [{k: v for k, v in course.items() if k != "contents"} for course in stored["courses"]]
+
                 # Use API client
-                courses = self.api_client.get_user_courses()
+                courses = self._coalesce("api:get_user_courses", self.api_client.get_user_courses)
                 logger.info(f"✓ 使用 API 獲取 {len(courses)} 門課程")
                 return courses
             else:
                 # Use Selenium scraper
-                with MoodleScraper(self.base_url, self.username, self.password, self.headless) as scraper:
-                    raw_data = scraper.scrape_all()
+                raw_data = self._get_snapshot(refresh=refresh)
 
-                    if not raw_data or "courses" not in raw_data:
-                        return []
+                if not raw_data or "courses" not in raw_data:
+                    return []
 
-                    courses = [
-                        self.adapter.convert_course(course)
-                        for course in raw_data["courses"]
-                    ]
+                courses = [
+                    self.adapter.convert_course(course)
+                    for course in raw_data["courses"]
+                ]
 
-                    return courses
+                return courses
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Error getting courses: {e}")
             return []
 
-    def get_course_detail(self, course_id: str) -> Optional[Dict[str, Any]]:
+    def get_course_detail(self, course_id: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
         """
         Get detailed information about a specific course
 
         Args:
             course_id: Course ID to fetch
+            refresh: Bypass the snapshot cache and store and fetch again
 
         Returns:
             Course details with contents, or None if not found
         """
         try:
             if self.use_api:
+                stored = self._stored_course(course_id, refresh)
+                if stored:
+                    return stored[0]
+
                 # Use API client
-                contents = self.api_client.get_course_contents(int(course_id))
+                contents = self._coalesce(
+                    "api:get_course_contents",
+                    lambda: self.api_client.get_course_contents(int(course_id)),
+                    course_id=course_id
+                )
 
                 # Get basic course info from courses list
-                courses = self.api_client.get_user_courses()
+                courses = self._coalesce("api:get_user_courses", self.api_client.get_user_courses)
                 course_info = next((c for c in courses if c['id'] == course_id), None)
 
                 if course_info:
-                    # Convert API format to expected format
-                    formatted_contents = []
-                    for section in contents:
-                        formatted_section = {
-                            "section_name": section['name'],
-                            "activities": [
-                                {
-                                    "type": activity['modname'],
-                                    "name": activity['name'],
-                                    "url": activity.get('url', ''),
-                                    "description": activity.get('description', ''),
-                                }
-                                for activity in section['activities']
-                            ]
-                        }
-                        formatted_contents.append(formatted_section)
-
-                    course_info['contents'] = formatted_contents
+                    # Convert API format to expected format (a copy: the course list is shared
+                    # with concurrent callers through single-flight)
+                    course_info = {**course_info, 'contents': self.adapter.convert_api_course_content(contents)}
                     logger.info(f"✓ 使用 API 獲取課程 {course_id} 的詳細資訊")
                     return course_info
                 else:
                     return None
             else:
-                # Use Selenium scraper
-                with MoodleScraper(self.base_url, self.username, self.password, self.headless) as scraper:
-                    raw_data = scraper.scrape_all()
-
-                    if not raw_data or "courses" not in raw_data:
-                        return None
-
-                    # Find course by ID
-                    for course in raw_data["courses"]:
-                        if course.get("id") == course_id:
-                            course_info = self.adapter.convert_course(course)
-                            course_info["contents"] = self.adapter.convert_course_content(
-                                course.get("sections", [])
-                            )
-                            return course_info
+                # Use Selenium scraper (only the requested course is scraped)
+                raw_data = self._get_course_snapshot(course_id, refresh=refresh)
 
+                if not raw_data or "courses" not in raw_data:
                     return None
+
+                # Find course by ID
+                for course in raw_data["courses"]:
+                    if course.get("id") == course_id:
+                        course_info = self.adapter.convert_course(course)
+                        course_info["contents"] = self.adapter.convert_course_content(
+                            course.get("sections", [])
+                        )
+                        return course_info
+
+                return None
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Error getting course detail: {e}")
             return None
 
-    def get_assignments(self, course_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    def get_assignments(self, course_id: Optional[str] = None, refresh: bool = False) -> List[Dict[str, Any]]:
         """
         Get all assignments, optionally filtered by course
 
         Args:
             course_id: Optional course ID to filter assignments
+            refresh: Bypass the snapshot cache and store and fetch again
 
         Returns:
             List of assignments
         """
         try:
             if self.use_api:
+                stored = self._stored_sync(refresh)
+                if stored:
+                    return [
+                        a for a in stored["assignments"]
+                        if not course_id or str(a["course_id"]) == str(course_id)
+                    ]
+
                 # Use API client
                 course_ids = [int(course_id)] if course_id else None
-                assignments = self.api_client.get_assignments(course_ids=course_ids)
+                assignments = self._coalesce(
+                    "api:get_assignments",
+                    lambda: self.api_client.get_assignments(course_ids=course_ids),
+                    course_id=course_id
+                )
 
                 # Convert to expected format
-                formatted_assignments = []
-                for assignment in assignments:
-                    formatted_assignments.append({
-                        "id": assignment['id'],
-                        "course_id": assignment['course_id'],
-                        "course_name": assignment['course_name'],
-                        "name": assignment['name'],
-                        "due_date": datetime.fromtimestamp(assignment['duedate']).isoformat() if assignment.get('duedate') else None,
-                        "status": "pending",  # API doesn't provide status, would need separate call
-                        "url": assignment['url'],
-                        "description": assignment.get('intro', ''),
-                    })
+                formatted_assignments = [self.adapter.convert_api_assignment(a) for a in assignments]
 
                 logger.info(f"✓ 使用 API 獲取 {len(formatted_assignments)} 個作業")
                 return formatted_assignments
             else:
-                # Use Selenium scraper
-                with MoodleScraper(self.base_url, self.username, self.password, self.headless) as scraper:
-                    raw_data = scraper.scrape_all()
+                stored = self._stored_assignments(course_id, refresh)
+                if stored is not None:
+                    return stored
 
-                    if not raw_data or "courses" not in raw_data:
-                        return []
+                # Use Selenium scraper (only the requested course is scraped when filtered)
+                if course_id:
+                    raw_data = self._get_course_snapshot(course_id, refresh=refresh)
+                else:
+                    raw_data = self._get_snapshot(refresh=refresh)
 
-                    # Extract assignments from all courses
-                    assignments = self.adapter.extract_assignments_from_courses(raw_data["courses"])
+                if not raw_data or "courses" not in raw_data:
+                    return []
 
-                    # Filter by course_id if provided
-                    if course_id:
-                        assignments = [a for a in assignments if a["course_id"] == course_id]
+                # Extract assignments from all courses
+                assignments = self.adapter.extract_assignments_from_courses(raw_data["courses"])
 
-                    return assignments
+                # Filter by course_id if provided
+                if course_id:
+                    assignments = [a for a in assignments if a["course_id"] == course_id]
+
+                return assignments
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Error getting assignments: {e}")
             return []
 
-    def sync_all(self) -> Dict[str, Any]:
+    def sync_all(self, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
         """
         Perform full sync of all Moodle data
 
+        Args:
+            progress: Called with (phase, data) as the sync advances
+
         Returns:
             Sync result with data
         """
+        started = time.monotonic()
+        with span("service.sync", base_url=self.base_url, mode=self.mode) as current:
+            result = self._sync_all(progress)
+            current.set(success=result["success"], courses=result["courses_count"])
+        outcome = "success" if result["success"] else "failure"
+        SYNC_SECONDS.labels(self.base_url, self.mode, outcome).observe(time.monotonic() - started)
+        return result
+
+    def _sync_all(self, progress: Optional[ProgressCallback]) -> Dict[str, Any]:
         try:
             if self.use_api:
                 # Use API client
                 logger.info("開始使用 API 同步 Moodle 資料...")
 
-                # Get courses
-                courses = self.get_courses()
+                # Site info, enrolments and assignments once; contents per course
+                plan = self._plan_sync(ProgressReporter(progress))
 
-                # Get all assignments
-                assignments = self.get_assignments()
+                with span("adapter.convert", courses=len(plan["courses"])):
+                    data = self._convert_plan(plan)
+                courses, assignments = data["courses"], data["assignments"]
+                self._persist_sync(data)
 
-                # Get detailed contents for each course
-                for course in courses:
-                    try:
-                        course_detail = self.get_course_detail(course['id'])
-                        if course_detail and 'contents' in course_detail:
-                            course['contents'] = course_detail['contents']
-                    except Exception as e:
-                        logger.error(f"Failed to get contents for course {course['id']}: {e}")
-                        course['contents'] = []
-
-                logger.info(f"✓ API 同步完成: {len(courses)} 門課程, {len(assignments)} 個作業")
+                logger.info(
+                    f"✓ API 同步完成: {len(courses)} 門課程, {len(assignments)} 個作業, "
+                    f"{plan['stats']['ws_calls']} 次 Web Service 呼叫"
+                )
 
                 return {
                     "success": True,
                     "message": "Successfully synced Moodle data using API",
                     "courses_count": len(courses),
                     "assignments_count": len(assignments),
-                    "data": {
-                        "courses": courses,
-                        "assignments": assignments,
-                        "synced_at": datetime.now().isoformat()
-                    }
+                    "data": data,
+                    "stats": plan["stats"]
                 }
             else:
                 # Use Selenium scraper
-                with MoodleScraper(self.base_url, self.username, self.password, self.headless) as scraper:
-                    raw_data = scraper.scrape_all()
-
-                    if not raw_data or "courses" not in raw_data:
-                        return {
-                            "success": False,
-                            "message": "No data received from Moodle",
-                            "courses_count": 0,
-                            "assignments_count": 0,
-                            "data": {}
-                        }
+                raw_data = self._get_snapshot(refresh=True, reporter=ProgressReporter(progress))
+
+                if not raw_data or "courses" not in raw_data:
+                    return {
+                        "success": False,
+                        "message": "No data received from Moodle",
+                        "courses_count": 0,
+                        "assignments_count": 0,
+                        "data": {}
+                    }
 
+                with span("adapter.convert", courses=len(raw_data["courses"])):
                     # Convert courses
                     courses = [
                         {
@@ -427,17 +813,17 @@ class MoodleService:
                     # Extract assignments
                     assignments = self.adapter.extract_assignments_from_courses(raw_data["courses"])
 
-                    return {
-                        "success": True,
-                        "message": "Successfully synced Moodle data using Selenium",
-                        "courses_count": len(courses),
-                        "assignments_count": len(assignments),
-                        "data": {
-                            "courses": courses,
-                            "assignments": assignments,
-                            "synced_at": datetime.now().isoformat()
-                        }
+                return {
+                    "success": True,
+                    "message": "Successfully synced Moodle data using Selenium",
+                    "courses_count": len(courses),
+                    "assignments_count": len(assignments),
+                    "data": {
+                        "courses": courses,
+                        "assignments": assignments,
+                        "synced_at": datetime.now().isoformat()
                     }
+                }
         except Exception as e:
             logger.error(f"Sync failed: {e}")
             return {
@@ -447,3 +833,111 @@ class MoodleService:
                 "assignments_count": 0,
                 "data": {}
             }
+
+    def sync_delta(self, since: Optional[str] = None, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        Perform a full sync but return only what changed since a previous sync
+
+        Args:
+            since: Cursor returned by an earlier sync_delta(); None (or an
+                unknown/expired cursor) returns everything as added
+            progress: Called with (phase, data) as the sync advances
+
+        Returns:
+            Sync result with "cursor" (pass as since next time), "full"
+            (whether the delta is against nothing) and "delta" holding
+            added/changed/removed courses, sections, activities and assignments
+        """
+        result = self.sync_all(progress)
+        if not result["success"]:
+            return {**result, "cursor": since, "full": False, "changes_count": 0, "delta": {}}
+
+        key = user_key(self.base_url, self.username, self.password)
+        previous = self.delta_store.get(key, since)
+        data = result["data"]
+        delta, manifest = diff(previous, data["courses"], data["assignments"])
+        cursor = self.delta_store.put(key, manifest)
+        self.delta_store.record(full=previous is None)
+
+        changes = count_changes(delta)
+        logger.info(f"✓ 差異同步完成: {changes} 項變更" + ("（完整同步）" if previous is None else ""))
+
+        return {
+            "success": True,
+            "message": result["message"],
+            "courses_count": result["courses_count"],
+            "assignments_count": result["assignments_count"],
+            "cursor": cursor,
+            "full": previous is None,
+            "changes_count": changes,
+            "delta": delta,
+            "synced_at": data["synced_at"],
+            "stats": result.get("stats")
+        }
+
+    def stream_sync(
+        self,
+        on_record: Callable[[Dict[str, Any]], None],
+        progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Perform a full sync, handing over each course as soon as it is parsed
+
+        Each course is passed to on_record as
+        {"type": "course", "course": {...with contents}, "assignments": [...]}
+        instead of being collected into one response.
+
+        Args:
+            on_record: Called once per course, from the worker thread
+            progress: Called with (phase, data) as the sync advances
+
+        Returns:
+            Summary record ({"type": "summary", ...}) with the sync_all() counts
+        """
+        counts = {"courses": 0, "assignments": 0}
+        counts_lock = threading.Lock()
+
+        def emit_course(course: Dict[str, Any], assignments: List[Dict[str, Any]]):
+            with counts_lock:
+                counts["courses"] += 1
+                counts["assignments"] += len(assignments)
+            on_record({"type": "course", "course": course, "assignments": assignments})
+
+        def summary(success: bool, message: str) -> Dict[str, Any]:
+            return {
+                "type": "summary",
+                "success": success,
+                "message": message,
+                "courses_count": counts["courses"],
+                "assignments_count": counts["assignments"],
+                "synced_at": datetime.now().isoformat()
+            }
+
+        try:
+            if self.use_api:
+                def on_api_course(course: Dict[str, Any], sections: List[Dict[str, Any]], assignments: List[Dict[str, Any]]):
+                    emit_course(
+                        {**course, "contents": self.adapter.convert_api_course_content(sections)},
+                        [self.adapter.convert_api_assignment(a) for a in assignments]
+                    )
+
+                plan = self._plan_sync(ProgressReporter(progress), on_api_course)
+                self._persist_sync(self._convert_plan(plan))
+                return {**summary(True, "Successfully synced Moodle data using API"), "stats": plan["stats"]}
+            else:
+                def on_course(raw_course: Dict[str, Any]):
+                    emit_course(
+                        {
+                            **self.adapter.convert_course(raw_course),
+                            "contents": self.adapter.convert_course_content(raw_course.get("sections", []))
+                        },
+                        self.adapter.extract_assignments_from_courses([raw_course])
+                    )
+
+                raw_data = self._get_snapshot(refresh=True, reporter=ProgressReporter(progress, on_course))
+                if not raw_data or not raw_data.get("courses"):
+                    return summary(False, "No data received from Moodle")
+                return summary(True, "Successfully synced Moodle data using Selenium")
+        except Exception as e:
+            logger.error(f"Streaming sync failed: {e}")
+            return summary(False, f"Sync failed: {str(e)}")
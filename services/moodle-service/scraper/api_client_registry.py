@@ -0,0 +1,134 @@
+"""
+Process-wide registry of MoodleAPIClient instances
+
+Every request builds a new MoodleService. Without a registry each one would
+create a fresh requests.Session (cold connection pool) and call
+/login/token.php again. The registry hands out one client per account so the
+keep-alive pool and the Web Service token are reused, and closes clients that
+have been idle for a while.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+import logging
+
+from .moodle_api_client import MoodleAPIClient
+from .resilience import CircuitBreakerRegistry, RetryPolicy
+from .rate_limiter import RateLimiterRegistry
+from .snapshot_cache import user_key
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    def __init__(self, client: MoodleAPIClient):
+        self.client = client
+        self.last_used = time.monotonic()
+
+
+class APIClientRegistry:
+    """Shares MoodleAPIClient instances (and their tokens) per account"""
+
+    def __init__(
+        self,
+        idle_timeout: float = 900,
+        max_clients: int = 100,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+        rate_limiters: Optional[RateLimiterRegistry] = None
+    ):
+        """
+        Initialize registry
+
+        Args:
+            idle_timeout: Seconds a client may stay unused before it is closed
+            max_clients: Maximum number of clients kept (least recently used are closed)
+            retry_policy: Retry policy given to every client
+            circuit_breakers: Per-site breakers given to clients of that site
+            rate_limiters: Per-site rate limiters given to clients of that site
+        """
+        self.idle_timeout = idle_timeout
+        self.max_clients = max_clients
+        self.retry_policy = retry_policy
+        self.circuit_breakers = circuit_breakers
+        self.rate_limiters = rate_limiters
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(
+        self,
+        base_url: str,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        token: Optional[str] = None
+    ) -> MoodleAPIClient:
+        """
+        Get the client for an account, creating it on first use
+
+        The key includes a password (or token) digest, so a caller with other
+        credentials never receives a client holding someone else's token.
+        """
+        key = user_key(base_url, username or "", password or token or "")
+        with self._lock:
+            self._evict_idle()
+            entry = self._entries.get(key)
+            if entry:
+                self._stats["hits"] += 1
+            else:
+                self._stats["misses"] += 1
+                entry = self._entries[key] = _Entry(
+                    MoodleAPIClient(
+                        base_url=base_url,
+                        username=username,
+                        password=password,
+                        token=token,
+                        retry_policy=self.retry_policy,
+                        breaker=self.circuit_breakers.get(base_url) if self.circuit_breakers else None,
+                        rate_limiter=self.rate_limiters.get(base_url) if self.rate_limiters else None
+                    )
+                )
+                self._evict_oldest()
+            entry.last_used = time.monotonic()
+            return entry.client
+
+    def invalidate(self, base_url: str, username: Optional[str] = None, password: Optional[str] = None, token: Optional[str] = None):
+        """Drop an account's client (e.g. after its password changed)"""
+        key = user_key(base_url, username or "", password or token or "")
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry:
+            entry.client.session.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._evict_idle()
+            clients = [entry.client for entry in self._entries.values()]
+            return {
+                **self._stats,
+                "clients": len(clients),
+                "token_fetches": sum(client.token_fetches for client in clients),
+                "token_invalidations": sum(client.token_invalidations for client in clients),
+            }
+
+    def close(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry.client.session.close()
+
+    def _evict_idle(self):
+        """Close clients unused for idle_timeout seconds (lock must be held)"""
+        cutoff = time.monotonic() - self.idle_timeout
+        for key in [key for key, entry in self._entries.items() if entry.last_used < cutoff]:
+            self._entries.pop(key).client.session.close()
+            self._stats["evictions"] += 1
+
+    def _evict_oldest(self):
+        """Close least recently used clients beyond max_clients (lock must be held)"""
+        while len(self._entries) > self.max_clients:
+            key = min(self._entries, key=lambda k: self._entries[k].last_used)
+            self._entries.pop(key).client.session.close()
+            self._stats["evictions"] += 1
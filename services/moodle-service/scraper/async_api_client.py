@@ -0,0 +1,321 @@
+"""
+Asynchronous Moodle Web Services API Client
+
+與 MoodleAPIClient 相同的方法，改用 httpx.AsyncClient：
+保持連線（keep-alive）的連線池，並以並行上限同時抓取多門課程內容。
+"""
+
+import asyncio
+import time
+from typing import Callable, List, Dict, Any, Optional
+import httpx
+import logging
+
+from .moodle_api_client import (
+    WSCallStats,
+    is_invalid_token_error,
+    is_read_only_function,
+    format_assignments,
+    format_calendar_events,
+    format_course_contents,
+    format_courses,
+)
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from .rate_limiter import SiteRateLimiter
+from .metrics import ERRORS, MODE_API, WS_CALL_SECONDS
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMoodleAPIClient:
+    """非同步 Moodle Web Services API 客戶端"""
+
+    def __init__(
+        self,
+        base_url: str,
+        username: str = None,
+        password: str = None,
+        token: str = None,
+        max_concurrency: int = 4,
+        timeout: float = 30,
+        stats: Optional[WSCallStats] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        rate_limiter: Optional[SiteRateLimiter] = None
+    ):
+        """
+        初始化 API 客戶端
+
+        Args:
+            base_url: Moodle 網站基礎 URL
+            username: 登入帳號（用於獲取 token）
+            password: 登入密碼（用於獲取 token）
+            token: Web Service Token（如果已有 token 可直接使用）
+            max_concurrency: 同時進行的 API 請求上限
+            timeout: 請求逾時秒數
+            stats: Web Service 呼叫統計
+            retry_policy: 暫時性錯誤的重試策略
+            breaker: 網站的斷路器（網站無法連線時直接失敗）
+            rate_limiter: 網站的速率限制（與其他使用者、爬蟲共用）
+        """
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self._token = token
+        self.stats = stats or WSCallStats()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker
+        self.rate_limiter = rate_limiter
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._token_lock = asyncio.Lock()
+        self.client = httpx.AsyncClient(
+            headers={'User-Agent': 'Moodle-API-Client/1.0'},
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency
+            )
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """關閉連線池"""
+        await self.client.aclose()
+
+    @property
+    def token(self) -> Optional[str]:
+        """目前快取的 token（不會觸發獲取）"""
+        return self._token
+
+    async def get_token(self, service: str = "moodle_mobile_app") -> Optional[str]:
+        """
+        獲取 Web Service Token（已有時直接返回）
+
+        Args:
+            service: Web Service 名稱，預設使用 moodle_mobile_app
+
+        Returns:
+            Token 字串，如果失敗則返回 None
+        """
+        async with self._token_lock:
+            if self._token or not (self.username and self.password):
+                return self._token
+
+            try:
+                response = await self._get(
+                    'login/token.php',
+                    f"{self.base_url}/login/token.php",
+                    {'username': self.username, 'password': self.password, 'service': service},
+                    retry=True
+                )
+                data = response.json()
+            except httpx.HTTPError as e:
+                logger.error(f"✗ 網路請求失敗: {e}")
+                return None
+
+            if 'token' in data:
+                logger.info("✓ Token 獲取成功")
+                self._token = data['token']
+            else:
+                logger.error(f"✗ Token 獲取失敗: {data.get('error', 'Unknown error')}")
+            return self._token
+
+    async def _get(self, function: str, url: str, params: Dict[str, Any], retry: bool) -> httpx.Response:
+        """
+        發送 GET 請求（受並行上限限制，先等待速率限制並經過斷路器，retry 時以退避重試暫時性錯誤）
+
+        所有請求（包含獲取 token）都經過這裡，統計、指標與追蹤只在此記錄；
+        退避期間不佔用並行名額。
+        """
+        async def send() -> httpx.Response:
+            async with self._semaphore:
+                await self._throttle()
+                logger.debug(f"呼叫 API: {function}")
+                with span("ws.call", wsfunction=function) as current:
+                    started = time.monotonic()
+                    response = await self.client.get(url, params=params)
+                    current.set(status=response.status_code, bytes=len(response.content))
+                self._record(function, response, time.monotonic() - started)
+            response.raise_for_status()
+            return response
+
+        return await self.retry_policy.call_async(
+            send, breaker=self.breaker, retry=retry, op=f"ws:{function}", mode=MODE_API
+        )
+
+    def _record(self, function: str, response: httpx.Response, elapsed: float):
+        """記錄一次請求的統計與延遲指標"""
+        self.stats.record(function, len(response.content), elapsed)
+        WS_CALL_SECONDS.labels(self.base_url, MODE_API, function).observe(elapsed)
+
+    async def _throttle(self):
+        """等待網站的速率限制"""
+        if self.rate_limiter:
+            await self.rate_limiter.acquire_async(self.username or '')
+
+    async def call_api(self, function: str, params: Dict[str, Any] = None, _retry_token: bool = True) -> Any:
+        """
+        呼叫 Moodle Web Service API（受並行上限限制）
+
+        token 失效（invalidtoken）且有帳號密碼時，重新獲取 token 並重試一次；
+        唯讀函數遇到網路錯誤或 5xx 時依重試策略重試（退避期間不佔用並行名額）。
+
+        Args:
+            function: API 函數名稱
+            params: API 參數
+
+        Returns:
+            API 回應的 JSON 資料
+        """
+        token = await self.get_token()
+        if not token:
+            raise ValueError("No token available. Please provide token or username/password.")
+
+        request_params = {
+            'wstoken': token,
+            'wsfunction': function,
+            'moodlewsrestformat': 'json'
+        }
+        if params:
+            request_params.update(params)
+
+        try:
+            response = await self._get(
+                function,
+                f"{self.base_url}/webservice/rest/server.php",
+                request_params,
+                retry=is_read_only_function(function)
+            )
+        except httpx.HTTPError:
+            ERRORS.labels(self.base_url, MODE_API, 'ws_call').inc()
+            raise
+
+        data = response.json()
+        if is_invalid_token_error(data) and _retry_token and self.username and self.password:
+            logger.warning("Token 已失效，重新獲取 token 後重試")
+            async with self._token_lock:
+                if self._token == token:
+                    self._token = None
+            return await self.call_api(function, params, _retry_token=False)
+
+        if isinstance(data, dict) and 'exception' in data:
+            ERRORS.labels(self.base_url, MODE_API, 'ws_call').inc()
+            logger.error(f"API 錯誤: {data.get('message', 'Unknown error')}")
+            raise Exception(f"Moodle API Error: {data.get('message', 'Unknown error')}")
+        return data
+
+    async def get_site_info(self) -> Dict[str, Any]:
+        """獲取網站與目前使用者資訊（core_webservice_get_site_info）"""
+        return await self.call_api('core_webservice_get_site_info')
+
+    async def get_user_courses(self, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        獲取當前使用者的所有課程
+
+        Args:
+            user_id: 已知的使用者 ID（提供時不再呼叫 core_webservice_get_site_info）
+        """
+        try:
+            if user_id is None:
+                user_id = (await self.get_site_info()).get('userid')
+            if not user_id:
+                logger.error("無法獲取使用者 ID")
+                return []
+
+            courses = await self.call_api('core_enrol_get_users_courses', {'userid': user_id})
+            logger.info(f"✓ 找到 {len(courses)} 門課程")
+            return format_courses(self.base_url, courses)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"獲取課程列表失敗: {e}")
+            return []
+
+    async def get_course_contents(self, course_id: int) -> List[Dict[str, Any]]:
+        """獲取課程內容（章節、活動、資源），失敗時返回空列表"""
+        try:
+            return await self._fetch_course_contents(course_id)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"獲取課程內容失敗: {e}")
+            return []
+
+    async def _fetch_course_contents(self, course_id: int) -> List[Dict[str, Any]]:
+        """獲取課程內容（失敗時拋出例外）"""
+        contents = await self.call_api('core_course_get_contents', {'courseid': course_id})
+        logger.info(f"✓ 獲取課程 {course_id} 的內容，共 {len(contents)} 個章節")
+        return format_course_contents(contents)
+
+    async def get_courses_contents(
+        self,
+        course_ids: List[int],
+        on_done: Optional[Callable[[int, Optional[List[Dict[str, Any]]]], None]] = None
+    ) -> Dict[int, Optional[List[Dict[str, Any]]]]:
+        """
+        同時獲取多門課程內容（同時進行的請求數不超過 max_concurrency）
+
+        Args:
+            course_ids: 課程 ID 列表
+            on_done: 每門課程完成時以 (課程 ID, 內容) 呼叫
+
+        Returns:
+            {課程 ID: 課程內容列表}，獲取失敗的課程為 None（與沒有內容的課程區分）
+        """
+        async def fetch(course_id: int) -> Optional[List[Dict[str, Any]]]:
+            try:
+                contents = await self._fetch_course_contents(course_id)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                logger.error(f"獲取課程 {course_id} 內容失敗: {e}")
+                contents = None
+            if on_done:
+                on_done(course_id, contents)
+            return contents
+
+        contents = await asyncio.gather(*(fetch(course_id) for course_id in course_ids))
+        return dict(zip(course_ids, contents))
+
+    async def get_assignments(self, course_ids: List[int] = None) -> List[Dict[str, Any]]:
+        """獲取作業列表（可選擇只取部分課程）"""
+        try:
+            params = {'courseids': course_ids} if course_ids else {}
+            assignments = await self.call_api('mod_assign_get_assignments', params)
+            all_assignments = format_assignments(self.base_url, assignments)
+            logger.info(f"✓ 總共 {len(all_assignments)} 個作業")
+            return all_assignments
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"獲取作業列表失敗: {e}")
+            return []
+
+    async def get_calendar_events(self) -> List[Dict[str, Any]]:
+        """獲取行事曆事件（包含作業截止日等）"""
+        try:
+            events = await self.call_api('core_calendar_get_calendar_upcoming_view')
+            logger.info(f"✓ 找到 {len(events.get('events', []))} 個即將到來的事件")
+            return format_calendar_events(events)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"獲取行事曆事件失敗: {e}")
+            return []
+
+    async def test_connection(self) -> bool:
+        """測試 API 連線"""
+        try:
+            info = await self.call_api('core_webservice_get_site_info')
+            logger.info(f"✓ 連線成功！網站名稱: {info.get('sitename')}")
+            return True
+        except Exception as e:
+            logger.error(f"✗ 連線測試失敗: {e}")
+            return False
@@ -0,0 +1,243 @@
+"""
+Incremental (delta) sync
+
+A full sync returns every course, section, activity and assignment. Delta
+sync hashes each of them, remembers the hashes of previous syncs under an
+opaque cursor, and returns only what was added, changed or removed since the
+cursor the client sends back.
+"""
+
+import hashlib
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Manifest: {"courses": {course_id: {"hash", "sections": {section_key: {"hash", "activities": {activity_key: hash}}}}},
+#            "assignments": {assignment_key: hash}}
+Manifest = Dict[str, Dict[str, Any]]
+
+
+def content_hash(value: Any) -> str:
+    """Stable hash of JSON-serializable data"""
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def section_key(index: int, section: Dict[str, Any]) -> str:
+    """Sections have no ID on the page, so they are identified by position"""
+    return str(index)
+
+
+def activity_key(activity: Dict[str, Any]) -> str:
+    """Activities are identified by URL (it carries the module ID), else by type and name"""
+    return activity.get("url") or f"{activity.get('type', '')}:{activity.get('name', '')}"
+
+
+def activity_keys(activities: List[Dict[str, Any]]) -> List[str]:
+    """
+    Keys of a section's activities, in order
+
+    Repeated keys (e.g. two links to the same URL in one section) get an
+    occurrence suffix ("#2", "#3", ...), so they do not overwrite each other.
+    """
+    seen: Dict[str, int] = {}
+    keys = []
+    for activity in activities:
+        key = activity_key(activity)
+        seen[key] = seen.get(key, 0) + 1
+        keys.append(key if seen[key] == 1 else f"{key}#{seen[key]}")
+    return keys
+
+
+def assignment_key(assignment: Dict[str, Any]) -> str:
+    return assignment.get("id") or assignment.get("url", "")
+
+
+def _course_meta(course: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in course.items() if key not in ("contents", "error")}
+
+
+def _section_meta(section: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in section.items() if key != "activities"}
+
+
+def build_manifest(courses: List[Dict[str, Any]], assignments: List[Dict[str, Any]]) -> Manifest:
+    """
+    Hash sync output at every level
+
+    Args:
+        courses: Courses in sync_all() format (with "contents")
+        assignments: Assignments in sync_all() format
+
+    Returns:
+        Manifest of course, section, activity and assignment hashes
+    """
+    manifest: Manifest = {"courses": {}, "assignments": {}}
+
+    for course in courses:
+        sections = {}
+        for index, section in enumerate(course.get("contents", [])):
+            activities = section.get("activities", [])
+            sections[section_key(index, section)] = {
+                "hash": content_hash(_section_meta(section)),
+                "activities": {
+                    key: content_hash(activity) for key, activity in zip(activity_keys(activities), activities)
+                },
+            }
+        manifest["courses"][course.get("id", "")] = {
+            "hash": content_hash(_course_meta(course)),
+            "sections": sections,
+        }
+
+    for assignment in assignments:
+        manifest["assignments"][assignment_key(assignment)] = content_hash(assignment)
+
+    return manifest
+
+
+def _changes() -> Dict[str, list]:
+    return {"added": [], "changed": [], "removed": []}
+
+
+def diff(
+    previous: Optional[Manifest],
+    courses: List[Dict[str, Any]],
+    assignments: List[Dict[str, Any]]
+) -> Tuple[Dict[str, Dict[str, list]], Manifest]:
+    """
+    Compare sync output against a previous manifest
+
+    Added courses and sections are returned whole; their sections and
+    activities are not listed again. Changed courses and sections carry
+    only their own fields, since their children are diffed separately.
+
+    A course whose contents failed to load (it has an "error") is not
+    diffed: its previous manifest entry is carried over, so a slow page
+    does not show up as all of its content removed and later re-added.
+
+    Args:
+        previous: Manifest of the earlier sync (None: everything is added)
+        courses: Courses in sync_all() format
+        assignments: Assignments in sync_all() format
+
+    Returns:
+        (delta, manifest of the current output)
+    """
+    current = build_manifest(courses, assignments)
+    previous = previous or {"courses": {}, "assignments": {}}
+    delta = {kind: _changes() for kind in ("courses", "sections", "activities", "assignments")}
+
+    for course in courses:
+        course_id = course.get("id", "")
+        old_course = previous["courses"].get(course_id)
+        new_course = current["courses"][course_id]
+
+        if not old_course:
+            delta["courses"]["added"].append(course)
+            continue
+        if course.get("error"):
+            current["courses"][course_id] = old_course
+            continue
+        if old_course["hash"] != new_course["hash"]:
+            delta["courses"]["changed"].append(_course_meta(course))
+
+        for index, section in enumerate(course.get("contents", [])):
+            key = section_key(index, section)
+            old_section = old_course["sections"].get(key)
+            new_section = new_course["sections"][key]
+
+            if not old_section:
+                delta["sections"]["added"].append({"course_id": course_id, "section_key": key, "section": section})
+                continue
+            if old_section["hash"] != new_section["hash"]:
+                delta["sections"]["changed"].append(
+                    {"course_id": course_id, "section_key": key, "section": _section_meta(section)}
+                )
+
+            activities = section.get("activities", [])
+            for akey, activity in zip(activity_keys(activities), activities):
+                old_hash = old_section["activities"].get(akey)
+                if old_hash is None:
+                    kind = "added"
+                elif old_hash != new_section["activities"][akey]:
+                    kind = "changed"
+                else:
+                    continue
+                delta["activities"][kind].append({"course_id": course_id, "section_key": key, "activity": activity})
+
+            for akey in old_section["activities"].keys() - new_section["activities"].keys():
+                delta["activities"]["removed"].append({"course_id": course_id, "section_key": key, "activity_key": akey})
+
+        for key in old_course["sections"].keys() - new_course["sections"].keys():
+            delta["sections"]["removed"].append({"course_id": course_id, "section_key": key})
+
+    delta["courses"]["removed"] = sorted(previous["courses"].keys() - current["courses"].keys())
+
+    for assignment in assignments:
+        key = assignment_key(assignment)
+        old_hash = previous["assignments"].get(key)
+        if old_hash is None:
+            delta["assignments"]["added"].append(assignment)
+        elif old_hash != current["assignments"][key]:
+            delta["assignments"]["changed"].append(assignment)
+    delta["assignments"]["removed"] = sorted(previous["assignments"].keys() - current["assignments"].keys())
+
+    return delta, current
+
+
+def count_changes(delta: Dict[str, Dict[str, list]]) -> int:
+    return sum(len(items) for changes in delta.values() for items in changes.values())
+
+
+class DeltaStore:
+    """Manifests of recent syncs per user, addressed by cursor"""
+
+    def __init__(self, cursors_per_user: int = 5, max_users: int = 100):
+        """
+        Initialize delta store
+
+        Args:
+            cursors_per_user: Cursors kept per user (older ones fall back to a full sync)
+            max_users: Maximum number of users kept (least recently used are evicted)
+        """
+        self.cursors_per_user = cursors_per_user
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._users: "OrderedDict[str, OrderedDict[str, Manifest]]" = OrderedDict()
+        self._stats = {"delta_syncs": 0, "full_syncs": 0, "unknown_cursors": 0}
+
+    def get(self, key: str, cursor: Optional[str]) -> Optional[Manifest]:
+        """Get the manifest recorded under a cursor (None if unknown or expired)"""
+        if not cursor:
+            return None
+        with self._lock:
+            manifest = self._users.get(key, {}).get(cursor)
+            if manifest is None:
+                self._stats["unknown_cursors"] += 1
+            return manifest
+
+    def put(self, key: str, manifest: Manifest) -> str:
+        """Record a manifest and return its new cursor"""
+        cursor = uuid.uuid4().hex
+        with self._lock:
+            cursors = self._users.setdefault(key, OrderedDict())
+            cursors[cursor] = manifest
+            while len(cursors) > self.cursors_per_user:
+                cursors.popitem(last=False)
+            self._users.move_to_end(key)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return cursor
+
+    def record(self, full: bool):
+        with self._lock:
+            self._stats["full_syncs" if full else "delta_syncs"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "users": len(self._users)}
@@ -0,0 +1,90 @@
+"""單次往返的 DOM 擷取
+
+以一次 execute_script 在瀏覽器內走訪頁面，回傳 JSON 結構，
+取代逐一元素呼叫 WebDriver（每個 .text / get_attribute 都是一次 HTTP 往返）。
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+# 依序嘗試選擇器，回傳第一個有結果的選擇器與其連結；都沒有時回傳所有課程連結
+_COURSE_LINKS_JS = """
+const selectors = arguments[0];
+const toLink = (a) => ({text: (a.innerText || '').trim(), href: a.href || ''});
+for (const selector of selectors) {
+    let elements;
+    try {
+        elements = document.querySelectorAll(selector);
+    } catch (e) {
+        continue;
+    }
+    if (elements.length) {
+        return {selector: selector, links: Array.from(elements, toLink)};
+    }
+}
+const fallback = Array.from(document.querySelectorAll('a'))
+    .filter((a) => a.href && a.href.includes('course/view'));
+return {selector: null, links: fallback.map(toLink)};
+"""
+
+# 擷取所有章節的標題與活動（名稱、連結、class）
+_SECTIONS_JS = """
+const [sectionSelector, titleSelector, activitySelector] = arguments;
+return Array.from(document.querySelectorAll(sectionSelector), (section, index) => {
+    const title = section.querySelector(titleSelector);
+    const activities = [];
+    for (const activity of section.querySelectorAll(activitySelector)) {
+        const link = activity.querySelector('a');
+        if (!link) {
+            continue;
+        }
+        activities.push({
+            name: (link.innerText || '').trim(),
+            url: link.href || '',
+            className: activity.className || ''
+        });
+    }
+    return {
+        index: index,
+        title: title ? (title.innerText || '').trim() : null,
+        activities: activities
+    };
+});
+"""
+
+
+def extract_course_links(driver, selectors: List[str]) -> Tuple[Optional[str], List[Dict[str, str]]]:
+    """
+    擷取課程連結
+
+    Args:
+        driver: Selenium WebDriver
+        selectors: 依優先順序的 CSS 選擇器
+
+    Returns:
+        (命中的選擇器或 None, [{'text', 'href'}])
+    """
+    result = driver.execute_script(_COURSE_LINKS_JS, selectors) or {}
+    return result.get('selector'), result.get('links', [])
+
+
+def extract_sections(
+    driver,
+    section_selector: str,
+    title_selector: str,
+    activity_selector: str
+) -> List[Dict[str, Any]]:
+    """
+    擷取課程頁面的章節與活動
+
+    Returns:
+        [{'index', 'title', 'activities': [{'name', 'url', 'className'}]}]，
+        沒有標題元素的章節 title 為 None
+    """
+    return driver.execute_script(_SECTIONS_JS, section_selector, title_selector, activity_selector) or []
+
+
+def extract_text(driver, selector: str) -> Optional[str]:
+    """擷取第一個符合選擇器的元素文字，沒有時返回 None"""
+    return driver.execute_script(
+        "const el = document.querySelector(arguments[0]); return el ? (el.innerText || '').trim() : null;",
+        selector
+    )
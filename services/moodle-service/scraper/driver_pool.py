@@ -0,0 +1,336 @@
+"""Chrome WebDriver 連線池
+
+預先啟動無頭瀏覽器並在請求之間共用，避免每個請求都冷啟動 Chrome。
+"""
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urlparse
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+
+logger = logging.getLogger(__name__)
+
+# 租用者識別：(base_url, 使用者識別)
+Tenant = Tuple[str, str]
+
+
+def build_chrome_options(headless: bool = True) -> Options:
+    """
+    建立 Chrome 啟動參數
+
+    Args:
+        headless: 是否使用無頭模式
+
+    Returns:
+        Chrome Options
+    """
+    options = Options()
+    if headless:
+        options.add_argument('--headless')
+        options.add_argument('--disable-gpu')
+
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--window-size=1920,1080')
+
+    # 設定下載偏好
+    prefs = {
+        'download.prompt_for_download': False,
+        'download.directory_upgrade': True,
+        'safebrowsing.enabled': False
+    }
+    options.add_experimental_option('prefs', prefs)
+    return options
+
+
+def create_chrome_driver(headless: bool = True) -> webdriver.Chrome:
+    """啟動一個新的 Chrome WebDriver"""
+    driver = webdriver.Chrome(options=build_chrome_options(headless))
+    driver.implicitly_wait(10)
+    return driver
+
+
+class PooledDriver:
+    """連線池中的瀏覽器，記錄使用狀態"""
+
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.pages_loaded = 0
+        self.tenant: Optional[Tenant] = None
+
+    def mark_page_loaded(self):
+        """記錄一次頁面載入（用於達到上限後回收）"""
+        self.pages_loaded += 1
+
+
+class DriverPool:
+    """有上限的 Chrome WebDriver 連線池"""
+
+    def __init__(
+        self,
+        size: int = 2,
+        min_idle: int = 1,
+        idle_timeout: float = 300,
+        max_pages: int = 200,
+        lease_timeout: float = 120,
+        driver_factory: Optional[Callable[[], webdriver.Chrome]] = None,
+        sso_origins: Sequence[str] = ()
+    ):
+        """
+        初始化連線池
+
+        Args:
+            size: 同時存在的瀏覽器數量上限
+            min_idle: 預先啟動並保持溫熱的閒置瀏覽器數量
+            idle_timeout: 閒置超過此秒數的瀏覽器會被關閉並重新啟動
+            max_pages: 每個瀏覽器載入頁面數達到上限後回收
+            lease_timeout: 等待可用瀏覽器的最長秒數
+            driver_factory: 建立瀏覽器的函式（預設為無頭 Chrome）
+            sso_origins: 換使用者時一併清除儲存資料的 SSO 網站 origin（例如 https://inccu.nccu.edu.tw）
+        """
+        self.size = max(1, size)
+        self.min_idle = max(0, min(min_idle, self.size))
+        self.idle_timeout = idle_timeout
+        self.max_pages = max_pages
+        self.lease_timeout = lease_timeout
+        self.driver_factory = driver_factory or (lambda: create_chrome_driver(headless=True))
+        self.sso_origins = [origin.rstrip('/') for origin in sso_origins if origin]
+
+        self._cond = threading.Condition()
+        self._idle: List[PooledDriver] = []
+        self._total = 0  # 閒置 + 租用中 + 建立中
+        self._closed = False
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stats = {'leases': 0, 'reused': 0, 'tenant_hits': 0, 'created': 0, 'recycled': 0}
+
+    def start(self):
+        """預先啟動瀏覽器並啟動背景回收執行緒"""
+        self._fill_idle()
+        self._reaper = threading.Thread(target=self._reap_loop, name='driver-pool-reaper', daemon=True)
+        self._reaper.start()
+        logger.info(f"✓ 瀏覽器連線池已啟動 (size={self.size}, min_idle={self.min_idle})")
+
+    def close(self):
+        """關閉所有閒置瀏覽器，租用中的瀏覽器歸還時一併關閉"""
+        self._stop.set()
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for pooled in idle:
+            self._quit(pooled)
+        logger.info("✓ 瀏覽器連線池已關閉")
+
+    def lease(self, tenant: Tenant, timeout: Optional[float] = None) -> PooledDriver:
+        """
+        租用一個瀏覽器
+
+        優先取得上次由同一使用者使用的瀏覽器（保留 cookies），
+        否則清除前一位使用者的 cookies 與網站儲存資料後再交付。
+
+        Args:
+            tenant: (base_url, 使用者識別)
+            timeout: 等待秒數，預設為 lease_timeout
+
+        Returns:
+            PooledDriver
+        """
+        deadline = time.monotonic() + (timeout if timeout is not None else self.lease_timeout)
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("瀏覽器連線池已關閉")
+
+                pooled = self._take_idle(tenant)
+                if pooled:
+                    break
+
+                if self._total < self.size:
+                    self._total += 1
+                    pooled = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("等待可用瀏覽器逾時")
+                self._cond.wait(remaining)
+
+        if pooled is None:
+            try:
+                pooled = self._create()
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                raise
+        elif pooled.tenant is not None and pooled.tenant != tenant:
+            # 剛啟動、尚未被租用過的瀏覽器沒有需要清除的資料
+            if not self._reset(pooled):
+                self._discard(pooled)
+                return self.lease(tenant, max(0.0, deadline - time.monotonic()))
+
+        pooled.tenant = tenant
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._stats['leases'] += 1
+        return pooled
+
+    def release(self, pooled: PooledDriver, discard: bool = False):
+        """
+        歸還瀏覽器
+
+        Args:
+            pooled: 租用的瀏覽器
+            discard: 是否直接關閉而不放回連線池
+        """
+        pooled.last_used = time.monotonic()
+
+        if not discard and self.max_pages and pooled.pages_loaded >= self.max_pages:
+            logger.info(f"→ 瀏覽器已載入 {pooled.pages_loaded} 頁，回收")
+            with self._cond:
+                self._stats['recycled'] += 1
+            discard = True
+
+        if not discard and not self._is_alive(pooled):
+            discard = True
+
+        with self._cond:
+            if not discard and not self._closed:
+                self._idle.append(pooled)
+                self._cond.notify()
+                return
+
+        self._discard(pooled)
+
+    def stats(self) -> Dict[str, int]:
+        """連線池狀態"""
+        with self._cond:
+            return {
+                'size': self.size,
+                'total': self._total,
+                'idle': len(self._idle),
+                'leased': self._total - len(self._idle),
+                **self._stats
+            }
+
+    def _take_idle(self, tenant: Tenant) -> Optional[PooledDriver]:
+        """取出閒置瀏覽器，同一使用者優先（需持有鎖）"""
+        if not self._idle:
+            return None
+        for i in range(len(self._idle) - 1, -1, -1):
+            if self._idle[i].tenant == tenant:
+                self._stats['reused'] += 1
+                self._stats['tenant_hits'] += 1
+                return self._idle.pop(i)
+        self._stats['reused'] += 1
+        # 取最久未使用的，讓最近使用的保留給原使用者
+        return self._idle.pop(0)
+
+    def _create(self) -> PooledDriver:
+        pooled = PooledDriver(self.driver_factory())
+        with self._cond:
+            self._stats['created'] += 1
+        return pooled
+
+    def _reset(self, pooled: PooledDriver) -> bool:
+        """
+        清除前一位使用者的 cookies 與網站儲存資料
+
+        除了 Moodle 網站外，也清除 SSO 網站（設定的 sso_origins 與 cookies 所屬的網域），
+        避免下一位使用者沿用前一位的 SSO 登入狀態。
+        """
+        try:
+            driver = pooled.driver
+            driver.get('about:blank')
+            origins = self._visited_origins(pooled)
+            driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            for origin in sorted(origins):
+                driver.execute_cdp_cmd('Storage.clearDataForOrigin', {
+                    'origin': origin,
+                    'storageTypes': 'all'
+                })
+            return True
+        except WebDriverException as e:
+            logger.warning(f"⚠ 重置瀏覽器失敗: {e}")
+            return False
+
+    def _visited_origins(self, pooled: PooledDriver) -> Set[str]:
+        """前一位使用者可能留下儲存資料的 origin（Moodle、設定的 SSO 網站與 cookies 的網域）"""
+        origins = set(self.sso_origins)
+        if pooled.tenant:
+            parsed = urlparse(pooled.tenant[0])
+            origins.add(f"{parsed.scheme}://{parsed.netloc}")
+        cookies = pooled.driver.execute_cdp_cmd('Network.getAllCookies', {}).get('cookies', [])
+        for cookie in cookies:
+            domain = cookie.get('domain', '').lstrip('.')
+            if domain:
+                origins.add(f"https://{domain}")
+                if not cookie.get('secure'):
+                    origins.add(f"http://{domain}")
+        return origins
+
+    @staticmethod
+    def _is_alive(pooled: PooledDriver) -> bool:
+        try:
+            pooled.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    @staticmethod
+    def _quit(pooled: PooledDriver):
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+
+    def _discard(self, pooled: PooledDriver):
+        self._quit(pooled)
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def _fill_idle(self):
+        """補足閒置瀏覽器至 min_idle"""
+        while True:
+            with self._cond:
+                if self._closed or len(self._idle) >= self.min_idle or self._total >= self.size:
+                    return
+                self._total += 1
+            try:
+                pooled = self._create()
+            except Exception as e:
+                logger.error(f"✗ 預先啟動瀏覽器失敗: {e}")
+                with self._cond:
+                    self._total -= 1
+                return
+            with self._cond:
+                self._idle.append(pooled)
+                self._cond.notify()
+
+    def _prune_idle(self):
+        """關閉閒置過久的瀏覽器"""
+        now = time.monotonic()
+        with self._cond:
+            expired = [p for p in self._idle if now - p.last_used > self.idle_timeout]
+            self._idle = [p for p in self._idle if p not in expired]
+        for pooled in expired:
+            self._discard(pooled)
+        if expired:
+            logger.info(f"→ 關閉 {len(expired)} 個閒置瀏覽器")
+
+    def _reap_loop(self):
+        interval = max(5.0, min(30.0, self.idle_timeout / 2))
+        while not self._stop.wait(interval):
+            try:
+                self._prune_idle()
+                self._fill_idle()
+            except Exception as e:
+                logger.error(f"✗ 連線池維護失敗: {e}")
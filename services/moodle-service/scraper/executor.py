@@ -0,0 +1,174 @@
+"""
+Run blocking Moodle work off the asyncio event loop
+
+MoodleService calls (Selenium, requests) are synchronous. ServiceExecutor runs
+them on a bounded thread pool, measures how long each call waited for a
+worker, and cancels work whose HTTP client has disconnected.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("cancel_event", default=None)
+
+
+class OperationCancelled(Exception):
+    """Raised inside a worker when its caller has gone away"""
+
+
+def current_cancel_event() -> Optional[threading.Event]:
+    """Cancellation flag of the work running in this thread (None outside the executor)"""
+    return _cancel_event.get()
+
+
+def raise_if_cancelled(event: Optional[threading.Event] = None):
+    """
+    Stop long-running work at a safe point once it has been cancelled
+
+    Args:
+        event: Cancellation flag to check; defaults to the current thread's flag
+    """
+    event = event or _cancel_event.get()
+    if event and event.is_set():
+        raise OperationCancelled("Operation cancelled")
+
+
+class ServiceExecutor:
+    """Bounded thread pool for blocking MoodleService calls"""
+
+    def __init__(self, max_workers: int = 2, disconnect_poll_interval: float = 0.5):
+        """
+        Initialize executor
+
+        Args:
+            max_workers: Maximum number of service calls running at once
+            disconnect_poll_interval: Seconds between client disconnect checks
+        """
+        self.max_workers = max_workers
+        self.disconnect_poll_interval = disconnect_poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="moodle-worker")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._stats = {"completed": 0, "cancelled": 0, "failed": 0, "queue_wait_total": 0.0, "queue_wait_max": 0.0}
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Tuple[Future, threading.Event]:
+        """
+        Queue fn(*args, **kwargs) without waiting for it
+
+        Returns:
+            (future, cancellation flag checked by the work via raise_if_cancelled)
+        """
+        future, cancel_event, _ = self._submit(fn, args, kwargs)
+        future.add_done_callback(self._record_outcome)
+        return future, cancel_event
+
+    def cancel(self, future: Future, cancel_event: threading.Event):
+        """Cancel submitted work: drop it if still queued, otherwise ask it to stop"""
+        if future.done():
+            return
+        cancel_event.set()
+        if future.cancel():
+            # Never started, so job() did not leave the queue
+            with self._lock:
+                self._queued -= 1
+        self._count("cancelled")
+
+    async def run(self, fn: Callable[..., Any], *args, request=None, **kwargs) -> Tuple[Any, float]:
+        """
+        Run fn(*args, **kwargs) on a worker thread
+
+        Args:
+            fn: Blocking function to run
+            request: Starlette request; the call is cancelled when its client disconnects
+
+        Returns:
+            (result, queue wait in seconds)
+
+        Raises:
+            OperationCancelled: If the client disconnected before the call finished
+        """
+        future, cancel_event, timing = self._submit(fn, args, kwargs)
+        waiter = asyncio.wrap_future(future)
+
+        try:
+            while True:
+                done, _ = await asyncio.wait({waiter}, timeout=self.disconnect_poll_interval)
+                if done:
+                    break
+                if request is not None and await request.is_disconnected():
+                    raise OperationCancelled("Client disconnected")
+            result = waiter.result()
+        except (OperationCancelled, asyncio.CancelledError):
+            self.cancel(future, cancel_event)
+            logger.info(f"Cancelled {getattr(fn, '__name__', 'call')} (client disconnected)")
+            raise
+        except Exception:
+            self._count("failed")
+            raise
+
+        self._count("completed")
+        if timing["queue_wait"] > 1:
+            logger.info(f"{getattr(fn, '__name__', 'call')} waited {timing['queue_wait']:.1f}s for a worker")
+        return result, timing["queue_wait"]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            finished = self._stats["completed"] + self._stats["failed"]
+            return {
+                "max_workers": self.max_workers,
+                "active": self._active,
+                "queued": self._queued,
+                "completed": self._stats["completed"],
+                "cancelled": self._stats["cancelled"],
+                "failed": self._stats["failed"],
+                "queue_wait_avg": round(self._stats["queue_wait_total"] / finished, 3) if finished else 0.0,
+                "queue_wait_max": round(self._stats["queue_wait_max"], 3),
+            }
+
+    def shutdown(self):
+        """Stop accepting work and cancel queued calls"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Tuple[Future, threading.Event, Dict[str, float]]:
+        cancel_event = threading.Event()
+        submitted_at = time.monotonic()
+        timing = {"queue_wait": 0.0}
+
+        def job():
+            timing["queue_wait"] = time.monotonic() - submitted_at
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self._stats["queue_wait_total"] += timing["queue_wait"]
+                self._stats["queue_wait_max"] = max(self._stats["queue_wait_max"], timing["queue_wait"])
+
+            token = _cancel_event.set(cancel_event)
+            try:
+                raise_if_cancelled(cancel_event)
+                return fn(*args, **kwargs)
+            finally:
+                _cancel_event.reset(token)
+                with self._lock:
+                    self._active -= 1
+
+        with self._lock:
+            self._queued += 1
+        # Run in the caller's context, so the worker logs with its request ID
+        return self._executor.submit(copy_context().run, job), cancel_event, timing
+
+    def _record_outcome(self, future: Future):
+        if future.cancelled() or isinstance(future.exception(), OperationCancelled):
+            return
+        self._count("failed" if future.exception() else "completed")
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
@@ -0,0 +1,522 @@
+"""Moodle 無瀏覽器爬蟲
+
+只在需要時以 Selenium 完成 SSO 登入，之後將登入 cookies 轉移到
+requests.Session，以 HTTP 直接抓取課程頁面並用 lxml 解析。
+輸出格式與 MoodleScraper.scrape_all() 相同。
+"""
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+import lxml.html
+from .driver_pool import DriverPool
+from .session_cache import SessionCache
+from .selector_cache import SelectorCache
+from .executor import current_cancel_event, raise_if_cancelled
+from .progress import ProgressReporter
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from .rate_limiter import SiteRateLimiter
+from .metrics import COURSE_LIST_SECONDS, COURSE_PARSE_SECONDS, ERRORS, LOGIN_SECONDS, MODE_HTTP
+from .tracing import current_span, propagate, traced
+from .moodle_scraper import (
+    MoodleScraper,
+    COURSE_SELECTORS,
+    SECTION_SELECTOR,
+    SECTION_TITLE_SELECTOR,
+    ACTIVITY_SELECTOR,
+    COURSE_HEADING_SELECTOR,
+    classify_activity,
+    build_courses,
+    course_stub,
+)
+
+logger = logging.getLogger(__name__)
+
+_SESSKEY_PATTERN = re.compile(r'"sesskey":"([^"]+)"')
+
+
+def _text(elem) -> str:
+    """取得元素文字（合併空白）"""
+    return ' '.join(elem.text_content().split())
+
+
+class MoodleHTTPScraper:
+    """以 requests + lxml 抓取 Moodle 課程的爬蟲"""
+
+    def __init__(
+        self,
+        base_url: str,
+        username: str,
+        password: str,
+        headless: bool = True,
+        driver_pool: Optional[DriverPool] = None,
+        session_cache: Optional[SessionCache] = None,
+        pool_maxsize: int = 10,
+        timeout: float = 30,
+        course_workers: int = 1,
+        course_timeout: Optional[float] = None,
+        selector_cache: Optional[SelectorCache] = None,
+        progress: Optional[ProgressReporter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        rate_limiter: Optional[SiteRateLimiter] = None
+    ):
+        """
+        初始化爬蟲
+
+        Args:
+            base_url: Moodle 網站基礎 URL
+            username: 登入帳號
+            password: 登入密碼
+            headless: Selenium 登入時是否使用無頭模式
+            driver_pool: 瀏覽器連線池（Selenium 登入時使用）
+            session_cache: 登入狀態快取
+            pool_maxsize: HTTP 連線池大小
+            timeout: HTTP 請求逾時秒數
+            course_workers: 同時抓取課程內容的執行緒數量
+            course_timeout: 單門課程抓取的逾時秒數
+            selector_cache: 選擇器學習快取
+            progress: 進度回報
+            retry_policy: 頁面抓取失敗時的重試策略
+            breaker: 網站的斷路器（網站無法連線時直接失敗）
+            rate_limiter: 網站的速率限制（每次 HTTP 請求前等待）
+        """
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.headless = headless
+        self.driver_pool = driver_pool
+        self.session_cache = session_cache
+        self.timeout = timeout
+        self.course_workers = max(1, course_workers)
+        self.course_timeout = course_timeout
+        self.selector_cache = selector_cache
+        self.progress = progress or ProgressReporter()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker
+        self.rate_limiter = rate_limiter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._sesskey: Optional[str] = None
+
+    def __enter__(self):
+        """Context manager 入口"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager 出口"""
+        self.close()
+
+    def close(self):
+        """關閉 HTTP 連線池"""
+        self.session.close()
+
+    @traced('scraper.login')
+    def login(self) -> bool:
+        """
+        登入 Moodle 系統
+
+        先嘗試以快取的 cookies 直接發送 HTTP 請求，失效時才啟動瀏覽器
+        進行 SSO 登入，並將登入後的 cookies 轉移到 HTTP session。
+
+        Returns:
+            是否登入成功
+        """
+        started = time.monotonic()
+        if self.session_cache and self._restore_session():
+            current_span().set(restored=True)
+            LOGIN_SECONDS.labels(self.base_url, MODE_HTTP, 'true').observe(time.monotonic() - started)
+            return True
+
+        logger.debug("→ 使用瀏覽器進行登入")
+        started = time.monotonic()
+        # 快取的 cookies 已在上方檢查過（並已記錄命中/未命中），瀏覽器不再還原一次
+        scraper = MoodleScraper(
+            self.base_url,
+            self.username,
+            self.password,
+            self.headless,
+            driver_pool=self.driver_pool,
+            selector_cache=self.selector_cache,
+            progress=self.progress,
+            retry_policy=self.retry_policy,
+            breaker=self.breaker,
+            rate_limiter=self.rate_limiter
+        )
+        with scraper:
+            if not scraper.login():
+                return False
+            self.session.headers['User-Agent'] = scraper.driver.execute_script("return navigator.userAgent;")
+            cookies = scraper.export_cookies()
+            self.load_cookies(cookies)
+
+        login_seconds = time.monotonic() - started
+        current_span().set(restored=False)
+        LOGIN_SECONDS.labels(self.base_url, MODE_HTTP, 'false').observe(login_seconds)
+        if self.session_cache:
+            self._save_session(cookies, login_seconds)
+        logger.info("✓ 已將登入狀態轉移至 HTTP session")
+        return True
+
+    def load_cookies(self, cookies: List[Dict[str, Any]]):
+        """將瀏覽器 cookies 載入 HTTP session"""
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie['name'],
+                cookie['value'],
+                domain=cookie.get('domain'),
+                path=cookie.get('path', '/'),
+                secure=cookie.get('secure', False)
+            )
+
+    def _restore_session(self) -> bool:
+        """以快取的 cookies 直接抓取 /my/ 確認登入狀態"""
+        cached = self.session_cache.get(self.base_url, self.username, self.password)
+        if not cached:
+            self.session_cache.record_miss("無快取")
+            return False
+
+        started = time.monotonic()
+        try:
+            self.load_cookies(cached.cookies)
+            doc = self._fetch(f"{self.base_url}/my/")
+            logged_in = bool(doc.cssselect('.usermenu'))
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            # 網路或逾時錯誤無法判斷登入狀態是否失效，保留快取
+            logger.warning(f"⚠ 還原登入狀態失敗: {e}")
+            self.session.cookies.clear()
+            self.session_cache.record_miss("還原失敗")
+            return False
+
+        if logged_in:
+            logger.info("✓ 已使用快取的登入狀態（HTTP）")
+            self.session_cache.record_hit(cached.login_seconds - (time.monotonic() - started))
+            return True
+
+        self.session.cookies.clear()
+        self.session_cache.invalidate(self.base_url, self.username)
+        self.session_cache.record_miss("登入狀態已失效")
+        return False
+
+    def _save_session(self, cookies: List[Dict[str, Any]], login_seconds: float):
+        """儲存瀏覽器登入後的 cookies"""
+        try:
+            self.session_cache.put(self.base_url, self.username, self.password, cookies, login_seconds)
+        except Exception as e:
+            logger.warning(f"⚠ 儲存登入狀態失敗: {e}")
+
+    def _fetch(
+        self,
+        url: str,
+        timeout: Optional[float] = None,
+        retry_timeout: bool = True
+    ) -> lxml.html.HtmlElement:
+        """
+        抓取頁面並解析為 HTML 文件（連結轉為絕對路徑，網路錯誤或 5xx 依重試策略重試）
+
+        Args:
+            url: 頁面網址
+            timeout: 請求逾時秒數，預設使用 self.timeout
+            retry_timeout: 逾時是否重試並計入斷路器（套用單一課程逾時時不重試，
+                否則會將設定的逾時放大數倍，且較慢的課程會讓斷路器跳脫）
+        """
+        def get() -> requests.Response:
+            self._throttle()
+            response = self.session.get(url, timeout=timeout or self.timeout)
+            response.raise_for_status()
+            return response
+
+        ignore = () if retry_timeout else (requests.Timeout,)
+        response = self.retry_policy.call(get, breaker=self.breaker, op='page_load', mode=MODE_HTTP, ignore=ignore)
+
+        match = _SESSKEY_PATTERN.search(response.text)
+        if match:
+            self._sesskey = match.group(1)
+
+        doc = lxml.html.fromstring(response.content, base_url=response.url)
+        doc.make_links_absolute(response.url)
+        return doc
+
+    def _throttle(self):
+        """等待網站的速率限制"""
+        if self.rate_limiter:
+            self.rate_limiter.acquire(self.username)
+
+    @traced('scraper.course_list')
+    def get_courses(self) -> List[Dict[str, Any]]:
+        """
+        獲取所有課程列表
+
+        Returns:
+            課程列表，每個課程包含 id, name, url
+        """
+        started = time.monotonic()
+        try:
+            courses_url = f"{self.base_url}/my/"
+            logger.debug(f"→ 正在獲取課程列表: {courses_url}")
+            doc = self._fetch(courses_url)
+
+            course_elements = []
+            for selector in self._course_selectors():
+                elements = doc.cssselect(selector)
+                if elements:
+                    logger.debug(f"→ 使用選擇器找到 {len(elements)} 個元素: {selector}")
+                    course_elements = elements
+                    self._remember_course_selector(selector)
+                    break
+
+            if not course_elements:
+                # Moodle 4 的課程總覽由 AJAX 載入，靜態 HTML 中沒有課程卡片
+                courses = self._get_courses_via_ajax()
+                if courses:
+                    logger.info(f"✓ 找到 {len(courses)} 門課程（AJAX）")
+                    current_span().set(courses=len(courses))
+                    COURSE_LIST_SECONDS.labels(self.base_url, MODE_HTTP).observe(time.monotonic() - started)
+                    return courses
+
+                course_elements = [
+                    link for link in doc.iter('a')
+                    if 'course/view' in (link.get('href') or '')
+                ]
+                logger.debug(f"→ 使用通用方法找到 {len(course_elements)} 個課程連結")
+
+            courses = build_courses([(_text(elem), elem.get('href')) for elem in course_elements])
+
+            logger.info(f"✓ 找到 {len(courses)} 門課程")
+            current_span().set(courses=len(courses))
+            COURSE_LIST_SECONDS.labels(self.base_url, MODE_HTTP).observe(time.monotonic() - started)
+            return courses
+
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            ERRORS.labels(self.base_url, MODE_HTTP, 'course_list').inc()
+            logger.error(f"✗ 獲取課程列表失敗: {e}")
+            return []
+
+    def _course_selectors(self) -> List[str]:
+        """課程列表選擇器，上次成功的排在最前面"""
+        if not self.selector_cache:
+            return list(COURSE_SELECTORS)
+        locators = [('css selector', selector) for selector in COURSE_SELECTORS]
+        return [selector for _, selector in self.selector_cache.prioritize(self.base_url, 'course_list', locators)]
+
+    def _remember_course_selector(self, selector: str):
+        if not self.selector_cache:
+            return
+        locator = ('css selector', selector)
+        cached = self.selector_cache.get(self.base_url, 'course_list')
+        if cached:
+            self.selector_cache.record(self.base_url, 'course_list', cached == locator)
+        self.selector_cache.remember(self.base_url, 'course_list', locator)
+
+    def _get_courses_via_ajax(self) -> List[Dict[str, Any]]:
+        """透過 Moodle AJAX 服務取得已選課程（需要頁面中的 sesskey）"""
+        if not self._sesskey:
+            return []
+
+        methodname = 'core_course_get_enrolled_courses_by_timeline_classification'
+        try:
+            self._throttle()
+            response = self.session.post(
+                f"{self.base_url}/lib/ajax/service.php",
+                params={'sesskey': self._sesskey, 'info': methodname},
+                data=json.dumps([{
+                    'index': 0,
+                    'methodname': methodname,
+                    'args': {'offset': 0, 'limit': 0, 'classification': 'all', 'sort': 'fullname'}
+                }]),
+                headers={'Content-Type': 'application/json'},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            reply = response.json()[0]
+            if reply.get('error'):
+                return []
+
+            return [
+                {
+                    'id': str(course.get('id')),
+                    'name': course.get('fullname', ''),
+                    'url': course.get('viewurl') or f"{self.base_url}/course/view.php?id={course.get('id')}",
+                    'sections': []
+                }
+                for course in reply.get('data', {}).get('courses', [])
+            ]
+        except (requests.RequestException, ValueError, IndexError, KeyError) as e:
+            logger.warning(f"⚠ AJAX 取得課程列表失敗: {e}")
+            return []
+
+    @traced('scraper.course')
+    def get_course_content(self, course: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        獲取課程內容（章節、活動、資源）
+
+        Args:
+            course: 課程資訊字典
+
+        Returns:
+            包含完整章節內容的課程資訊
+        """
+        current_span().set(course_id=course.get('id'))
+        started = time.monotonic()
+        try:
+            logger.debug(f"→ 正在解析課程: {course['name'] or course['url']}")
+            doc = self._fetch(course['url'], timeout=self.course_timeout, retry_timeout=not self.course_timeout)
+
+            # 沒有課程名稱時從頁面標題補上
+            if not course['name']:
+                headings = doc.cssselect(COURSE_HEADING_SELECTOR)
+                course['name'] = _text(headings[0]) if headings else ''
+
+            for idx, section_elem in enumerate(doc.cssselect(SECTION_SELECTOR)):
+                title_elems = section_elem.cssselect(SECTION_TITLE_SELECTOR)
+                if not title_elems:
+                    continue
+                section_title = _text(title_elems[0]) or f"Section {idx}"
+
+                activities = []
+                for activity_elem in section_elem.cssselect(ACTIVITY_SELECTOR):
+                    links = activity_elem.cssselect('a')
+                    if not links:
+                        continue
+
+                    activity_name = _text(links[0])
+                    activity_url = links[0].get('href')
+                    if activity_name and activity_url:
+                        activities.append({
+                            'name': activity_name,
+                            'url': activity_url,
+                            'type': classify_activity(activity_elem.get('class'))
+                        })
+
+                course['sections'].append({
+                    'index': idx,
+                    'title': section_title,
+                    'activities': activities
+                })
+
+            logger.info(f"✓ 解析完成: 找到 {len(course['sections'])} 個章節")
+            current_span().set(sections=len(course['sections']))
+            COURSE_PARSE_SECONDS.labels(self.base_url, MODE_HTTP).observe(time.monotonic() - started)
+            return course
+
+        except requests.Timeout:
+            ERRORS.labels(self.base_url, MODE_HTTP, 'course_timeout').inc()
+            current_span().set(error='timeout')
+            logger.error(f"✗ 抓取課程頁面逾時: {course['name']}")
+            course['error'] = 'timeout'
+            return course
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            ERRORS.labels(self.base_url, MODE_HTTP, 'course_parse').inc()
+            current_span().set(error=str(e))
+            logger.error(f"✗ 解析課程內容失敗: {e}")
+            course['error'] = 'parse'
+            return course
+
+    def get_courses_content(self, courses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        抓取多門課程內容，course_workers > 1 時共用同一個 HTTP session 同時抓取
+
+        Args:
+            courses: 課程列表
+
+        Returns:
+            包含章節內容的課程列表（順序與輸入相同）
+        """
+        cancel_event = current_cancel_event()
+
+        def fetch(course: Dict[str, Any]) -> Dict[str, Any]:
+            raise_if_cancelled(cancel_event)
+            course = self.get_course_content(course)
+            self.progress.course_done(course)
+            return course
+
+        workers = min(self.course_workers, len(courses))
+        if workers <= 1:
+            return [fetch(course) for course in courses]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(propagate(fetch), courses))
+
+    @traced('scraper.scrape_course')
+    def scrape_course(self, course_id: str, course: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        只抓取單一課程（只有在課程頁面無法取得名稱時才載入課程列表）
+
+        Args:
+            course_id: 課程 ID
+            course: 已知的課程資訊（id, name, url），沒有時只以 ID 建立
+
+        Returns:
+            與 scrape_all() 相同格式的字典，courses 只包含該課程（找不到時為空）
+        """
+        result = {
+            'timestamp': datetime.now().isoformat(),
+            'base_url': self.base_url,
+            'username': self.username,
+            'courses': []
+        }
+
+        if not self.login():
+            logger.error("✗ 無法繼續，登入失敗")
+            return result
+
+        course = {**course, 'sections': []} if course else course_stub(self.base_url, course_id)
+        course = self.get_course_content(course)
+
+        if not course['name']:
+            listed = next((c for c in self.get_courses() if c['id'] == course_id), None)
+            if not listed:
+                logger.error(f"✗ 找不到課程: {course_id}")
+                return result
+            course['name'] = listed['name']
+
+        result['courses'] = [course]
+        return result
+
+    @traced('scraper.scrape_all')
+    def scrape_all(self) -> Dict[str, Any]:
+        """
+        完整爬取流程：登入 -> 獲取課程 -> 解析內容
+
+        Returns:
+            包含所有課程資料的字典（與 MoodleScraper.scrape_all() 相同格式）
+        """
+        result = {
+            'timestamp': datetime.now().isoformat(),
+            'base_url': self.base_url,
+            'username': self.username,
+            'courses': []
+        }
+
+        if not self.login():
+            logger.error("✗ 無法繼續，登入失敗")
+            self.progress.emit('login', ok=False)
+            return result
+        self.progress.emit('login', ok=True)
+        raise_if_cancelled()
+
+        courses = self.get_courses()
+        self.progress.courses_found(len(courses))
+        if not courses:
+            logger.error("✗ 未找到任何課程")
+            return result
+
+        result['courses'] = self.get_courses_content(courses)
+        self.progress.emit('finished', courses=len(result['courses']))
+
+        logger.info(f"✓ 完成！共爬取 {len(result['courses'])} 門課程（HTTP 模式）")
+        return result
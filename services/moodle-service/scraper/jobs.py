@@ -0,0 +1,207 @@
+"""
+Background sync jobs
+
+A full sync can take minutes, longer than clients are willing to hold an HTTP
+connection open. SyncJobManager runs MoodleService.sync_all() on the service
+executor and keeps each job's progress, event log and result for polling or
+streaming.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from .executor import ServiceExecutor
+from .progress import ProgressCallback
+from .tracing import request_context
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# Last event of every job, carrying its final status
+EVENT_COMPLETE = "complete"
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+@dataclass
+class SyncJob:
+    """State of one sync run"""
+    id: str
+    key: str
+    status: str = JOB_QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    progress: Dict[str, Any] = field(default_factory=dict)
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "created_at": _isoformat(self.created_at),
+            "started_at": _isoformat(self.started_at),
+            "finished_at": _isoformat(self.finished_at),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class SyncJobManager:
+    """Runs sync jobs in the background and keeps their results for a while"""
+
+    def __init__(self, executor: ServiceExecutor, retention: float = 3600):
+        """
+        Initialize job manager
+
+        Args:
+            executor: Executor the sync runs on (shares its concurrency limit)
+            retention: Seconds a finished job is kept for polling
+        """
+        self.executor = executor
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, SyncJob] = {}
+        self._active: Dict[str, str] = {}
+        self._stats = {"submitted": 0, "deduplicated": 0, "succeeded": 0, "failed": 0}
+
+    def submit(
+        self,
+        key: str,
+        sync: Callable[[ProgressCallback], Dict[str, Any]]
+    ) -> Tuple[SyncJob, bool]:
+        """
+        Start a sync job, or return the one already running for the same user
+
+        Args:
+            key: User identifier (see snapshot_cache.user_key)
+            sync: Function running the sync; receives a progress callback and
+                returns the sync_all() result
+
+        Returns:
+            (job, whether a new job was created)
+        """
+        with self._lock:
+            self._purge()
+            active_id = self._active.get(key)
+            if active_id:
+                self._stats["deduplicated"] += 1
+                return self._jobs[active_id], False
+
+            job = SyncJob(id=uuid.uuid4().hex, key=key)
+            self._jobs[job.id] = job
+            self._active[key] = job.id
+            self._stats["submitted"] += 1
+
+        try:
+            future, _ = self.executor.submit(self._run, job, sync)
+        except Exception as e:
+            # Executor shut down (e.g. during application shutdown)
+            self._finish(job, None, f"Sync could not be started: {e}")
+            raise
+
+        def on_done(future: Future):
+            # Dropped or cancelled before _run started (executor shutdown): fail the job instead of leaving it queued
+            if future.cancelled() or future.exception():
+                self._finish(job, None, "Sync was cancelled")
+
+        future.add_done_callback(on_done)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[SyncJob]:
+        """Get a job by ID (None if unknown or expired)"""
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def events_since(self, job_id: str, after: int = 0) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        """
+        Get a job's progress events
+
+        Args:
+            job_id: Job ID
+            after: Only return events with a larger seq (0 for all)
+
+        Returns:
+            (events, whether the job is done), or None if the job is unknown
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return None
+            return [event for event in job.events if event["seq"] > after], job.done
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "jobs": len(self._jobs), "active": len(self._active)}
+
+    def _add_event(self, job: SyncJob, phase: str, data: Dict[str, Any]):
+        """Append a progress event (lock must be held)"""
+        job.events.append({"seq": len(job.events) + 1, "phase": phase, **data})
+
+    def _run(self, job: SyncJob, sync: Callable[[ProgressCallback], Dict[str, Any]]):
+        def on_progress(phase: str, data: Dict[str, Any]):
+            with self._lock:
+                job.progress = {**job.progress, **data, "phase": phase}
+                self._add_event(job, phase, data)
+
+        with self._lock:
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+
+        try:
+            # Log lines and spans of the sync carry the job ID
+            with request_context(job.id):
+                result = sync(on_progress)
+            error = None if result.get("success") else result.get("message")
+        except Exception as e:
+            logger.error(f"Sync job {job.id} failed: {e}")
+            result, error = None, str(e)
+
+        self._finish(job, result, error)
+
+    def _finish(self, job: SyncJob, result: Optional[Dict[str, Any]], error: Optional[str]):
+        """Record a job's outcome, emit its complete event and release the user's slot"""
+        with self._lock:
+            if job.done:
+                return
+            job.result = result
+            job.error = error
+            job.status = JOB_FAILED if error else JOB_SUCCEEDED
+            job.finished_at = time.time()
+            self._add_event(job, EVENT_COMPLETE, {
+                "status": job.status,
+                "error": error,
+                "elapsed": round(job.finished_at - (job.started_at or job.created_at), 3),
+                "courses_done": job.progress.get("courses_done", 0),
+                "courses_total": job.progress.get("courses_total", 0),
+            })
+            self._stats[job.status] += 1
+            if self._active.get(job.key) == job.id:
+                del self._active[job.key]
+
+    def _purge(self):
+        """Drop finished jobs older than the retention period (lock must be held)"""
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
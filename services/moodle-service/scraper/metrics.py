@@ -0,0 +1,112 @@
+"""
+Prometheus metrics for scraper and API client hot paths
+
+Histograms of browser start, login, course list and per-course parse times,
+Web Service latency per wsfunction, and error/retry counters, labelled by
+Moodle base_url and mode ("selenium", "http" or "api"). Pool and queue sizes
+are read from the components' stats() when /metrics is scraped.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+
+MODE_SELENIUM = "selenium"
+MODE_HTTP = "http"
+MODE_API = "api"
+
+_PAGE_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+_LOGIN_BUCKETS = (0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 120)
+_WS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+_SYNC_BUCKETS = (1, 5, 10, 20, 30, 60, 120, 180, 300, 600, 1200)
+
+BROWSER_START_SECONDS = Histogram(
+    "moodle_browser_start_seconds",
+    "Time to start a Chrome browser or lease one from the pool",
+    ["base_url", "mode", "pooled"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30),
+)
+LOGIN_SECONDS = Histogram(
+    "moodle_login_seconds",
+    "Time to log in, by whether a cached session was restored",
+    ["base_url", "mode", "restored"],
+    buckets=_LOGIN_BUCKETS,
+)
+COURSE_LIST_SECONDS = Histogram(
+    "moodle_course_list_seconds",
+    "Time to load and parse the course list",
+    ["base_url", "mode"],
+    buckets=_PAGE_BUCKETS,
+)
+COURSE_PARSE_SECONDS = Histogram(
+    "moodle_course_parse_seconds",
+    "Time to load and parse one course page",
+    ["base_url", "mode"],
+    buckets=_PAGE_BUCKETS,
+)
+WS_CALL_SECONDS = Histogram(
+    "moodle_ws_call_seconds",
+    "Latency of Moodle Web Service requests",
+    ["base_url", "mode", "wsfunction"],
+    buckets=_WS_BUCKETS,
+)
+SYNC_SECONDS = Histogram(
+    "moodle_sync_seconds",
+    "Duration of full syncs",
+    ["base_url", "mode", "outcome"],
+    buckets=_SYNC_BUCKETS,
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "moodle_queue_wait_seconds",
+    "Time requests waited for a free service worker",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120),
+)
+ERRORS = Counter(
+    "moodle_errors_total",
+    "Failed Moodle operations",
+    ["base_url", "mode", "operation"],
+)
+RETRIES = Counter(
+    "moodle_retries_total",
+    "Retried Moodle requests (outcome 'retry' per retry, 'exhausted' when attempts ran out)",
+    ["base_url", "mode", "operation", "outcome"],
+)
+
+# (labels, value) pairs reported by a gauge source
+GaugeSamples = Iterable[Tuple[Dict[str, str], float]]
+
+
+class StatsGaugeCollector:
+    """Reports gauges computed from component stats() at scrape time"""
+
+    def __init__(self):
+        self._sources: List[Tuple[str, str, List[str], Callable[[], GaugeSamples]]] = []
+
+    def add(self, name: str, documentation: str, labels: List[str], samples: Callable[[], GaugeSamples]):
+        """
+        Register a gauge
+
+        Args:
+            name: Metric name
+            documentation: Metric help text
+            labels: Label names
+            samples: Returns (labels, value) pairs; an empty result skips the gauge
+        """
+        self._sources.append((name, documentation, labels, samples))
+
+    def collect(self):
+        for name, documentation, labels, samples in self._sources:
+            family = GaugeMetricFamily(name, documentation, labels=labels)
+            for sample_labels, value in samples():
+                family.add_metric([sample_labels.get(label, "") for label in labels], value)
+            yield family
+
+
+def stats_value(stats: Optional[Dict[str, Any]], name: str) -> GaugeSamples:
+    """One unlabelled sample from a stats() dict (none when the component is disabled)"""
+    return [({}, float(stats[name]))] if stats else []
+
+
+def register_collector(collector: StatsGaugeCollector):
+    REGISTRY.register(collector)
@@ -5,18 +5,173 @@ Moodle Web Services API Client
 這比 Selenium 爬蟲更穩定、更快速、更可靠
 """
 
+import threading
+import time
 import requests
 from typing import List, Dict, Any, Optional
 from urllib.parse import urljoin
 import logging
 
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from .rate_limiter import SiteRateLimiter
+from .metrics import ERRORS, MODE_API, WS_CALL_SECONDS
+from .tracing import span
+
 logger = logging.getLogger(__name__)
 
+# Moodle 回傳此錯誤代碼時表示 token 已失效（例如被撤銷或過期）
+INVALID_TOKEN_ERRORCODE = 'invalidtoken'
+
+
+def is_invalid_token_error(data: Any) -> bool:
+    """判斷 Web Service 回應是否為 token 失效錯誤"""
+    return isinstance(data, dict) and data.get('errorcode') == INVALID_TOKEN_ERRORCODE
+
+
+def is_read_only_function(function: str) -> bool:
+    """Web Service 函數是否只讀取資料（失敗時可安全重試）"""
+    return '_get_' in function
+
+
+class WSCallStats:
+    """統計 Web Service 呼叫次數、回應位元組數與耗時（可在多個客戶端之間共用）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.by_function: Dict[str, int] = {}
+
+    def record(self, function: str, nbytes: int, seconds: float):
+        with self._lock:
+            self.calls += 1
+            self.bytes += nbytes
+            self.seconds += seconds
+            self.by_function[function] = self.by_function.get(function, 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'ws_calls': self.calls,
+                'ws_bytes': self.bytes,
+                'ws_seconds': round(self.seconds, 3),
+                'calls_by_function': dict(self.by_function),
+            }
+
+
+def format_courses(base_url: str, courses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """格式化 core_enrol_get_users_courses 的課程資料"""
+    formatted_courses = []
+    for course in courses:
+        formatted_courses.append({
+            'id': str(course.get('id')),
+            'name': course.get('fullname', course.get('shortname', 'Unknown')),
+            'shortname': course.get('shortname', ''),
+            'url': f"{base_url}/course/view.php?id={course.get('id')}",
+            'description': course.get('summary', ''),
+            'visible': course.get('visible', 1) == 1,
+            'startdate': course.get('startdate'),
+            'enddate': course.get('enddate'),
+        })
+    return formatted_courses
+
+
+def format_course_contents(contents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """格式化 core_course_get_contents 的章節資料"""
+    formatted_sections = []
+    for section in contents:
+        activities = []
+
+        for module in section.get('modules', []):
+            activity = {
+                'id': module.get('id'),
+                'name': module.get('name'),
+                'modname': module.get('modname'),  # 活動類型 (assign, resource, forum, etc.)
+                'url': module.get('url'),
+                'description': module.get('description', ''),
+                'visible': module.get('visible', 1) == 1,
+            }
+
+            # 如果是檔案資源，加入檔案資訊
+            if 'contents' in module:
+                activity['files'] = [
+                    {
+                        'filename': content.get('filename'),
+                        'fileurl': content.get('fileurl'),
+                        'filesize': content.get('filesize'),
+                        'mimetype': content.get('mimetype'),
+                    }
+                    for content in module.get('contents', [])
+                ]
+
+            activities.append(activity)
+
+        formatted_sections.append({
+            'id': section.get('id'),
+            'name': section.get('name', f"Section {section.get('section', 0)}"),
+            'section': section.get('section'),
+            'summary': section.get('summary', ''),
+            'visible': section.get('visible', 1) == 1,
+            'activities': activities
+        })
+
+    return formatted_sections
+
+
+def format_assignments(base_url: str, assignments: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """格式化 mod_assign_get_assignments 的作業資料"""
+    all_assignments = []
+    for course in assignments.get('courses', []):
+        course_id = course.get('id')
+        course_name = course.get('fullname', '')
+
+        for assignment in course.get('assignments', []):
+            all_assignments.append({
+                'id': str(assignment.get('id')),
+                'course_id': str(course_id),
+                'course_name': course_name,
+                'name': assignment.get('name'),
+                'intro': assignment.get('intro', ''),
+                'duedate': assignment.get('duedate'),
+                'allowsubmissionsfromdate': assignment.get('allowsubmissionsfromdate'),
+                'cutoffdate': assignment.get('cutoffdate'),
+                'url': f"{base_url}/mod/assign/view.php?id={assignment.get('cmid')}",
+            })
+    return all_assignments
+
+
+def format_calendar_events(events: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """格式化 core_calendar_get_calendar_upcoming_view 的事件資料"""
+    formatted_events = []
+    for event in events.get('events', []):
+        formatted_events.append({
+            'id': event.get('id'),
+            'name': event.get('name'),
+            'description': event.get('description', ''),
+            'eventtype': event.get('eventtype'),
+            'timestart': event.get('timestart'),
+            'timeduration': event.get('timeduration'),
+            'course_id': event.get('course', {}).get('id') if event.get('course') else None,
+            'url': event.get('url'),
+        })
+    return formatted_events
+
 
 class MoodleAPIClient:
     """Moodle Web Services API 客戶端"""
 
-    def __init__(self, base_url: str, username: str = None, password: str = None, token: str = None):
+    def __init__(
+        self,
+        base_url: str,
+        username: str = None,
+        password: str = None,
+        token: str = None,
+        stats: Optional[WSCallStats] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        rate_limiter: Optional[SiteRateLimiter] = None
+    ):
         """
         初始化 API 客戶端
 
@@ -25,11 +180,22 @@ class MoodleAPIClient:
             username: 登入帳號（用於獲取 token）
             password: 登入密碼（用於獲取 token）
             token: Web Service Token（如果已有 token 可直接使用）
+            stats: Web Service 呼叫統計
+            retry_policy: 暫時性錯誤的重試策略
+            breaker: 網站的斷路器（網站無法連線時直接失敗）
+            rate_limiter: 網站的速率限制（與爬蟲共用）
         """
         self.base_url = base_url.rstrip('/')
         self.username = username
         self.password = password
         self._token = token
+        self._token_lock = threading.Lock()
+        self.token_fetches = 0
+        self.token_invalidations = 0
+        self.stats = stats or WSCallStats()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker
+        self.rate_limiter = rate_limiter
         self.session = requests.Session()
 
         # 設定預設的請求參數
@@ -39,11 +205,43 @@ class MoodleAPIClient:
 
     @property
     def token(self) -> Optional[str]:
-        """獲取或生成 token"""
-        if not self._token and self.username and self.password:
-            self._token = self.get_token()
+        """獲取或生成 token（取得後快取在客戶端，多執行緒共用時只獲取一次）"""
+        if self._token or not (self.username and self.password):
+            return self._token
+        with self._token_lock:
+            if not self._token:
+                self._token = self.get_token()
+                self.token_fetches += 1
         return self._token
 
+    def invalidate_token(self, token: Optional[str] = None):
+        """
+        捨棄快取的 token，下次呼叫時重新獲取
+
+        Args:
+            token: 已知失效的 token，快取已被其他執行緒更新時不捨棄
+        """
+        with self._token_lock:
+            if token is None or self._token == token:
+                self._token = None
+                self.token_invalidations += 1
+
+    def replace_token(self, stale: Optional[str], token: Optional[str]):
+        """
+        採用其他客戶端（例如同步規劃的非同步客戶端）在 token 失效後重新獲取的 token
+
+        Args:
+            stale: 已知失效的 token，快取已被其他執行緒更新時不取代
+            token: 新的 token
+        """
+        if not token or token == stale:
+            return
+        with self._token_lock:
+            if self._token == stale:
+                self._token = token
+                self.token_invalidations += 1
+                self.token_fetches += 1
+
     def get_token(self, service: str = "moodle_mobile_app") -> Optional[str]:
         """
         使用帳號密碼獲取 Web Service Token
@@ -63,8 +261,7 @@ class MoodleAPIClient:
             }
 
             logger.info(f"正在獲取 token: {url}")
-            response = self.session.get(url, params=params, timeout=30)
-            response.raise_for_status()
+            response = self._get('login/token.php', url, params, retry=True)
 
             data = response.json()
 
@@ -85,14 +282,44 @@ class MoodleAPIClient:
         except requests.exceptions.RequestException as e:
             logger.error(f"✗ 網路請求失敗: {e}")
             return None
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"✗ 獲取 token 時發生錯誤: {e}")
             return None
 
-    def call_api(self, function: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+    def _get(self, function: str, url: str, params: Dict[str, Any], retry: bool) -> requests.Response:
+        """
+        發送 GET 請求（先等待速率限制並經過斷路器，retry 時以退避重試暫時性錯誤）
+
+        Args:
+            function: 統計與記錄用的函數名稱
+            url: 請求網址
+            params: 查詢參數
+            retry: 請求是否可安全重試
+        """
+        def send() -> requests.Response:
+            if self.rate_limiter:
+                self.rate_limiter.acquire(self.username or '')
+            with span("ws.call", wsfunction=function) as current:
+                started = time.monotonic()
+                response = self.session.get(url, params=params, timeout=30)
+                elapsed = time.monotonic() - started
+                current.set(status=response.status_code, bytes=len(response.content))
+            self.stats.record(function, len(response.content), elapsed)
+            WS_CALL_SECONDS.labels(self.base_url, MODE_API, function).observe(elapsed)
+            response.raise_for_status()
+            return response
+
+        return self.retry_policy.call(send, breaker=self.breaker, retry=retry, op=f"ws:{function}", mode=MODE_API)
+
+    def call_api(self, function: str, params: Dict[str, Any] = None, _retry_token: bool = True) -> Dict[str, Any]:
         """
         呼叫 Moodle Web Service API
 
+        token 失效（invalidtoken）且有帳號密碼時，重新獲取 token 並重試一次；
+        唯讀函數遇到網路錯誤或 5xx 時依重試策略重試。
+
         Args:
             function: API 函數名稱 (例: core_course_get_courses)
             params: API 參數
@@ -100,13 +327,14 @@ class MoodleAPIClient:
         Returns:
             API 回應的 JSON 資料
         """
-        if not self.token:
+        token = self.token
+        if not token:
             raise ValueError("No token available. Please provide token or username/password.")
 
         url = f"{self.base_url}/webservice/rest/server.php"
 
         request_params = {
-            'wstoken': self.token,
+            'wstoken': token,
             'wsfunction': function,
             'moodlewsrestformat': 'json'
         }
@@ -116,19 +344,25 @@ class MoodleAPIClient:
 
         try:
             logger.debug(f"呼叫 API: {function}")
-            response = self.session.get(url, params=request_params, timeout=30)
-            response.raise_for_status()
+            response = self._get(function, url, request_params, retry=is_read_only_function(function))
 
             data = response.json()
 
+            if is_invalid_token_error(data) and _retry_token and self.username and self.password:
+                logger.warning("Token 已失效，重新獲取 token 後重試")
+                self.invalidate_token(token)
+                return self.call_api(function, params, _retry_token=False)
+
             # 檢查是否有錯誤
             if isinstance(data, dict) and 'exception' in data:
+                ERRORS.labels(self.base_url, MODE_API, 'ws_call').inc()
                 logger.error(f"API 錯誤: {data.get('message', 'Unknown error')}")
                 raise Exception(f"Moodle API Error: {data.get('message', 'Unknown error')}")
 
             return data
 
         except requests.exceptions.RequestException as e:
+            ERRORS.labels(self.base_url, MODE_API, 'ws_call').inc()
             logger.error(f"API 請求失敗: {e}")
             raise
         except Exception as e:
@@ -158,22 +392,10 @@ class MoodleAPIClient:
 
             logger.info(f"✓ 找到 {len(courses)} 門課程")
 
-            # 格式化課程資料
-            formatted_courses = []
-            for course in courses:
-                formatted_courses.append({
-                    'id': str(course.get('id')),
-                    'name': course.get('fullname', course.get('shortname', 'Unknown')),
-                    'shortname': course.get('shortname', ''),
-                    'url': f"{self.base_url}/course/view.php?id={course.get('id')}",
-                    'description': course.get('summary', ''),
-                    'visible': course.get('visible', 1) == 1,
-                    'startdate': course.get('startdate'),
-                    'enddate': course.get('enddate'),
-                })
-
-            return formatted_courses
+            return format_courses(self.base_url, courses)
 
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"獲取課程列表失敗: {e}")
             return []
@@ -195,46 +417,10 @@ class MoodleAPIClient:
 
             logger.info(f"✓ 獲取課程 {course_id} 的內容，共 {len(contents)} 個章節")
 
-            # 格式化章節資料
-            formatted_sections = []
-            for section in contents:
-                activities = []
-
-                for module in section.get('modules', []):
-                    activity = {
-                        'id': module.get('id'),
-                        'name': module.get('name'),
-                        'modname': module.get('modname'),  # 活動類型 (assign, resource, forum, etc.)
-                        'url': module.get('url'),
-                        'description': module.get('description', ''),
-                        'visible': module.get('visible', 1) == 1,
-                    }
-
-                    # 如果是檔案資源，加入檔案資訊
-                    if 'contents' in module:
-                        activity['files'] = [
-                            {
-                                'filename': content.get('filename'),
-                                'fileurl': content.get('fileurl'),
-                                'filesize': content.get('filesize'),
-                                'mimetype': content.get('mimetype'),
-                            }
-                            for content in module.get('contents', [])
-                        ]
-
-                    activities.append(activity)
-
-                formatted_sections.append({
-                    'id': section.get('id'),
-                    'name': section.get('name', f"Section {section.get('section', 0)}"),
-                    'section': section.get('section'),
-                    'summary': section.get('summary', ''),
-                    'visible': section.get('visible', 1) == 1,
-                    'activities': activities
-                })
-
-            return formatted_sections
+            return format_course_contents(contents)
 
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"獲取課程內容失敗: {e}")
             return []
@@ -258,28 +444,13 @@ class MoodleAPIClient:
 
             logger.info(f"✓ 找到 {len(assignments.get('courses', []))} 個課程的作業")
 
-            # 格式化作業資料
-            all_assignments = []
-            for course in assignments.get('courses', []):
-                course_id = course.get('id')
-                course_name = course.get('fullname', '')
-
-                for assignment in course.get('assignments', []):
-                    all_assignments.append({
-                        'id': str(assignment.get('id')),
-                        'course_id': str(course_id),
-                        'course_name': course_name,
-                        'name': assignment.get('name'),
-                        'intro': assignment.get('intro', ''),
-                        'duedate': assignment.get('duedate'),
-                        'allowsubmissionsfromdate': assignment.get('allowsubmissionsfromdate'),
-                        'cutoffdate': assignment.get('cutoffdate'),
-                        'url': f"{self.base_url}/mod/assign/view.php?id={assignment.get('cmid')}",
-                    })
+            all_assignments = format_assignments(self.base_url, assignments)
 
             logger.info(f"✓ 總共 {len(all_assignments)} 個作業")
             return all_assignments
 
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"獲取作業列表失敗: {e}")
             return []
@@ -296,22 +467,10 @@ class MoodleAPIClient:
 
             logger.info(f"✓ 找到 {len(events.get('events', []))} 個即將到來的事件")
 
-            # 格式化事件資料
-            formatted_events = []
-            for event in events.get('events', []):
-                formatted_events.append({
-                    'id': event.get('id'),
-                    'name': event.get('name'),
-                    'description': event.get('description', ''),
-                    'eventtype': event.get('eventtype'),
-                    'timestart': event.get('timestart'),
-                    'timeduration': event.get('timeduration'),
-                    'course_id': event.get('course', {}).get('id') if event.get('course') else None,
-                    'url': event.get('url'),
-                })
-
-            return formatted_events
+            return format_calendar_events(events)
 
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"獲取行事曆事件失敗: {e}")
             return []
@@ -1,21 +1,149 @@
 """Moodle 爬蟲核心模組"""
 import time
 import json
+import hashlib
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import TimeoutException
+from .driver_pool import DriverPool, PooledDriver, create_chrome_driver
+from .session_cache import SessionCache
+from .readiness import PhaseTimer, Readiness
+from .dom_extract import extract_course_links, extract_sections, extract_text
+from .selector_cache import SelectorCache
+from .executor import current_cancel_event, raise_if_cancelled
+from .progress import ProgressReporter
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from .rate_limiter import SiteRateLimiter
+from .metrics import (
+    BROWSER_START_SECONDS,
+    COURSE_LIST_SECONDS,
+    COURSE_PARSE_SECONDS,
+    ERRORS,
+    LOGIN_SECONDS,
+    MODE_SELENIUM,
+)
+from .tracing import current_span, propagate, traced
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 課程列表選擇器（依優先順序）
+COURSE_SELECTORS = [
+    ".coursename a",  # 標準 Moodle
+    "a.aalink.coursename",  # 新版 Moodle
+    "[data-type='course'] a",  # 使用 data 屬性
+    ".course-info-container a",  # 課程資訊容器
+    "div.course-content a[href*='course/view']",  # 包含課程連結
+    "a[href*='course/view.php']",  # 直接找課程連結
+    ".dashboard-card a",  # Dashboard 卡片
+    "[class*='course'] a[href*='/course/']",  # 通用課程連結
+]
+
+# 課程內容選擇器
+SECTION_SELECTOR = "li.section.main"
+SECTION_TITLE_SELECTOR = ".sectionname"
+ACTIVITY_SELECTOR = ".activity"
+COURSE_HEADING_SELECTOR = ".page-header-headings h1, #page-header h1"
+
+# 活動 class 關鍵字對應的活動類型（依優先順序）
+ACTIVITY_TYPES = [
+    ('resource', 'resource'),
+    ('assign', 'assignment'),
+    ('forum', 'forum'),
+    ('quiz', 'quiz'),
+    ('url', 'url'),
+]
+
+
+def classify_activity(class_attr: Optional[str]) -> str:
+    """依活動元素的 class 判斷活動類型"""
+    class_attr = class_attr or ''
+    for keyword, activity_type in ACTIVITY_TYPES:
+        if keyword in class_attr:
+            return activity_type
+    return 'unknown'
+
+
+def parse_course_id(course_url: str) -> Optional[str]:
+    """從課程 URL 中提取課程 ID"""
+    return course_url.split('id=')[-1].split('&')[0] if 'id=' in course_url else None
+
+
+def course_stub(base_url: str, course_id: str) -> Dict[str, Any]:
+    """只有課程 ID 時建立課程資訊（名稱於解析課程頁面時補上）"""
+    return {
+        'id': course_id,
+        'name': '',
+        'url': f"{base_url.rstrip('/')}/course/view.php?id={course_id}",
+        'sections': []
+    }
+
+
+def build_courses(links: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """
+    將 (課程名稱, 連結) 轉為課程列表，過濾非課程連結並去除重複
+
+    Args:
+        links: (name, url) 列表
+
+    Returns:
+        課程列表，每個課程包含 id, name, url, sections
+    """
+    courses = []
+    seen_urls = set()  # 避免重複
+
+    for course_name, course_url in links:
+        if course_name and course_url and course_url not in seen_urls:
+            # 過濾掉非課程連結
+            if 'course/view' in course_url and '?' in course_url:
+                seen_urls.add(course_url)
+                courses.append({
+                    'id': parse_course_id(course_url),
+                    'name': course_name,
+                    'url': course_url,
+                    'sections': []
+                })
+
+    return courses
+
+
+# 嘗試快取定位器的逾時秒數
+CACHED_SELECTOR_TIMEOUT = 3
+
+# WebDriver 預設的頁面載入逾時秒數
+DEFAULT_PAGE_LOAD_TIMEOUT = 300
+
+# 可透過 CDP Network.setCookie 還原的 cookie 欄位
+_CDP_COOKIE_FIELDS = ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite', 'expires')
 
 
 class MoodleScraper:
     """Moodle 爬蟲類"""
 
-    def __init__(self, base_url: str, username: str, password: str, headless: bool = True):
+    def __init__(
+        self,
+        base_url: str,
+        username: str,
+        password: str,
+        headless: bool = True,
+        driver_pool: Optional[DriverPool] = None,
+        session_cache: Optional[SessionCache] = None,
+        course_workers: int = 1,
+        course_timeout: Optional[float] = None,
+        timer: Optional[PhaseTimer] = None,
+        selector_cache: Optional[SelectorCache] = None,
+        progress: Optional[ProgressReporter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        rate_limiter: Optional[SiteRateLimiter] = None
+    ):
         """
         初始化爬蟲
 
@@ -24,12 +152,34 @@ class MoodleScraper:
             username: 登入帳號
             password: 登入密碼
             headless: 是否使用無頭模式
+            driver_pool: 瀏覽器連線池（僅無頭模式使用）
+            session_cache: 登入狀態快取
+            course_workers: 同時解析課程內容的瀏覽器數量
+            course_timeout: 單門課程解析的逾時秒數
+            timer: 等待時間記錄器（平行解析時共用）
+            selector_cache: 選擇器學習快取
+            progress: 進度回報
+            retry_policy: 頁面載入失敗時的重試策略
+            breaker: 網站的斷路器（網站無法連線時不啟動瀏覽器）
+            rate_limiter: 網站的速率限制（頁面載入與登入表單送出前等待）
         """
         self.base_url = base_url.rstrip('/')
         self.username = username
         self.password = password
         self.headless = headless
+        self.driver_pool = driver_pool
+        self.session_cache = session_cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker
+        self.rate_limiter = rate_limiter
+        self.course_workers = max(1, course_workers)
+        self.course_timeout = course_timeout
+        self.timer = timer or PhaseTimer()
+        self.selector_cache = selector_cache
+        self.progress = progress or ProgressReporter()
         self.driver: Optional[webdriver.Chrome] = None
+        self.ready: Optional[Readiness] = None
+        self._lease: Optional[PooledDriver] = None
 
     def __enter__(self):
         """Context manager 入口"""
@@ -40,38 +190,82 @@ class MoodleScraper:
         """Context manager 出口"""
         self.close()
 
-    def start(self):
-        """啟動瀏覽器"""
-        options = Options()
-        if self.headless:
-            options.add_argument('--headless')
-            options.add_argument('--disable-gpu')
-
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--window-size=1920,1080')
-
-        # 設定下載偏好
-        prefs = {
-            'download.prompt_for_download': False,
-            'download.directory_upgrade': True,
-            'safebrowsing.enabled': False
-        }
-        options.add_experimental_option('prefs', prefs)
+    @traced('scraper.browser_start')
+    def start(self, lease_timeout: Optional[float] = None):
+        """
+        啟動瀏覽器（有連線池時改為租用）
 
-        self.driver = webdriver.Chrome(options=options)
-        self.driver.implicitly_wait(10)
-        print("✓ 瀏覽器已啟動")
+        Args:
+            lease_timeout: 等待連線池可用瀏覽器的秒數，預設使用連線池設定
+        """
+        if self.breaker:
+            self.breaker.check()
+
+        started = time.monotonic()
+        if self.driver_pool and self.headless:
+            self._lease = self.driver_pool.lease((self.base_url, self._tenant_id()), timeout=lease_timeout)
+            self.driver = self._lease.driver
+            self.ready = Readiness(self.driver, self.timer)
+            logger.debug("✓ 已從連線池取得瀏覽器")
+            self._browser_started(True, time.monotonic() - started)
+            return
+
+        self.driver = create_chrome_driver(self.headless)
+        self.ready = Readiness(self.driver, self.timer)
+        logger.info("✓ 瀏覽器已啟動")
+        self._browser_started(False, time.monotonic() - started)
+
+    def _browser_started(self, pooled: bool, seconds: float):
+        """記錄瀏覽器啟動（或租用）耗時"""
+        BROWSER_START_SECONDS.labels(self.base_url, MODE_SELENIUM, str(pooled).lower()).observe(seconds)
+        self.progress.emit('browser_start', pooled=pooled, seconds=round(seconds, 3))
 
     def close(self):
-        """關閉瀏覽器"""
-        if self.driver:
+        """關閉瀏覽器（租用的瀏覽器則歸還連線池）"""
+        if self._lease:
+            self.driver_pool.release(self._lease)
+            self._lease = None
+            self.driver = None
+            logger.debug("✓ 瀏覽器已歸還連線池")
+        elif self.driver:
             self.driver.quit()
-            print("✓ 瀏覽器已關閉")
+            self.driver = None
+            logger.info("✓ 瀏覽器已關閉")
 
+    def _tenant_id(self) -> str:
+        """連線池租用者識別（綁定密碼，避免以錯誤密碼沿用他人已登入的瀏覽器）"""
+        digest = hashlib.sha256(f"{self.username}\n{self.password}".encode('utf-8')).hexdigest()
+        return f"{self.username}:{digest[:16]}"
+
+    def _navigate(self, url: str, retry_timeout: bool = True):
+        """
+        載入頁面並記錄載入次數（網路錯誤或逾時依重試策略重試）
+
+        Args:
+            url: 頁面網址
+            retry_timeout: 載入逾時是否重試並計入斷路器（套用單一課程逾時時不重試，
+                否則會將設定的逾時放大數倍，且較慢的課程會讓斷路器跳脫）
+        """
+        def load():
+            self._throttle()
+            self.driver.get(url)
+
+        ignore = () if retry_timeout else (TimeoutException,)
+        self.retry_policy.call(load, breaker=self.breaker, op='page_load', mode=MODE_SELENIUM, ignore=ignore)
+        if self._lease:
+            self._lease.mark_page_loaded()
+
+    def _throttle(self):
+        """等待網站的速率限制（頁面載入、點擊會跳頁的按鈕前呼叫）"""
+        if self.rate_limiter:
+            self.rate_limiter.acquire(self.username)
+
+    @traced('scraper.login')
     def login(self) -> bool:
         """
-        登入 Moodle 系統（支援 SSO 單一登入）
+        登入 Moodle 系統
+
+        優先還原快取的登入狀態，失效時才進行完整的 SSO 登入。
 
         Returns:
             是否登入成功
@@ -79,29 +273,140 @@ class MoodleScraper:
         if not self.driver:
             raise RuntimeError("瀏覽器未啟動，請先呼叫 start()")
 
+        started = time.monotonic()
+        if self.session_cache and self._restore_session():
+            current_span().set(restored=True)
+            LOGIN_SECONDS.labels(self.base_url, MODE_SELENIUM, 'true').observe(time.monotonic() - started)
+            return True
+
+        started = time.monotonic()
+        if not self._full_login():
+            ERRORS.labels(self.base_url, MODE_SELENIUM, 'login').inc()
+            return False
+
+        login_seconds = time.monotonic() - started
+        current_span().set(restored=False)
+        LOGIN_SECONDS.labels(self.base_url, MODE_SELENIUM, 'false').observe(login_seconds)
+        if self.session_cache:
+            self._save_session(login_seconds)
+        return True
+
+    def export_cookies(self) -> List[Dict[str, Any]]:
+        """取得瀏覽器所有網域的 cookies（包含 SSO 網域）"""
+        return self.driver.execute_cdp_cmd('Network.getAllCookies', {}).get('cookies', [])
+
+    def import_cookies(self, cookies: List[Dict[str, Any]]):
+        """將 cookies 注入瀏覽器"""
+        for cookie in cookies:
+            params = {k: cookie[k] for k in _CDP_COOKIE_FIELDS if k in cookie}
+            if cookie.get('session') or params.get('expires', 0) <= 0:
+                params.pop('expires', None)
+            self.driver.execute_cdp_cmd('Network.setCookie', params)
+
+    def is_logged_in(self, timeout: float = 5) -> bool:
+        """以 usermenu 是否存在快速檢查登入狀態"""
+        return self.ready.element((By.CLASS_NAME, "usermenu"), timeout, 'login.session_probe') is not None
+
+    def _find_first(
+        self,
+        kind: str,
+        candidates: List[Tuple[str, str]],
+        timeout: float,
+        phase: str,
+        predicate=None
+    ) -> Optional[Tuple[Tuple[str, str], Any]]:
+        """
+        依序尋找第一個存在的元素，優先以短逾時嘗試上次成功的定位器
+
+        Args:
+            kind: 選擇器快取的種類
+            candidates: 依優先順序的定位器
+            timeout: 全部候選的等待秒數
+            phase: 記錄用的階段名稱
+            predicate: 元素需符合的條件
+
+        Returns:
+            (locator, element)，找不到時返回 None
+        """
+        cache = self.selector_cache
+        cached = cache.get(self.base_url, kind) if cache else None
+        if cached in candidates:
+            found = self.ready.any_element([cached], CACHED_SELECTOR_TIMEOUT, f"{phase}.cached", predicate)
+            cache.record(self.base_url, kind, found is not None)
+            if found:
+                return found
+
+        found = self.ready.any_element(candidates, timeout, phase, predicate)
+        if found and cache:
+            cache.remember(self.base_url, kind, found[0])
+        return found
+
+    def _restore_session(self) -> bool:
+        """注入快取的 cookies 並確認登入狀態仍有效"""
+        cached = self.session_cache.get(self.base_url, self.username, self.password)
+        if not cached:
+            self.session_cache.record_miss("無快取")
+            return False
+
+        started = time.monotonic()
+        try:
+            logger.debug("→ 還原快取的登入狀態")
+            self.import_cookies(cached.cookies)
+            self._navigate(f"{self.base_url}/my/")
+            logged_in = self.is_logged_in()
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            # 網路或逾時錯誤無法判斷登入狀態是否失效，保留快取
+            logger.warning(f"⚠ 還原登入狀態失敗: {e}")
+            self.session_cache.record_miss("還原失敗")
+            return False
+
+        if logged_in:
+            logger.info("✓ 已使用快取的登入狀態")
+            self.session_cache.record_hit(cached.login_seconds - (time.monotonic() - started))
+            return True
+
+        self.session_cache.invalidate(self.base_url, self.username)
+        self.session_cache.record_miss("登入狀態已失效")
+        return False
+
+    def _save_session(self, login_seconds: float):
+        """儲存登入成功後的 cookies"""
         try:
-            print(f"→ 正在訪問 {self.base_url}")
-            self.driver.get(self.base_url)
+            self.session_cache.put(
+                self.base_url, self.username, self.password, self.export_cookies(), login_seconds
+            )
+        except Exception as e:
+            logger.warning(f"⚠ 儲存登入狀態失敗: {e}")
+
+    def _full_login(self) -> bool:
+        """
+        完整登入流程（支援 SSO 單一登入）
+
+        Returns:
+            是否登入成功
+        """
+        try:
+            logger.debug(f"→ 正在訪問 {self.base_url}")
+            self._navigate(self.base_url)
 
             # 等待頁面載入
             wait = WebDriverWait(self.driver, 20)
-            time.sleep(3)
+            self.ready.network_idle(10, 'login.landing')
 
             # 檢查是否已經登入
-            try:
-                self.driver.find_element(By.CLASS_NAME, "usermenu")
-                print("✓ 已經是登入狀態")
+            if self.is_logged_in(timeout=0):
+                logger.info("✓ 已經是登入狀態")
                 return True
-            except NoSuchElementException:
-                pass
 
             # 嘗試多種登入方式
-            print("→ 尋找登入入口...")
+            logger.debug("→ 尋找登入入口...")
             
             # 檢查是否在 iframe 中
             iframes = self.driver.find_elements(By.TAG_NAME, "iframe")
             if iframes:
-                print(f"→ 發現 {len(iframes)} 個 iframe，嘗試切換...")
+                logger.debug(f"→ 發現 {len(iframes)} 個 iframe，嘗試切換...")
                 for i, iframe in enumerate(iframes):
                     try:
                         self.driver.switch_to.frame(iframe)
@@ -109,7 +414,7 @@ class MoodleScraper:
                         if self.driver.find_elements(By.ID, "username") or \
                            self.driver.find_elements(By.NAME, "username") or \
                            self.driver.find_elements(By.CSS_SELECTOR, "input[type='text']"):
-                            print(f"  ✓ 在 iframe {i} 中找到登入表單")
+                            logger.debug(f"✓ 在 iframe {i} 中找到登入表單")
                             break
                         else:
                             # 切換回主頁面
@@ -142,40 +447,43 @@ class MoodleScraper:
                 ]
 
                 sso_button_found = False
-                for selector in sso_selectors:
-                    try:
-                        sso_buttons = self.driver.find_elements(By.XPATH, selector)
-                        if sso_buttons:
-                            button_text = sso_buttons[0].text or sso_buttons[0].get_attribute('value') or 'SSO'
-                            print(f"→ 找到登入按鈕: {button_text}")
-                            sso_buttons[0].click()
-                            sso_button_found = True
-                            print("→ 等待跳轉到 INCCU 登入頁面...")
-                            time.sleep(5)  # 增加等待時間，等待頁面跳轉
-
-                            # 檢查是否已跳轉到 INCCU
-                            current_url = self.driver.current_url.lower()
-                            if 'inccu' in current_url or 'sso' in current_url:
-                                print(f"  ✓ 已跳轉到 INCCU 登入頁面: {self.driver.current_url}")
-                            break
-                    except:
-                        continue
+                found = self._find_first(
+                    'sso_button', [(By.XPATH, selector) for selector in sso_selectors], 5, 'login.sso_button'
+                )
+                if found:
+                    sso_button = found[1]
+                    button_text = sso_button.text or sso_button.get_attribute('value') or 'SSO'
+                    logger.debug(f"→ 找到登入按鈕: {button_text}")
+                    previous_url = self.driver.current_url
+                    self._throttle()
+                    sso_button.click()
+                    sso_button_found = True
+                    logger.debug("→ 等待跳轉到 INCCU 登入頁面...")
+                    self.ready.url_change(previous_url, 10, 'login.sso_redirect')
+                    self.ready.network_idle(10, 'login.sso_page')
+
+                    # 檢查是否已跳轉到 INCCU
+                    current_url = self.driver.current_url.lower()
+                    if 'inccu' in current_url or 'sso' in current_url:
+                        logger.debug(f"✓ 已跳轉到 INCCU 登入頁面: {self.driver.current_url}")
 
                 if sso_button_found:
-                    print("  ℹ 使用政大 INCCU 單一登入，請使用您的政大帳號密碼")
+                    logger.debug("ℹ 使用政大 INCCU 單一登入，請使用您的政大帳號密碼")
             except Exception as e:
-                print(f"→ 尋找 SSO 按鈕時發生錯誤: {e}")
+                logger.debug(f"→ 尋找 SSO 按鈕時發生錯誤: {e}")
             
             # 方式2: 檢查是否有 "login" 連結或導向到登入頁面
             try:
                 login_links = self.driver.find_elements(By.XPATH, 
                     "//a[contains(@href, 'login')] | //a[contains(text(), '登入')]")
                 if login_links:
-                    print("→ 找到登入連結")
+                    logger.debug("→ 找到登入連結")
+                    previous_url = self.driver.current_url
                     login_links[0].click()
-                    time.sleep(3)
+                    self.ready.url_change(previous_url, 5, 'login.link_redirect')
+                    self.ready.network_idle(10, 'login.form_page')
             except Exception as e:
-                print(f"→ 尋找登入連結時發生錯誤: {e}")
+                logger.debug(f"→ 尋找登入連結時發生錯誤: {e}")
 
             # 方式3: 直接尋找帳號輸入框（包含 INCCU SSO 登入表單）
             username_field = None
@@ -207,15 +515,10 @@ class MoodleScraper:
                 (By.CSS_SELECTOR, "input[placeholder*='Email']"),
             ]
             
-            for by_method, selector in possible_selectors:
-                try:
-                    username_field = wait.until(
-                        EC.presence_of_element_located((by_method, selector))
-                    )
-                    print(f"→ 找到帳號輸入框: {by_method}={selector}")
-                    break
-                except (NoSuchElementException, TimeoutException):
-                    continue
+            found = self._find_first('username', possible_selectors, 20, 'login.username_field')
+            if found:
+                (by_method, selector), username_field = found
+                logger.debug(f"→ 找到帳號輸入框: {by_method}={selector}")
 
             # 如果還是找不到，嘗試所有可見的 text input
             if not username_field:
@@ -224,33 +527,31 @@ class MoodleScraper:
                     visible_inputs = [inp for inp in text_inputs if inp.is_displayed()]
                     if visible_inputs:
                         username_field = visible_inputs[0]
-                        print("→ 找到可見的文字輸入框")
+                        logger.debug("→ 找到可見的文字輸入框")
                 except:
                     pass
 
             if not username_field:
-                print("✗ 無法找到帳號輸入框")
-                print(f"→ 當前 URL: {self.driver.current_url}")
-                print(f"→ 頁面標題: {self.driver.title}")
+                logger.error("✗ 無法找到帳號輸入框")
+                logger.debug(f"→ 當前 URL: {self.driver.current_url}")
+                logger.debug(f"→ 頁面標題: {self.driver.title}")
                 # 保存頁面資訊以便除錯
                 self.driver.save_screenshot("/tmp/moodle_login_error.png")
                 with open("/tmp/moodle_page_source.html", "w", encoding="utf-8") as f:
                     f.write(self.driver.page_source)
-                print("→ 已儲存截圖至 /tmp/moodle_login_error.png")
-                print("→ 已儲存頁面原始碼至 /tmp/moodle_page_source.html")
+                logger.debug("→ 已儲存截圖至 /tmp/moodle_login_error.png")
+                logger.debug("→ 已儲存頁面原始碼至 /tmp/moodle_page_source.html")
                 return False
 
             # 輸入帳號
-            print("→ 輸入帳號")
+            logger.debug("→ 輸入帳號")
             try:
                 # 等待輸入框變為可點擊
                 wait.until(EC.element_to_be_clickable(username_field))
-                time.sleep(0.5)
-                
+
                 # 點擊輸入框以獲得焦點
                 try:
                     username_field.click()
-                    time.sleep(0.3)
                 except:
                     pass
                 
@@ -261,19 +562,19 @@ class MoodleScraper:
                     pass
                 
                 username_field.send_keys(self.username)
-                time.sleep(0.5)
-                print(f"  ✓ 已輸入帳號")
+                self.ready.value_set(username_field, 2, 'login.username_input')
+                logger.debug("✓ 已輸入帳號")
             except Exception as e:
-                print(f"  ⚠ 輸入帳號時發生錯誤: {e}")
+                logger.warning(f"⚠ 輸入帳號時發生錯誤: {e}")
                 # 嘗試用 JavaScript 輸入
                 try:
                     self.driver.execute_script(
                         f"arguments[0].value = '{self.username}';",
                         username_field
                     )
-                    print(f"  ✓ 已使用 JavaScript 輸入帳號")
+                    logger.debug("✓ 已使用 JavaScript 輸入帳號")
                 except Exception as js_error:
-                    print(f"  ✗ JavaScript 輸入也失敗: {js_error}")
+                    logger.error(f"✗ JavaScript 輸入也失敗: {js_error}")
                     self.driver.save_screenshot("/tmp/moodle_username_error.png")
                     return False
 
@@ -298,27 +599,23 @@ class MoodleScraper:
                 (By.CSS_SELECTOR, "input[placeholder*='Password']"),
             ]
             
-            for by_method, selector in password_selectors:
-                try:
-                    password_field = self.driver.find_element(by_method, selector)
-                    print(f"→ 找到密碼輸入框: {by_method}={selector}")
-                    break
-                except NoSuchElementException:
-                    continue
+            found = self._find_first('password', password_selectors, 10, 'login.password_field')
+            if found:
+                (by_method, selector), password_field = found
+                logger.debug(f"→ 找到密碼輸入框: {by_method}={selector}")
 
             if not password_field:
-                print("✗ 無法找到密碼輸入框")
-                print(f"→ 當前 URL: {self.driver.current_url}")
+                logger.error("✗ 無法找到密碼輸入框")
+                logger.debug(f"→ 當前 URL: {self.driver.current_url}")
                 return False
 
             # 輸入密碼
-            print("→ 輸入密碼")
+            logger.debug("→ 輸入密碼")
             try:
                 # 確保密碼框可點擊
-                time.sleep(0.5)
+                self.ready.clickable(password_field, 5, 'login.password_ready')
                 try:
                     password_field.click()
-                    time.sleep(0.3)
                 except:
                     pass
                 
@@ -329,19 +626,19 @@ class MoodleScraper:
                     pass
                 
                 password_field.send_keys(self.password)
-                time.sleep(0.5)
-                print(f"  ✓ 已輸入密碼")
+                self.ready.value_set(password_field, 2, 'login.password_input')
+                logger.debug("✓ 已輸入密碼")
             except Exception as e:
-                print(f"  ⚠ 輸入密碼時發生錯誤: {e}")
+                logger.warning(f"⚠ 輸入密碼時發生錯誤: {e}")
                 # 嘗試用 JavaScript 輸入
                 try:
                     self.driver.execute_script(
                         f"arguments[0].value = '{self.password}';",
                         password_field
                     )
-                    print(f"  ✓ 已使用 JavaScript 輸入密碼")
+                    logger.debug("✓ 已使用 JavaScript 輸入密碼")
                 except Exception as js_error:
-                    print(f"  ✗ JavaScript 輸入也失敗: {js_error}")
+                    logger.error(f"✗ JavaScript 輸入也失敗: {js_error}")
                     self.driver.save_screenshot("/tmp/moodle_password_error.png")
                     return False
 
@@ -367,35 +664,35 @@ class MoodleScraper:
                 (By.XPATH, "//button[contains(., '登入')] | //button[contains(., 'Login')] | //button[contains(., '送出')] | //button[contains(., 'Sign in')] | //input[@value='登入'] | //input[@value='Login']"),
             ]
             
-            for by_method, selector in button_selectors:
-                try:
-                    buttons = self.driver.find_elements(by_method, selector)
-                    visible_buttons = [btn for btn in buttons if btn.is_displayed() and btn.is_enabled()]
-                    if visible_buttons:
-                        login_button = visible_buttons[0]
-                        print(f"→ 找到登入按鈕: {by_method}={selector}")
-                        break
-                except:
-                    continue
-
+            found = self._find_first(
+                'login_button', button_selectors, 5, 'login.submit_button',
+                predicate=lambda btn: btn.is_displayed() and btn.is_enabled()
+            )
+            if found:
+                (by_method, selector), login_button = found
+                logger.debug(f"→ 找到登入按鈕: {by_method}={selector}")
+
+            self._throttle()
             if not login_button:
-                print("✗ 無法找到登入按鈕，嘗試按 Enter")
+                logger.warning("⚠ 無法找到登入按鈕，嘗試按 Enter")
+                previous_url = self.driver.current_url
                 # 如果找不到按鈕，嘗試在密碼框按 Enter
                 from selenium.webdriver.common.keys import Keys
                 password_field.send_keys(Keys.RETURN)
             else:
                 # 點擊登入
-                print("→ 點擊登入按鈕")
+                logger.debug("→ 點擊登入按鈕")
+                previous_url = self.driver.current_url
                 try:
                     login_button.click()
                 except:
                     # 如果點擊失敗，嘗試用 JavaScript 點擊
                     self.driver.execute_script("arguments[0].click();", login_button)
 
-            # 等待登入完成（增加等待時間）
-            print("→ 等待登入完成...")
-            time.sleep(5)
-            
+            # 等待登入完成
+            logger.debug("→ 等待登入完成...")
+            self.ready.url_change(previous_url, 20, 'login.submit_redirect')
+
             # 檢查是否登入成功（多種方式）
             success_indicators = [
                 (By.CLASS_NAME, "usermenu"),
@@ -403,19 +700,15 @@ class MoodleScraper:
                 (By.XPATH, "//*[contains(@class, 'usermenu')]"),
                 (By.XPATH, "//*[contains(@class, 'userbutton')]"),
             ]
-            
-            for by_method, selector in success_indicators:
-                try:
-                    wait.until(EC.presence_of_element_located((by_method, selector)))
-                    print("✓ 登入成功")
-                    return True
-                except TimeoutException:
-                    continue
+
+            if self.ready.any_element(success_indicators, 20, 'login.result'):
+                logger.info("✓ 登入成功")
+                return True
             
             # 檢查 URL 是否改變（表示可能登入成功）
             current_url = self.driver.current_url.lower()
             if any(keyword in current_url for keyword in ["my", "dashboard", "course", "/my/"]):
-                print(f"✓ 登入成功 (URL 已變更: {self.driver.current_url})")
+                logger.info(f"✓ 登入成功 (URL 已變更: {self.driver.current_url})")
                 return True
             
             # 檢查是否有錯誤訊息
@@ -424,27 +717,30 @@ class MoodleScraper:
                     "//*[contains(@class, 'error')] | //*[contains(@class, 'alert')]")
                 if error_elements:
                     error_text = " ".join([e.text for e in error_elements if e.text])
-                    print(f"✗ 登入失敗，錯誤訊息: {error_text}")
+                    logger.error(f"✗ 登入失敗，錯誤訊息: {error_text}")
             except:
                 pass
             
-            print(f"✗ 登入失敗，當前 URL: {self.driver.current_url}")
+            logger.error(f"✗ 登入失敗，當前 URL: {self.driver.current_url}")
             self.driver.save_screenshot("/tmp/moodle_login_failed.png")
             with open("/tmp/moodle_login_failed.html", "w", encoding="utf-8") as f:
                 f.write(self.driver.page_source)
-            print("→ 已儲存截圖至 /tmp/moodle_login_failed.png")
-            print("→ 已儲存頁面原始碼至 /tmp/moodle_login_failed.html")
+            logger.debug("→ 已儲存截圖至 /tmp/moodle_login_failed.png")
+            logger.debug("→ 已儲存頁面原始碼至 /tmp/moodle_login_failed.html")
             return False
 
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            print(f"✗ 登入過程發生錯誤: {e}")
+            logger.error(f"✗ 登入過程發生錯誤: {e}")
             try:
                 self.driver.save_screenshot("/tmp/moodle_error.png")
-                print("→ 已儲存錯誤截圖至 /tmp/moodle_error.png")
+                logger.debug("→ 已儲存錯誤截圖至 /tmp/moodle_error.png")
             except:
                 pass
             return False
 
+    @traced('scraper.course_list')
     def get_courses(self) -> List[Dict[str, Any]]:
         """
         獲取所有課程列表
@@ -455,96 +751,59 @@ class MoodleScraper:
         if not self.driver:
             raise RuntimeError("瀏覽器未啟動")
 
+        started = time.monotonic()
         try:
             # 訪問課程列表頁面
             courses_url = f"{self.base_url}/my/"
-            print(f"→ 正在獲取課程列表: {courses_url}")
-            self.driver.get(courses_url)
-
-            wait = WebDriverWait(self.driver, 10)
-            time.sleep(2)
-
-            # 嘗試多種課程選擇器
-            course_elements = []
-            selectors = [
-                ".coursename a",  # 標準 Moodle
-                "a.aalink.coursename",  # 新版 Moodle
-                "[data-type='course'] a",  # 使用 data 屬性
-                ".course-info-container a",  # 課程資訊容器
-                "div.course-content a[href*='course/view']",  # 包含課程連結
-                "a[href*='course/view.php']",  # 直接找課程連結
-                ".dashboard-card a",  # Dashboard 卡片
-                "[class*='course'] a[href*='/course/']",  # 通用課程連結
-            ]
-            
-            for selector in selectors:
-                try:
-                    elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                    if elements:
-                        print(f"  → 使用選擇器找到 {len(elements)} 個元素: {selector}")
-                        course_elements = elements
-                        break
-                except:
-                    continue
-            
-            # 如果還是找不到，嘗試尋找所有包含 course/view 的連結
-            if not course_elements:
-                try:
-                    all_links = self.driver.find_elements(By.TAG_NAME, "a")
-                    course_elements = [
-                        link for link in all_links 
-                        if link.get_attribute('href') and 'course/view' in link.get_attribute('href')
-                    ]
-                    print(f"  → 使用通用方法找到 {len(course_elements)} 個課程連結")
-                except:
-                    pass
+            logger.debug(f"→ 正在獲取課程列表: {courses_url}")
+            self._navigate(courses_url)
+
+            # 課程總覽可能由 AJAX 載入，等待任一課程選擇器出現或網路閒置
+            course_locators = [(By.CSS_SELECTOR, selector) for selector in COURSE_SELECTORS]
+            found = self._find_first('course_list', course_locators, 10, 'courses.list')
+            if not found:
+                self.ready.network_idle(5, 'courses.network_idle')
+
+            # 嘗試多種課程選擇器（找不到時改用所有包含 course/view 的連結），命中的選擇器優先
+            selectors = list(COURSE_SELECTORS)
+            if found:
+                selectors.remove(found[0][1])
+                selectors.insert(0, found[0][1])
+            selector, links = extract_course_links(self.driver, selectors)
+            if selector:
+                logger.debug(f"→ 使用選擇器找到 {len(links)} 個元素: {selector}")
+            else:
+                logger.debug(f"→ 使用通用方法找到 {len(links)} 個課程連結")
 
-            courses = []
-            seen_urls = set()  # 避免重複
-            
-            for elem in course_elements:
-                try:
-                    course_name = elem.text.strip()
-                    course_url = elem.get_attribute('href')
-
-                    if course_name and course_url and course_url not in seen_urls:
-                        # 過濾掉非課程連結
-                        if 'course/view' in course_url and '?' in course_url:
-                            seen_urls.add(course_url)
-                            
-                            # 從 URL 中提取課程 ID
-                            course_id = course_url.split('id=')[-1].split('&')[0] if 'id=' in course_url else None
-
-                            courses.append({
-                                'id': course_id,
-                                'name': course_name,
-                                'url': course_url,
-                                'sections': []
-                            })
-                except Exception as e:
-                    continue
+            courses = build_courses([(link['text'], link['href']) for link in links])
 
-            print(f"✓ 找到 {len(courses)} 門課程")
+            logger.info(f"✓ 找到 {len(courses)} 門課程")
             
             # 如果沒找到課程，保存頁面供除錯
             if len(courses) == 0:
-                print("⚠ 未找到任何課程，保存頁面供除錯...")
+                logger.warning("⚠ 未找到任何課程，保存頁面供除錯...")
                 try:
                     self.driver.save_screenshot("/tmp/moodle_no_courses.png")
                     with open("/tmp/moodle_no_courses.html", "w", encoding="utf-8") as f:
                         f.write(self.driver.page_source)
-                    print("  → 截圖: /tmp/moodle_no_courses.png")
-                    print("  → 頁面: /tmp/moodle_no_courses.html")
-                    print(f"  → 當前 URL: {self.driver.current_url}")
+                    logger.debug("→ 截圖: /tmp/moodle_no_courses.png")
+                    logger.debug("→ 頁面: /tmp/moodle_no_courses.html")
+                    logger.debug(f"→ 當前 URL: {self.driver.current_url}")
                 except:
                     pass
             
+            current_span().set(courses=len(courses))
+            COURSE_LIST_SECONDS.labels(self.base_url, MODE_SELENIUM).observe(time.monotonic() - started)
             return courses
 
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            print(f"✗ 獲取課程列表失敗: {e}")
+            ERRORS.labels(self.base_url, MODE_SELENIUM, 'course_list').inc()
+            logger.error(f"✗ 獲取課程列表失敗: {e}")
             return []
 
+    @traced('scraper.course')
     def get_course_content(self, course: Dict[str, Any]) -> Dict[str, Any]:
         """
         獲取課程內容（章節、活動、資源）
@@ -558,70 +817,179 @@ class MoodleScraper:
         if not self.driver:
             raise RuntimeError("瀏覽器未啟動")
 
+        current_span().set(course_id=course.get('id'))
+        started = time.monotonic()
         try:
-            print(f"→ 正在解析課程: {course['name']}")
-            self.driver.get(course['url'])
-            time.sleep(2)
+            logger.debug(f"→ 正在解析課程: {course['name'] or course['url']}")
+            if self.course_timeout:
+                self.driver.set_page_load_timeout(self.course_timeout)
+            self._navigate(course['url'], retry_timeout=not self.course_timeout)
+            self.ready.element((By.CSS_SELECTOR, SECTION_SELECTOR), 10, 'course.sections')
+
+            # 沒有課程名稱時從頁面標題補上
+            if not course['name']:
+                course['name'] = extract_text(self.driver, COURSE_HEADING_SELECTOR) or ''
+
+            # 以單次 JavaScript 擷取所有章節與活動
+            sections = extract_sections(
+                self.driver, SECTION_SELECTOR, SECTION_TITLE_SELECTOR, ACTIVITY_SELECTOR
+            )
+
+            for section in sections:
+                # 沒有章節標題的區塊不是課程章節
+                if section['title'] is None:
+                    continue
 
-            # 尋找所有章節
-            sections = self.driver.find_elements(By.CSS_SELECTOR, "li.section.main")
+                activities = [
+                    {
+                        'name': activity['name'],
+                        'url': activity['url'],
+                        'type': classify_activity(activity['className'])
+                    }
+                    for activity in section['activities']
+                    if activity['name'] and activity['url']
+                ]
 
-            for idx, section_elem in enumerate(sections):
-                try:
-                    # 獲取章節標題
-                    title_elem = section_elem.find_element(By.CSS_SELECTOR, ".sectionname")
-                    section_title = title_elem.text.strip() if title_elem else f"Section {idx}"
-
-                    # 獲取該章節的所有活動/資源
-                    activities = []
-                    activity_elements = section_elem.find_elements(By.CSS_SELECTOR, ".activity")
-
-                    for activity_elem in activity_elements:
-                        try:
-                            # 獲取活動名稱和連結
-                            link_elem = activity_elem.find_element(By.CSS_SELECTOR, "a")
-                            activity_name = link_elem.text.strip()
-                            activity_url = link_elem.get_attribute('href')
-
-                            # 判斷活動類型
-                            activity_type = 'unknown'
-                            if 'resource' in activity_elem.get_attribute('class'):
-                                activity_type = 'resource'
-                            elif 'assign' in activity_elem.get_attribute('class'):
-                                activity_type = 'assignment'
-                            elif 'forum' in activity_elem.get_attribute('class'):
-                                activity_type = 'forum'
-                            elif 'quiz' in activity_elem.get_attribute('class'):
-                                activity_type = 'quiz'
-                            elif 'url' in activity_elem.get_attribute('class'):
-                                activity_type = 'url'
-
-                            if activity_name and activity_url:
-                                activities.append({
-                                    'name': activity_name,
-                                    'url': activity_url,
-                                    'type': activity_type
-                                })
-
-                        except NoSuchElementException:
-                            continue
-
-                    course['sections'].append({
-                        'index': idx,
-                        'title': section_title,
-                        'activities': activities
-                    })
-
-                except NoSuchElementException:
-                    continue
+                course['sections'].append({
+                    'index': section['index'],
+                    'title': section['title'],
+                    'activities': activities
+                })
 
-            print(f"✓ 解析完成: 找到 {len(course['sections'])} 個章節")
+            logger.info(f"✓ 解析完成: 找到 {len(course['sections'])} 個章節")
+            current_span().set(sections=len(course['sections']))
+            COURSE_PARSE_SECONDS.labels(self.base_url, MODE_SELENIUM).observe(time.monotonic() - started)
             return course
 
+        except TimeoutException:
+            ERRORS.labels(self.base_url, MODE_SELENIUM, 'course_timeout').inc()
+            current_span().set(error='timeout')
+            logger.error(f"✗ 載入課程頁面逾時: {course['name']}")
+            course['error'] = 'timeout'
+            return course
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            print(f"✗ 解析課程內容失敗: {e}")
+            ERRORS.labels(self.base_url, MODE_SELENIUM, 'course_parse').inc()
+            current_span().set(error=str(e))
+            logger.error(f"✗ 解析課程內容失敗: {e}")
+            course['error'] = 'parse'
+            return course
+        finally:
+            if self.course_timeout:
+                self.driver.set_page_load_timeout(DEFAULT_PAGE_LOAD_TIMEOUT)
+
+    def get_courses_content(self, courses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        解析多門課程內容，course_workers > 1 時以多個瀏覽器同時解析
+
+        額外的瀏覽器從連線池租用（或另外啟動），並注入目前的登入 cookies
+        共用同一個登入狀態。輸出順序與輸入相同。
+
+        Args:
+            courses: 課程列表
+
+        Returns:
+            包含章節內容的課程列表
+        """
+        # 呼叫端取消時（例如 HTTP 用戶端斷線）在課程之間停止
+        cancel_event = current_cancel_event()
+        workers = min(self.course_workers, len(courses))
+        if workers <= 1:
+            results = []
+            for course in courses:
+                raise_if_cancelled(cancel_event)
+                results.append(self.get_course_content(course))
+                self.progress.course_done(results[-1])
+            return results
+
+        cookies = self.export_cookies()
+        helpers: List[MoodleScraper] = []
+        for _ in range(workers - 1):
+            helper = MoodleScraper(
+                self.base_url,
+                self.username,
+                self.password,
+                self.headless,
+                driver_pool=self.driver_pool,
+                course_timeout=self.course_timeout,
+                timer=self.timer,
+                retry_policy=self.retry_policy,
+                breaker=self.breaker,
+                rate_limiter=self.rate_limiter
+            )
+            try:
+                helper.start(lease_timeout=0)
+                helper.import_cookies(cookies)
+                helpers.append(helper)
+            except Exception as e:
+                logger.warning(f"⚠ 無法啟動額外的瀏覽器: {e}")
+                helper.close()
+                break
+
+        available: "queue.Queue[MoodleScraper]" = queue.Queue()
+        for scraper in [self, *helpers]:
+            available.put(scraper)
+
+        def scrape(course: Dict[str, Any]) -> Dict[str, Any]:
+            raise_if_cancelled(cancel_event)
+            scraper = available.get()
+            try:
+                course = scraper.get_course_content(course)
+            finally:
+                available.put(scraper)
+            self.progress.course_done(course)
             return course
 
+        logger.debug(f"→ 使用 {len(helpers) + 1} 個瀏覽器同時解析 {len(courses)} 門課程")
+        try:
+            with ThreadPoolExecutor(max_workers=len(helpers) + 1) as executor:
+                return list(executor.map(propagate(scrape), courses))
+        finally:
+            for helper in helpers:
+                helper.close()
+
+    @traced('scraper.scrape_course')
+    def scrape_course(self, course_id: str, course: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        只爬取單一課程：登入 -> 直接解析 course/view.php?id=<course_id>
+
+        只有在課程頁面無法取得課程名稱時才載入課程列表。
+
+        Args:
+            course_id: 課程 ID
+            course: 已知的課程資訊（id, name, url），沒有時只以 ID 建立
+
+        Returns:
+            與 scrape_all() 相同格式的字典，courses 只包含該課程（找不到時為空）
+        """
+        result = {
+            'timestamp': datetime.now().isoformat(),
+            'base_url': self.base_url,
+            'username': self.username,
+            'courses': []
+        }
+
+        if not self.login():
+            logger.error("✗ 無法繼續，登入失敗")
+            return result
+
+        course = {**course, 'sections': []} if course else course_stub(self.base_url, course_id)
+        course = self.get_course_content(course)
+
+        if not course['name']:
+            logger.debug("→ 課程頁面沒有標題，從課程列表取得課程資訊")
+            listed = next((c for c in self.get_courses() if c['id'] == course_id), None)
+            if not listed:
+                logger.error(f"✗ 找不到課程: {course_id}")
+                return result
+            course['name'] = listed['name']
+
+        result['courses'] = [course]
+        result['timings'] = self.timer.summary()
+        return result
+
+    @traced('scraper.scrape_all')
     def scrape_all(self) -> Dict[str, Any]:
         """
         完整爬取流程：登入 -> 獲取課程 -> 解析內容
@@ -636,29 +1004,34 @@ class MoodleScraper:
             'courses': []
         }
 
-        print("=" * 60)
-        print("開始爬取 Moodle 課程資料")
-        print("=" * 60)
+        logger.info("開始爬取 Moodle 課程資料")
 
         # 登入
         if not self.login():
-            print("✗ 無法繼續，登入失敗")
+            logger.error("✗ 無法繼續，登入失敗")
+            self.progress.emit('login', ok=False)
             return result
+        self.progress.emit('login', ok=True)
+        raise_if_cancelled()
 
         # 獲取課程列表
         courses = self.get_courses()
+        self.progress.courses_found(len(courses))
         if not courses:
-            print("✗ 未找到任何課程")
+            logger.error("✗ 未找到任何課程")
             return result
 
         # 解析每門課程的內容
-        for course in courses:
-            detailed_course = self.get_course_content(course)
-            result['courses'].append(detailed_course)
+        result['courses'] = self.get_courses_content(courses)
+        result['timings'] = self.timer.summary()
+        self.progress.emit('finished', courses=len(result['courses']), timings=result['timings'])
 
-        print("=" * 60)
-        print(f"✓ 完成！共爬取 {len(result['courses'])} 門課程")
-        print("=" * 60)
+        logger.info(f"✓ 完成！共爬取 {len(result['courses'])} 門課程")
+        for phase, stats in result['timings'].items():
+            logger.debug(
+                f"→ 等待 {phase}: {stats['count']} 次，共 {stats['total']:.2f} 秒，"
+                f"最長 {stats['max']:.2f} 秒，逾時 {stats['timeouts']} 次"
+            )
 
         return result
 
@@ -675,4 +1048,4 @@ class MoodleScraper:
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
 
-        print(f"✓ 已儲存至: {output_path}")
+        logger.info(f"✓ 已儲存至: {output_path}")
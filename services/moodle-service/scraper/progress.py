@@ -0,0 +1,80 @@
+"""爬取進度回報
+
+爬蟲在各階段（登入、課程列表、每門課程完成、結束）呼叫回報函式，
+讓同步工作可以查詢目前進度，而不只是寫在伺服器日誌中。
+每個事件都附上開始後經過的秒數與課程完成數。
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 回報函式：接收階段名稱與該階段的資料
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
+# 課程完成函式：接收解析完成的完整課程資料（含章節）
+CourseCallback = Callable[[Dict[str, Any]], None]
+
+
+class ProgressReporter:
+    """將爬取進度轉交給回報函式（可在多個執行緒之間共用）"""
+
+    def __init__(
+        self,
+        callback: Optional[ProgressCallback] = None,
+        on_course: Optional[CourseCallback] = None
+    ):
+        """
+        Args:
+            callback: 回報函式，None 時不回報
+            on_course: 每門課程解析完成時以完整課程資料呼叫（用於串流輸出）
+        """
+        self.callback = callback
+        self.on_course = on_course
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self.courses_total = 0
+        self.courses_done = 0
+
+    def emit(self, phase: str, **data: Any):
+        """回報一個階段，回報函式的錯誤不會中斷爬取"""
+        if not self.callback:
+            return
+        with self._lock:
+            counts = {'courses_done': self.courses_done, 'courses_total': self.courses_total}
+        data = {
+            'elapsed': round(time.monotonic() - self.started, 3),
+            **counts,
+            **data
+        }
+        try:
+            self.callback(phase, data)
+        except Exception as e:
+            logger.warning(f"⚠ 進度回報失敗: {e}")
+
+    def courses_found(self, total: int):
+        """回報課程列表已取得"""
+        with self._lock:
+            self.courses_total = total
+        self.emit('course_list', courses_total=total)
+
+    def course_done(self, course: Dict[str, Any]):
+        """回報一門課程解析完成"""
+        with self._lock:
+            self.courses_done += 1
+            done, total = self.courses_done, self.courses_total
+        if self.on_course:
+            try:
+                self.on_course(course)
+            except Exception as e:
+                logger.warning(f"⚠ 課程輸出失敗: {e}")
+        self.emit(
+            'course_done',
+            course_id=course.get('id'),
+            course_name=course.get('name'),
+            error=course.get('error'),
+            courses_done=done,
+            courses_total=total
+        )
@@ -0,0 +1,181 @@
+"""
+Per-site politeness rate limiting with fair scheduling across users
+
+A whole cohort syncs against the same Moodle host (and its SSO). Every page
+load, form submission and Web Service call first takes a token from the
+site's bucket, so the host never sees more than `rate` requests per second
+(with bursts up to `burst`). Users waiting for a token are served round-robin,
+so one user's 40-course sync cannot starve another user's login.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+import logging
+
+from .executor import raise_if_cancelled
+
+logger = logging.getLogger(__name__)
+
+# Seconds between cancellation checks while waiting for a token
+_WAIT_POLL_INTERVAL = 0.5
+
+# Window used for the requests-per-minute throughput metric
+_THROUGHPUT_WINDOW = 60
+
+
+class SiteRateLimiter:
+    """Token bucket for one Moodle site, handing out tokens round-robin per user"""
+
+    def __init__(self, name: str, rate: float = 5, burst: int = 10):
+        """
+        Initialize limiter
+
+        Args:
+            name: Site the limiter protects (its base URL)
+            rate: Tokens added per second
+            burst: Bucket capacity (requests allowed back to back)
+        """
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._cond = threading.Condition()
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        # Waiting tickets per user; the order of the dict is the round-robin order
+        self._queues: "OrderedDict[str, Deque[object]]" = OrderedDict()
+        self._granted: Deque[float] = deque()
+        self._stats = {"acquired": 0, "waited": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+    def acquire(self, tenant: str = "") -> float:
+        """
+        Wait for this user's turn and a free token
+
+        Args:
+            tenant: User the request is made for (fairness unit)
+
+        Returns:
+            Seconds spent waiting
+        """
+        started = time.monotonic()
+        ticket = object()
+        with self._cond:
+            queue = self._queues.get(tenant)
+            if queue is None:
+                queue = self._queues[tenant] = deque()
+            queue.append(ticket)
+            try:
+                while True:
+                    raise_if_cancelled()
+                    wait = self._try_grant(tenant, ticket)
+                    if wait is None:
+                        break
+                    self._cond.wait(min(wait, _WAIT_POLL_INTERVAL))
+            except BaseException:
+                self._remove(tenant, ticket)
+                self._cond.notify_all()
+                raise
+
+            waited = time.monotonic() - started
+            self._record(waited)
+            self._cond.notify_all()
+        return waited
+
+    async def acquire_async(self, tenant: str = "") -> float:
+        """acquire() for coroutines (waits in a thread, keeping the event loop free)"""
+        return await asyncio.to_thread(self.acquire, tenant)
+
+    def _try_grant(self, tenant: str, ticket: object) -> Optional[float]:
+        """
+        Take a token for the ticket if it is next in line (lock must be held)
+
+        Returns:
+            None when granted, otherwise seconds worth waiting before retrying
+        """
+        head_tenant = next(iter(self._queues))
+        if head_tenant != tenant or self._queues[tenant][0] is not ticket:
+            return _WAIT_POLL_INTERVAL
+
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate if self.rate > 0 else _WAIT_POLL_INTERVAL
+
+        self._tokens -= 1
+        self._remove(tenant, ticket)
+        return None
+
+    def _remove(self, tenant: str, ticket: object):
+        """Drop a ticket; a user with more waiting tickets goes to the back (lock must be held)"""
+        queue = self._queues.get(tenant)
+        if queue is None or ticket not in queue:
+            return
+        was_head = queue[0] is ticket and next(iter(self._queues)) == tenant
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[tenant]
+        elif was_head:
+            self._queues.move_to_end(tenant)
+
+    def _record(self, waited: float):
+        """Update metrics for a granted token (lock must be held)"""
+        now = time.monotonic()
+        self._granted.append(now)
+        while self._granted and self._granted[0] < now - _THROUGHPUT_WINDOW:
+            self._granted.popleft()
+        self._stats["acquired"] += 1
+        if waited >= 0.001:
+            self._stats["waited"] += 1
+        self._stats["wait_total"] += waited
+        self._stats["wait_max"] = max(self._stats["wait_max"], waited)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            while self._granted and self._granted[0] < now - _THROUGHPUT_WINDOW:
+                self._granted.popleft()
+            acquired = self._stats["acquired"]
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "acquired": acquired,
+                "waited": self._stats["waited"],
+                "wait_avg": round(self._stats["wait_total"] / acquired, 3) if acquired else 0.0,
+                "wait_max": round(self._stats["wait_max"], 3),
+                "waiting": sum(len(queue) for queue in self._queues.values()),
+                "waiting_users": len(self._queues),
+                "requests_last_minute": len(self._granted),
+            }
+
+
+class RateLimiterRegistry:
+    """One SiteRateLimiter per Moodle base URL, shared by scrapers and API clients"""
+
+    def __init__(self, rate: float = 5, burst: int = 10):
+        """
+        Initialize registry
+
+        Args:
+            rate: Requests per second allowed per site
+            burst: Requests allowed back to back per site
+        """
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._limiters: Dict[str, SiteRateLimiter] = {}
+
+    def get(self, base_url: str) -> SiteRateLimiter:
+        name = base_url.rstrip('/')
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if not limiter:
+                limiter = self._limiters[name] = SiteRateLimiter(name, rate=self.rate, burst=self.burst)
+            return limiter
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {name: limiter.stats() for name, limiter in limiters.items()}
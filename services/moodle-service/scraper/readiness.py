@@ -0,0 +1,164 @@
+"""頁面就緒等待
+
+以條件輪詢取代固定秒數的 time.sleep：DOM 條件、URL 變更與網路閒置，
+每種等待都有期限，並記錄實際等待時間以便調整各階段的延遲。
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webelement import WebElement
+
+# 判斷網路閒置的 JavaScript：文件載入完成、Moodle 無待處理的 JS，並回傳目前資源請求數
+_NETWORK_STATE_JS = """
+const pending = (window.M && M.util && M.util.pending_js) ? M.util.pending_js.length : 0;
+const jq = (window.jQuery && typeof jQuery.active === 'number') ? jQuery.active : 0;
+return {
+    ready: document.readyState === 'complete',
+    pending: pending + jq,
+    resources: performance.getEntriesByType('resource').length
+};
+"""
+
+# WebDriver 預設的隱式等待秒數（等待期間暫時關閉，避免 find_elements 阻塞）
+DEFAULT_IMPLICIT_WAIT = 10
+
+
+class PhaseTimer:
+    """記錄各階段等待時間（可在多個瀏覽器之間共用）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records: List[Dict[str, Any]] = []
+
+    def record(self, phase: str, seconds: float, ok: bool):
+        with self._lock:
+            self.records.append({'phase': phase, 'seconds': round(seconds, 3), 'ok': ok})
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        依階段彙總等待時間
+
+        Returns:
+            {phase: {'count', 'total', 'max', 'timeouts'}}
+        """
+        result: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            stats = result.setdefault(record['phase'], {'count': 0, 'total': 0.0, 'max': 0.0, 'timeouts': 0})
+            stats['count'] += 1
+            stats['total'] = round(stats['total'] + record['seconds'], 3)
+            stats['max'] = max(stats['max'], record['seconds'])
+            if not record['ok']:
+                stats['timeouts'] += 1
+        return result
+
+
+class Readiness:
+    """以條件輪詢等待頁面就緒"""
+
+    def __init__(self, driver, timer: Optional[PhaseTimer] = None, poll_interval: float = 0.1):
+        """
+        Args:
+            driver: Selenium WebDriver
+            timer: 等待時間記錄器
+            poll_interval: 輪詢間隔秒數
+        """
+        self.driver = driver
+        self.timer = timer or PhaseTimer()
+        self.poll_interval = poll_interval
+
+    def until(self, condition: Callable[[Any], Any], timeout: float, phase: str) -> Any:
+        """
+        等待條件成立
+
+        Args:
+            condition: 接收 driver、回傳真值表示成立的函式
+            timeout: 最長等待秒數
+            phase: 記錄用的階段名稱
+
+        Returns:
+            條件的回傳值，逾時則返回 None
+        """
+        started = time.monotonic()
+        deadline = started + timeout
+        self.driver.implicitly_wait(0)
+        try:
+            while True:
+                try:
+                    value = condition(self.driver)
+                    if value:
+                        self.timer.record(phase, time.monotonic() - started, True)
+                        return value
+                except WebDriverException:
+                    pass
+
+                if time.monotonic() >= deadline:
+                    self.timer.record(phase, time.monotonic() - started, False)
+                    return None
+                time.sleep(self.poll_interval)
+        finally:
+            self.driver.implicitly_wait(DEFAULT_IMPLICIT_WAIT)
+
+    def element(self, locator: Tuple[str, str], timeout: float, phase: str) -> Optional[WebElement]:
+        """等待元素出現"""
+        def find(driver):
+            elements = driver.find_elements(*locator)
+            return elements[0] if elements else None
+        return self.until(find, timeout, phase)
+
+    def any_element(
+        self,
+        locators: List[Tuple[str, str]],
+        timeout: float,
+        phase: str,
+        predicate: Optional[Callable[[WebElement], bool]] = None
+    ) -> Optional[Tuple[Tuple[str, str], WebElement]]:
+        """
+        等待任一元素出現（依 locators 順序），回傳 (locator, element)
+
+        Args:
+            predicate: 元素需符合的條件（例如可見且可點擊）
+        """
+        def find(driver):
+            for locator in locators:
+                for element in driver.find_elements(*locator):
+                    if predicate is None or predicate(element):
+                        return locator, element
+            return None
+        return self.until(find, timeout, phase)
+
+    def clickable(self, element: WebElement, timeout: float, phase: str) -> bool:
+        """等待元素可見且可互動"""
+        return bool(self.until(lambda _: element.is_displayed() and element.is_enabled(), timeout, phase))
+
+    def value_set(self, element: WebElement, timeout: float, phase: str) -> bool:
+        """等待輸入框的值已填入"""
+        return bool(self.until(lambda _: element.get_attribute('value'), timeout, phase))
+
+    def url_change(self, old_url: str, timeout: float, phase: str) -> bool:
+        """等待網址變更（頁面跳轉）"""
+        return bool(self.until(lambda driver: driver.current_url != old_url, timeout, phase))
+
+    def network_idle(self, timeout: float, phase: str, idle_time: float = 0.5) -> bool:
+        """
+        等待網路閒置：文件載入完成、無待處理的 AJAX，且資源請求數在 idle_time 秒內沒有增加
+
+        Args:
+            timeout: 最長等待秒數
+            phase: 記錄用的階段名稱
+            idle_time: 需維持閒置的秒數
+        """
+        state = {'resources': -1, 'since': time.monotonic()}
+
+        def idle(driver):
+            current = driver.execute_script(_NETWORK_STATE_JS)
+            now = time.monotonic()
+            if not current['ready'] or current['pending'] or current['resources'] != state['resources']:
+                state['resources'] = current['resources']
+                state['since'] = now
+                return False
+            return now - state['since'] >= idle_time
+
+        return bool(self.until(idle, timeout, phase))
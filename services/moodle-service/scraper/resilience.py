@@ -0,0 +1,331 @@
+"""
+Retries and circuit breaking for calls to a Moodle site
+
+A slow or flaky Moodle (e.g. during registration week) answers some requests
+with 502/503 or times out. Idempotent calls (read-only Web Service functions,
+page loads) are retried with capped exponential backoff and full jitter. A
+circuit breaker per base URL stops calling a site that keeps failing, so
+requests fail fast instead of piling up timed-out Chrome sessions.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+import logging
+
+import httpx
+import requests
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from .executor import OperationCancelled, current_cancel_event, raise_if_cancelled
+from .metrics import RETRIES
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying (the site is overloaded or restarting)
+TRANSIENT_HTTP_STATUSES = {429, 500, 502, 503, 504}
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a site whose circuit breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Moodle site {name} is unavailable, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Whether an error means the site is unreachable or overloaded (worth retrying)"""
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in TRANSIENT_HTTP_STATUSES
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in TRANSIENT_HTTP_STATUSES
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, TimeoutException):
+        return True
+    if isinstance(error, WebDriverException):
+        # Chrome reports network failures of driver.get() as "net::ERR_..."
+        return "net::ERR_" in (error.msg or "")
+    return False
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one Moodle site"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        """
+        Initialize breaker
+
+        Args:
+            name: Site the breaker protects (its base URL)
+            failure_threshold: Consecutive transient failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a probe call is allowed
+        """
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def check(self):
+        """
+        Fail fast while the circuit is open, without reserving the probe call
+
+        Used before expensive setup (starting a browser) ahead of the actual calls.
+        """
+        with self._lock:
+            if self._state == STATE_OPEN and self._retry_after() > 0:
+                self._stats["rejected"] += 1
+                raise CircuitOpenError(self.name, self._retry_after())
+
+    def before_call(self):
+        """
+        Admit a call, or raise CircuitOpenError
+
+        Once reset_timeout has passed, a single probe call is let through
+        (half-open); its outcome closes or re-opens the circuit.
+        """
+        with self._lock:
+            if self._state == STATE_OPEN and self._retry_after() <= 0:
+                self._state = STATE_HALF_OPEN
+            if self._state == STATE_CLOSED:
+                return
+            if self._state == STATE_HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self._stats["rejected"] += 1
+            raise CircuitOpenError(self.name, max(self._retry_after(), 1.0))
+
+    def record_success(self):
+        """The site answered (even with an application error)"""
+        with self._lock:
+            if self._state != STATE_CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def release(self):
+        """The call ended without telling anything about the site's health"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        """The site was unreachable or overloaded"""
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == STATE_HALF_OPEN or (
+                self._state == STATE_CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._state = STATE_OPEN
+                self._opened_at = time.monotonic()
+                self._stats["opened"] += 1
+                logger.warning(
+                    f"Circuit for {self.name} opened after {self._failures} failures, "
+                    f"retrying in {self.reset_timeout:.0f}s"
+                )
+
+    def _retry_after(self) -> float:
+        """Seconds until a probe call is allowed (lock must be held)"""
+        return self._opened_at + self.reset_timeout - time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._state
+            if state == STATE_OPEN and self._retry_after() <= 0:
+                state = STATE_HALF_OPEN
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "retry_after": round(max(self._retry_after(), 0.0), 1) if state == STATE_OPEN else 0.0,
+                **self._stats,
+            }
+
+
+class CircuitBreakerRegistry:
+    """One CircuitBreaker per Moodle base URL, shared by every user of that site"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        """
+        Initialize registry
+
+        Args:
+            failure_threshold: Consecutive transient failures that open a circuit
+            reset_timeout: Seconds a circuit stays open before a probe call
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, base_url: str) -> CircuitBreaker:
+        name = base_url.rstrip('/')
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if not breaker:
+                breaker = self._breakers[name] = CircuitBreaker(
+                    name, failure_threshold=self.failure_threshold, reset_timeout=self.reset_timeout
+                )
+            return breaker
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.stats() for name, breaker in breakers.items()}
+
+
+class RetryPolicy:
+    """Capped exponential backoff with full jitter for idempotent calls"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8):
+        """
+        Initialize policy
+
+        Args:
+            max_attempts: Attempts per call, including the first
+            base_delay: Backoff cap before the first retry (doubles per retry)
+            max_delay: Upper bound of any backoff
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"retries": 0, "exhausted": 0})
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait after the given failed attempt (1-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        breaker: Optional[CircuitBreaker] = None,
+        retry: bool = True,
+        op: str = "call",
+        mode: str = "",
+        ignore: Tuple[Type[BaseException], ...] = ()
+    ) -> Any:
+        """
+        Run fn, retrying transient failures
+
+        Args:
+            fn: Call to run
+            breaker: Circuit breaker of the site being called
+            retry: Whether fn is idempotent (otherwise it runs once, still guarded by the breaker)
+            op: Operation name used in metrics and logs
+            mode: How the site is accessed (metrics.MODE_*), used in metrics
+            ignore: Errors raised as-is, neither retried nor counted by the breaker
+                (e.g. a page load hitting a deliberately short per-page timeout)
+
+        Returns:
+            The result of fn
+        """
+        attempts = self.max_attempts if retry else 1
+        for attempt in range(1, attempts + 1):
+            if breaker:
+                breaker.before_call()
+            try:
+                result = fn()
+            except Exception as e:
+                if not self._on_error(e, attempt, attempts, breaker, op, mode, ignore):
+                    raise
+                self._sleep(self.backoff(attempt))
+                continue
+            if breaker:
+                breaker.record_success()
+            return result
+
+    async def call_async(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        breaker: Optional[CircuitBreaker] = None,
+        retry: bool = True,
+        op: str = "call",
+        mode: str = "",
+        ignore: Tuple[Type[BaseException], ...] = ()
+    ) -> Any:
+        """Coroutine version of call()"""
+        attempts = self.max_attempts if retry else 1
+        for attempt in range(1, attempts + 1):
+            if breaker:
+                breaker.before_call()
+            try:
+                result = await fn()
+            except Exception as e:
+                if not self._on_error(e, attempt, attempts, breaker, op, mode, ignore):
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            if breaker:
+                breaker.record_success()
+            return result
+
+    def _on_error(
+        self,
+        error: Exception,
+        attempt: int,
+        attempts: int,
+        breaker: Optional[CircuitBreaker],
+        op: str,
+        mode: str = "",
+        ignore: Tuple[Type[BaseException], ...] = ()
+    ) -> bool:
+        """Record a failed attempt; returns whether it should be retried"""
+        # A cancelled call (client disconnected) says nothing about the site either
+        if isinstance(error, ignore) or isinstance(error, OperationCancelled):
+            if breaker:
+                breaker.release()
+            return False
+        transient = is_transient_error(error)
+        if breaker:
+            if transient:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+        if not transient:
+            return False
+        site = breaker.name if breaker else ""
+        with self._lock:
+            if attempt >= attempts:
+                self._stats[op]["exhausted"] += 1
+                RETRIES.labels(site, mode, op, "exhausted").inc()
+                return False
+            self._stats[op]["retries"] += 1
+        RETRIES.labels(site, mode, op, "retry").inc()
+        logger.warning(f"{op} failed ({error}), retry {attempt}/{attempts - 1}")
+        return True
+
+    @staticmethod
+    def _sleep(seconds: float):
+        """Back off, waking up early if the current work is cancelled"""
+        event = current_cancel_event()
+        if event:
+            event.wait(seconds)
+            raise_if_cancelled(event)
+        else:
+            time.sleep(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            ops = {op: dict(counts) for op, counts in self._stats.items()}
+        return {
+            "retries": sum(counts["retries"] for counts in ops.values()),
+            "exhausted": sum(counts["exhausted"] for counts in ops.values()),
+            "operations": ops,
+        }
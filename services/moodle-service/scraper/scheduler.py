@@ -0,0 +1,309 @@
+"""
+Background sync of registered users
+
+Without a scheduler a sync only happens when a client posts credentials to
+/api/moodle/sync, and the first read after the snapshot expires waits on a
+full Selenium scrape. SyncScheduler keeps a registry of enrolled users and
+re-syncs each of them periodically on its own bounded worker pool, so the
+snapshot cache is already warm when they read.
+
+Due users are started in priority order (an assignment due within the
+deadline window first), runs are spread with jitter, and a user whose sync
+fails is retried with exponential backoff instead of every interval.
+
+Deadline priority needs assignment due dates, which only the Web Services
+API provides. The Selenium and HTTP scrapers read course pages, which carry
+no machine-readable due dates, so their assignments have due_date None and
+every scraped user is scheduled by next run time alone.
+"""
+
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from .tracing import request_context
+
+logger = logging.getLogger(__name__)
+
+# Runs one sync: (base_url, username, password) -> MoodleService.sync_all() result
+SyncFunction = Callable[[str, str, str], Dict[str, Any]]
+
+# Called with (base_url, username, password) of credentials the scheduler drops
+ForgetFunction = Callable[[str, str, str], None]
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+def next_deadline(assignments: List[Dict[str, Any]], now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Earliest assignment due date that has not passed yet (None if there is none)
+
+    Assignments without a due_date (all scraped ones, see module docstring) are skipped.
+    """
+    now = now or datetime.now()
+    upcoming = []
+    for assignment in assignments:
+        try:
+            due = datetime.fromisoformat(assignment["due_date"]) if assignment.get("due_date") else None
+        except (TypeError, ValueError):
+            continue
+        if due and due.tzinfo:
+            due = due.astimezone().replace(tzinfo=None)
+        if due and due > now:
+            upcoming.append(due)
+    return min(upcoming, default=None)
+
+
+@dataclass
+class ScheduledUser:
+    """A registered user and the state of their periodic sync"""
+    id: str
+    base_url: str
+    username: str
+    password: str = field(repr=False)
+    next_run: float = 0.0
+    registered_at: float = field(default_factory=time.time)
+    running: bool = False
+    syncs: int = 0
+    failures: int = 0
+    last_run_at: Optional[float] = None
+    last_success_at: Optional[float] = None
+    last_error: Optional[str] = None
+    deadline: Optional[datetime] = None
+
+    def urgent(self, window: float) -> bool:
+        """Whether an assignment is due within the next `window` seconds"""
+        return bool(self.deadline and (self.deadline - datetime.now()).total_seconds() <= window)
+
+    def to_dict(self, window: float) -> Dict[str, Any]:
+        return {
+            "user_id": self.id,
+            "base_url": self.base_url,
+            "username": self.username,
+            "running": self.running,
+            "urgent": self.urgent(window),
+            "next_run_in": round(max(self.next_run - time.monotonic(), 0.0), 1),
+            "syncs": self.syncs,
+            "failures": self.failures,
+            "registered_at": _isoformat(self.registered_at),
+            "last_run_at": _isoformat(self.last_run_at),
+            "last_success_at": _isoformat(self.last_success_at),
+            "last_error": self.last_error,
+            "next_deadline": self.deadline.isoformat() if self.deadline else None,
+        }
+
+
+class SyncScheduler:
+    """Periodically syncs registered users on a bounded worker pool"""
+
+    def __init__(
+        self,
+        sync: SyncFunction,
+        workers: int = 1,
+        interval: float = 900,
+        jitter: float = 0.1,
+        deadline_window: float = 48 * 3600,
+        retry_delay: float = 60,
+        max_backoff: float = 3600,
+        tick: float = 1.0,
+        forget: Optional[ForgetFunction] = None
+    ):
+        """
+        Initialize scheduler
+
+        Args:
+            sync: Function running one user's sync (its result refreshes the snapshot cache)
+            workers: Maximum number of scheduled syncs running at once
+            interval: Seconds between successful syncs of a user
+            jitter: Fraction by which each delay is randomly stretched or shrunk
+            deadline_window: Users with an assignment due within this many seconds go first
+            retry_delay: Delay after a user's first failed sync (doubles per consecutive failure)
+            max_backoff: Upper bound of the failure backoff
+            tick: Seconds between checks for due users
+            forget: Purges data derived from credentials that are unregistered or replaced
+        """
+        self.sync = sync
+        self.workers = max(1, workers)
+        self.interval = interval
+        self.jitter = jitter
+        self.deadline_window = deadline_window
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.tick = tick
+        self.forget = forget
+        self._lock = threading.Lock()
+        self._users: Dict[str, ScheduledUser] = {}
+        self._running = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats = {"runs": 0, "succeeded": 0, "failed": 0, "urgent_runs": 0}
+
+    def start(self):
+        """Start the worker pool and the dispatch thread"""
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="moodle-scheduler")
+        self._thread = threading.Thread(target=self._loop, name="sync-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"✓ Sync scheduler started (workers={self.workers}, interval={self.interval:.0f}s)")
+
+    def close(self):
+        """Stop dispatching; queued syncs are dropped, running ones finish in the background"""
+        self._stop.set()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def register(self, base_url: str, username: str, password: str) -> Tuple[ScheduledUser, bool]:
+        """
+        Add a user to the schedule (their first sync starts within interval * jitter)
+
+        Registering a scheduled user again with another password replaces the
+        old password and schedules a sync with the new one.
+
+        Args:
+            base_url: Moodle base URL
+            username: Moodle username
+            password: Moodle password (kept in memory only)
+
+        Returns:
+            (user, whether they were newly registered)
+        """
+        user_id = self.user_id(base_url, username)
+        first_run = time.monotonic() + random.uniform(0, self.interval * self.jitter)
+        replaced = None
+        with self._lock:
+            user = self._users.get(user_id)
+            if user and user.password != password:
+                replaced = user.password
+                user.password = password
+                user.failures = 0
+                user.last_error = None
+                user.deadline = None
+                user.next_run = min(user.next_run, first_run)
+            if user:
+                created = False
+            else:
+                created = True
+                user = self._users[user_id] = ScheduledUser(
+                    id=user_id,
+                    base_url=base_url.rstrip('/'),
+                    username=username,
+                    password=password,
+                    next_run=first_run
+                )
+
+        if replaced is not None:
+            logger.info(f"✓ Replaced credentials of scheduled user {username}")
+            self._forget(user.base_url, username, replaced)
+        elif created:
+            logger.info(f"✓ Scheduled background sync for {username}")
+        return user, created
+
+    def unregister(self, user_id: str) -> Optional[ScheduledUser]:
+        """
+        Remove a user from the schedule and forget their data (a sync already running still finishes)
+
+        Returns:
+            The removed user, or None if they were not registered
+        """
+        with self._lock:
+            user = self._users.pop(user_id, None)
+        if user:
+            self._forget(user.base_url, user.username, user.password)
+        return user
+
+    def _forget(self, base_url: str, username: str, password: str):
+        if not self.forget:
+            return
+        try:
+            self.forget(base_url, username, password)
+        except Exception as e:
+            logger.error(f"Failed to forget data of {username}: {e}")
+
+    def get(self, user_id: str) -> Optional[ScheduledUser]:
+        with self._lock:
+            return self._users.get(user_id)
+
+    def users(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [user.to_dict(self.deadline_window) for user in self._users.values()]
+
+    def user_dict(self, user: ScheduledUser) -> Dict[str, Any]:
+        with self._lock:
+            return user.to_dict(self.deadline_window)
+
+    @staticmethod
+    def user_id(base_url: str, username: str) -> str:
+        """Opaque ID of a registration (one per account, whatever password it was registered with)"""
+        return hashlib.sha256(f"{base_url.rstrip('/')}|{username}".encode("utf-8")).hexdigest()[:16]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                **self._stats,
+                "users": len(self._users),
+                "running": self._running,
+                "due": sum(1 for user in self._users.values() if not user.running and user.next_run <= now),
+                "urgent": sum(1 for user in self._users.values() if user.urgent(self.deadline_window)),
+                "backing_off": sum(1 for user in self._users.values() if user.failures),
+            }
+
+    def _loop(self):
+        while not self._stop.wait(self.tick):
+            try:
+                self._dispatch()
+            except Exception as e:
+                logger.error(f"Sync scheduler dispatch failed: {e}")
+
+    def _dispatch(self):
+        """Start due users on free workers, most urgent first"""
+        with self._lock:
+            free = self.workers - self._running
+            if free <= 0:
+                return
+            now = time.monotonic()
+            due = [user for user in self._users.values() if not user.running and user.next_run <= now]
+            due.sort(key=lambda user: (not user.urgent(self.deadline_window), user.next_run))
+            for user in due[:free]:
+                user.running = True
+                self._running += 1
+                self._stats["runs"] += 1
+                if user.urgent(self.deadline_window):
+                    self._stats["urgent_runs"] += 1
+                self._executor.submit(self._run, user)
+
+    def _run(self, user: ScheduledUser):
+        started = time.time()
+        try:
+            with request_context(f"sched-{user.id}-{int(started)}"):
+                result = self.sync(user.base_url, user.username, user.password)
+            error = None if result.get("success") else result.get("message") or "Sync failed"
+        except Exception as e:
+            result, error = None, str(e)
+
+        with self._lock:
+            self._running -= 1
+            user.running = False
+            user.syncs += 1
+            user.last_run_at = started
+            user.last_error = error
+            if error:
+                user.failures += 1
+                delay = min(self.max_backoff, self.retry_delay * 2 ** (user.failures - 1))
+                self._stats["failed"] += 1
+                logger.warning(f"Scheduled sync for {user.username} failed ({error}), retrying in {delay:.0f}s")
+            else:
+                user.failures = 0
+                user.last_success_at = time.time()
+                user.deadline = next_deadline(result.get("data", {}).get("assignments", []))
+                delay = self.interval
+                self._stats["succeeded"] += 1
+            user.next_run = time.monotonic() + delay * random.uniform(1 - self.jitter, 1 + self.jitter)
@@ -0,0 +1,118 @@
+"""選擇器學習快取
+
+記錄每個 Moodle 網站（base_url）上次成功的 SSO 按鈕、帳號/密碼/登入按鈕
+定位器與課程列表選擇器，下次優先以短逾時嘗試，並保存命中率統計。
+"""
+import json
+import os
+import threading
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Selenium 定位器：(By, value)
+Locator = Tuple[str, str]
+
+
+class SelectorCache:
+    """以 JSON 檔保存的選擇器快取"""
+
+    def __init__(self, path: str):
+        """
+        初始化快取
+
+        Args:
+            path: 快取檔案路徑
+        """
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Dict[str, Any]]] = self._load()
+
+    def get(self, base_url: str, kind: str) -> Optional[Locator]:
+        """
+        取得上次成功的定位器
+
+        Args:
+            base_url: Moodle 網站基礎 URL
+            kind: 定位器種類（sso_button, username, password, login_button, course_list）
+
+        Returns:
+            (By, value)，沒有紀錄時返回 None
+        """
+        with self._lock:
+            entry = self._data.get(self._site(base_url), {}).get(kind)
+            return tuple(entry['locator']) if entry and entry.get('locator') else None
+
+    def prioritize(self, base_url: str, kind: str, candidates: Sequence[Locator]) -> List[Locator]:
+        """將上次成功的定位器移到候選列表最前面"""
+        cached = self.get(base_url, kind)
+        if cached not in candidates:
+            return list(candidates)
+        return [cached] + [locator for locator in candidates if locator != cached]
+
+    def remember(self, base_url: str, kind: str, locator: Locator):
+        """記錄成功的定位器"""
+        with self._lock:
+            entry = self._entry(base_url, kind)
+            if entry.get('locator') == list(locator):
+                return
+            entry['locator'] = list(locator)
+            self._save()
+
+    def record(self, base_url: str, kind: str, hit: bool):
+        """記錄快取的定位器是否命中"""
+        with self._lock:
+            entry = self._entry(base_url, kind)
+            entry['hits' if hit else 'misses'] = entry.get('hits' if hit else 'misses', 0) + 1
+            if not hit:
+                entry['locator'] = None
+            self._save()
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        各網站各種類的命中率
+
+        Returns:
+            {base_url: {kind: {'hits', 'misses', 'hit_rate'}}}
+        """
+        with self._lock:
+            result = {}
+            for site, kinds in self._data.items():
+                result[site] = {}
+                for kind, entry in kinds.items():
+                    hits, misses = entry.get('hits', 0), entry.get('misses', 0)
+                    result[site][kind] = {
+                        'hits': hits,
+                        'misses': misses,
+                        'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None
+                    }
+            return result
+
+    @staticmethod
+    def _site(base_url: str) -> str:
+        return base_url.rstrip('/')
+
+    def _entry(self, base_url: str, kind: str) -> Dict[str, Any]:
+        """取得（或建立）紀錄（需持有鎖）"""
+        return self._data.setdefault(self._site(base_url), {}).setdefault(kind, {})
+
+    def _load(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        if not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠ 讀取選擇器快取失敗，重新建立: {e}")
+            return {}
+
+    def _save(self):
+        """寫入快取檔（需持有鎖）"""
+        tmp_path = self.path.with_suffix('.tmp')
+        try:
+            tmp_path.write_text(json.dumps(self._data, ensure_ascii=False, indent=2), encoding='utf-8')
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠ 寫入選擇器快取失敗: {e}")
@@ -0,0 +1,151 @@
+"""登入狀態快取
+
+將成功登入後的 cookies（MoodleSession 與 SSO cookies）依 (base_url, username)
+加密儲存，後續請求直接注入 cookies，省去完整的 INCCU SSO 登入流程。
+"""
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from cryptography.fernet import Fernet, InvalidToken
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedSession:
+    """快取的登入狀態"""
+    cookies: List[Dict[str, Any]]
+    saved_at: float
+    login_seconds: float
+
+
+class SessionCache:
+    """加密的登入 cookies 快取（檔案儲存，具有效期限）"""
+
+    def __init__(self, cache_dir: str, ttl: float = 4 * 3600, key: Optional[str] = None):
+        """
+        初始化快取
+
+        Args:
+            cache_dir: 快取目錄
+            ttl: 快取有效秒數
+            key: Fernet 金鑰（未提供時會在快取目錄產生並保存）
+        """
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        os.chmod(self.cache_dir, 0o700)
+        self.ttl = ttl
+        self._fernet = Fernet(key.encode() if key else self._load_or_create_key())
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalid': 0, 'seconds_saved': 0.0}
+
+    def get(self, base_url: str, username: str, password: str) -> Optional[CachedSession]:
+        """
+        讀取快取的登入狀態
+
+        僅在密碼與建立快取時相同時返回，避免以錯誤密碼取得他人的登入狀態。
+
+        Returns:
+            CachedSession，不存在、過期、密碼不符或無法解密時返回 None
+        """
+        path = self._path(base_url, username)
+        if not path.exists():
+            return None
+
+        try:
+            payload = self._fernet.decrypt(path.read_bytes(), ttl=int(self.ttl))
+            data = json.loads(payload)
+            if not hmac.compare_digest(data.get('password_digest', ''), self._password_digest(username, password)):
+                return None
+            return CachedSession(
+                cookies=data['cookies'],
+                saved_at=data['saved_at'],
+                login_seconds=data.get('login_seconds', 0.0)
+            )
+        except InvalidToken:
+            logger.info("→ 登入快取已過期或無法解密，移除")
+            path.unlink(missing_ok=True)
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠ 讀取登入快取失敗: {e}")
+            return None
+
+    def put(
+        self,
+        base_url: str,
+        username: str,
+        password: str,
+        cookies: List[Dict[str, Any]],
+        login_seconds: float
+    ):
+        """
+        儲存登入狀態
+
+        Args:
+            cookies: 瀏覽器的所有 cookies
+            login_seconds: 完整登入所花費的秒數（用於估算節省時間）
+        """
+        payload = json.dumps({
+            'cookies': cookies,
+            'password_digest': self._password_digest(username, password),
+            'saved_at': time.time(),
+            'login_seconds': login_seconds
+        }).encode('utf-8')
+
+        path = self._path(base_url, username)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_bytes(self._fernet.encrypt(payload))
+        os.chmod(tmp_path, 0o600)
+        tmp_path.replace(path)
+
+    def invalidate(self, base_url: str, username: str):
+        """移除失效的登入狀態"""
+        self._path(base_url, username).unlink(missing_ok=True)
+        with self._lock:
+            self._stats['invalid'] += 1
+
+    def record_hit(self, seconds_saved: float):
+        with self._lock:
+            self._stats['hits'] += 1
+            self._stats['seconds_saved'] += max(0.0, seconds_saved)
+            stats = dict(self._stats)
+        logger.info(
+            f"✓ 登入快取命中，節省約 {seconds_saved:.1f} 秒 "
+            f"(hits={stats['hits']}, misses={stats['misses']}, 累計節省 {stats['seconds_saved']:.0f} 秒)"
+        )
+
+    def record_miss(self, reason: str):
+        with self._lock:
+            self._stats['misses'] += 1
+            stats = dict(self._stats)
+        logger.info(f"→ 登入快取未命中: {reason} (hits={stats['hits']}, misses={stats['misses']})")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _path(self, base_url: str, username: str) -> Path:
+        digest = hashlib.sha256(f"{base_url.rstrip('/')}\n{username}".encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{digest}.session"
+
+    @staticmethod
+    def _password_digest(username: str, password: str) -> str:
+        return hashlib.sha256(f"{username}\n{password}".encode('utf-8')).hexdigest()
+
+    def _load_or_create_key(self) -> bytes:
+        key_path = self.cache_dir / '.key'
+        if key_path.exists():
+            return key_path.read_bytes()
+
+        key = Fernet.generate_key()
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+        return key
@@ -0,0 +1,102 @@
+"""
+Single-flight coalescing of identical concurrent Moodle calls
+
+When several callers (browser tabs, background jobs) ask for the same user's
+data at once, only the first one runs the scrape or API call; the others wait
+for it and share its result instead of each logging in with their own browser.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional
+import logging
+
+from .executor import OperationCancelled, raise_if_cancelled
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """One in-flight call and its outcome"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls sharing the same key"""
+
+    def __init__(self, wait_poll_interval: float = 0.5):
+        """
+        Initialize coalescing group
+
+        Args:
+            wait_poll_interval: Seconds between cancellation checks while waiting
+        """
+        self.wait_poll_interval = wait_poll_interval
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"executed": 0, "coalesced": 0})
+
+    def do(self, key: str, fn: Callable[[], Any], op: str = "call") -> Any:
+        """
+        Run fn once for all concurrent callers with the same key
+
+        If the running call was cancelled (its client went away), one of the
+        waiting callers runs fn again instead of sharing the cancellation.
+
+        Args:
+            key: Identifies identical calls (user, operation and parameters)
+            fn: Call to run
+            op: Operation name used in metrics
+
+        Returns:
+            The result of fn (shared with concurrent callers)
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    self._stats[op]["executed"] += 1
+                else:
+                    flight.waiters += 1
+                    self._stats[op]["coalesced"] += 1
+
+            if leader:
+                try:
+                    flight.result = fn()
+                    return flight.result
+                except BaseException as e:
+                    flight.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._flights[key]
+                    flight.done.set()
+
+            while not flight.done.wait(self.wait_poll_interval):
+                raise_if_cancelled()
+
+            if isinstance(flight.error, OperationCancelled):
+                logger.info(f"Coalesced {op} was cancelled by its caller, running it again")
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            ops = {op: dict(counts) for op, counts in self._stats.items()}
+            executed = sum(counts["executed"] for counts in ops.values())
+            coalesced = sum(counts["coalesced"] for counts in ops.values())
+            return {
+                "executed": executed,
+                "coalesced": coalesced,
+                "in_flight": len(self._flights),
+                "operations": ops,
+            }
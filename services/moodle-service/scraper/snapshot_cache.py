@@ -0,0 +1,270 @@
+"""
+Per-user snapshot cache for scrape_all() results
+
+Read endpoints (courses, course detail, assignments) are all slices of the
+same scrape, so they are served from the latest snapshot instead of each
+triggering a full login and scrape. With a SnapshotStore attached, snapshots
+are also written to disk and reloaded from it after a restart.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+
+from .executor import OperationCancelled, ServiceExecutor
+from .snapshot_store import SnapshotStore
+from .tracing import propagate
+
+logger = logging.getLogger(__name__)
+
+
+def user_key(base_url: str, username: str, password: str) -> str:
+    """
+    Build a cache key for a Moodle account
+
+    The password is folded into the key so a caller with wrong credentials
+    never receives another session's cached data.
+    """
+    digest = hashlib.sha256(f"{username}\n{password}".encode("utf-8")).hexdigest()[:16]
+    return f"{base_url.rstrip('/')}|{username}|{digest}"
+
+
+class SnapshotCache:
+    """In-memory LRU cache of scrape snapshots with TTL and stale-while-revalidate"""
+
+    def __init__(
+        self,
+        ttl: float = 300,
+        stale_ttl: float = 1800,
+        max_entries: int = 100,
+        store: Optional[SnapshotStore] = None,
+        executor: Optional[ServiceExecutor] = None
+    ):
+        """
+        Initialize snapshot cache
+
+        Args:
+            ttl: Seconds a snapshot is served as fresh
+            stale_ttl: Extra seconds a stale snapshot may be served while it is refreshed in the background
+            max_entries: Maximum number of users kept (least recently used are evicted)
+            store: Durable store written through on put() and read on a memory miss
+            executor: Executor background refreshes run on, so they count against the
+                same concurrency limit as other scrapes (a single private worker when omitted)
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.store = store
+        self.executor = executor
+        self._fallback_executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._refreshing: set = set()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0, "store_loads": 0}
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Get a cached snapshot regardless of freshness
+
+        Falls back to the durable store (keeping the stored snapshot's age)
+        when the snapshot is not in memory, e.g. after a restart.
+
+        Returns:
+            (snapshot, age in seconds), or None if not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                stored_at, data = entry
+                return data, time.monotonic() - stored_at
+
+        loaded = self._load_from_store(key)
+        if not loaded:
+            return None
+        data, age = loaded
+        self._remember(key, data, time.monotonic() - age)
+        self._count("store_loads")
+        return data, age
+
+    def peek(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Like get(), but only looks in memory"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            stored_at, data = entry
+            return data, time.monotonic() - stored_at
+
+    def get_course(self, key: str, course_id: str) -> Optional[Tuple[Optional[Dict[str, Any]], float]]:
+        """
+        Get one course of a user's snapshot regardless of freshness
+
+        On a memory miss only that course is read from the durable store's
+        course index, instead of loading the whole snapshot.
+
+        Returns:
+            (course, snapshot age in seconds) with course None if the snapshot
+            lacks it, or None if no snapshot is cached
+        """
+        cached = self.peek(key)
+        if cached:
+            data, age = cached
+            return next((c for c in data.get("courses", []) if c.get("id") == course_id), None), age
+
+        if not self.store:
+            return None
+        try:
+            loaded = self.store.get_course(key, course_id)
+        except Exception as e:
+            logger.error(f"Failed to read snapshot store: {e}")
+            return None
+        if loaded and loaded[1] <= self.ttl + self.stale_ttl:
+            return loaded
+        return None
+
+    def delete_user(self, key: str):
+        """Forget a user's snapshots, in memory (including single-course entries) and in the store"""
+        with self._lock:
+            for cached_key in [k for k in self._entries if k == key or k.startswith(f"{key}|")]:
+                del self._entries[cached_key]
+        if self.store:
+            self.store.delete_user(key)
+
+    def put(self, key: str, data: Dict[str, Any], persist: bool = True):
+        """
+        Store a snapshot, evicting the least recently used entries when full
+
+        Args:
+            key: Cache key (see user_key)
+            data: Snapshot data
+            persist: Also write it to the durable store
+        """
+        self._remember(key, data, time.monotonic())
+        if persist and self.store:
+            try:
+                self.store.put(key, data)
+            except Exception as e:
+                logger.error(f"Failed to persist snapshot: {e}")
+
+    def _remember(self, key: str, data: Dict[str, Any], stored_at: float):
+        """Keep a snapshot in memory"""
+        with self._lock:
+            self._entries[key] = (stored_at, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _load_from_store(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Latest stored snapshot that is still within ttl + stale_ttl"""
+        if not self.store:
+            return None
+        try:
+            loaded = self.store.latest(key)
+        except Exception as e:
+            logger.error(f"Failed to read snapshot store: {e}")
+            return None
+        if loaded and loaded[1] <= self.ttl + self.stale_ttl and self.is_cacheable(loaded[0]):
+            return loaded
+        return None
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Dict[str, Any]],
+        refresh: bool = False,
+        persist: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Serve a snapshot from cache, loading it when missing or expired
+
+        A stale snapshot (older than ttl but within ttl + stale_ttl) is returned
+        immediately while a background refresh replaces it.
+
+        Args:
+            key: Cache key (see user_key)
+            loader: Function producing a fresh snapshot
+            refresh: Bypass the cache and load a fresh snapshot
+            persist: Write newly loaded snapshots to the durable store
+
+        Returns:
+            Snapshot data
+        """
+        cached = None if refresh else self.get(key)
+
+        if cached:
+            data, age = cached
+            if age <= self.ttl:
+                self._count("hits")
+                return data
+            if age <= self.ttl + self.stale_ttl:
+                self._count("stale_hits")
+                self._refresh_in_background(key, loader, persist)
+                return data
+
+        self._count("misses")
+        data = loader()
+        if self.is_cacheable(data):
+            self.put(key, data, persist)
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "refreshing": len(self._refreshing)}
+
+    @staticmethod
+    def is_cacheable(data: Optional[Dict[str, Any]]) -> bool:
+        """Only successful scrapes (at least one course) are cached"""
+        return bool(data and data.get("courses"))
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _refresh_in_background(self, key: str, loader: Callable[[], Dict[str, Any]], persist: bool = True):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            data = loader()
+            if self.is_cacheable(data):
+                self.put(key, data, persist)
+
+        def done(future: Future):
+            # Also runs when the executor drops the refresh before it started
+            with self._lock:
+                self._refreshing.discard(key)
+            if future.cancelled() or isinstance(future.exception(), OperationCancelled):
+                return
+            if future.exception():
+                logger.error(f"Background snapshot refresh failed: {future.exception()}")
+
+        try:
+            if self.executor:
+                future, _ = self.executor.submit(propagate(refresh))
+            else:
+                future = self._get_fallback_executor().submit(propagate(refresh))
+        except RuntimeError as e:
+            # Executor already shut down
+            logger.warning(f"Background snapshot refresh not started: {e}")
+            with self._lock:
+                self._refreshing.discard(key)
+            return
+        future.add_done_callback(done)
+
+    def _get_fallback_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if not self._fallback_executor:
+                self._fallback_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot-refresh")
+            return self._fallback_executor
@@ -0,0 +1,351 @@
+"""
+Durable SQLite store of scrape and sync snapshots
+
+The in-memory SnapshotCache is lost on restart, after which every user pays
+for a full scrape again. SnapshotStore keeps the latest snapshots per user in
+an embedded SQLite database (WAL mode, so readers never block the writer),
+with per-course and per-activity rows indexed by user for direct lookups.
+Old snapshots are compacted away.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Snapshot kinds: raw MoodleScraper.scrape_all() output, or MoodleService.sync_all() data
+KIND_SCRAPE = "scrape"
+KIND_SYNC = "sync"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    meta TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_user ON snapshots (user_key, kind, created_at);
+CREATE INDEX IF NOT EXISTS idx_snapshots_created ON snapshots (created_at);
+
+CREATE TABLE IF NOT EXISTS courses (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    user_key TEXT NOT NULL,
+    course_id TEXT NOT NULL,
+    name TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (snapshot_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_courses_user ON courses (user_key, course_id);
+CREATE INDEX IF NOT EXISTS idx_courses_snapshot ON courses (snapshot_id, course_id);
+
+CREATE TABLE IF NOT EXISTS activities (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    user_key TEXT NOT NULL,
+    course_id TEXT NOT NULL,
+    section_index INTEGER NOT NULL,
+    type TEXT,
+    name TEXT,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_activities_user ON activities (user_key, course_id, type);
+CREATE INDEX IF NOT EXISTS idx_activities_snapshot ON activities (snapshot_id, course_id);
+"""
+
+
+def _course_sections(course: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Sections of a course in either format (scraper "sections" or API "contents")"""
+    return course.get("sections") or course.get("contents") or []
+
+
+class SnapshotStore:
+    """SQLite-backed snapshot history per user, indexed by course and activity"""
+
+    def __init__(
+        self,
+        path: str,
+        keep: int = 3,
+        max_age: float = 7 * 86400,
+        compact_interval: float = 3600
+    ):
+        """
+        Initialize store
+
+        Args:
+            path: Database file (created with owner-only permissions)
+            keep: Snapshots kept per user and kind; older ones are deleted on write
+            max_age: Seconds after which any snapshot is deleted by compaction
+            compact_interval: Minimum seconds between full compactions
+        """
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.keep = max(1, keep)
+        self.max_age = max_age
+        self.compact_interval = compact_interval
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._last_compaction = 0.0
+        self._stats = {"writes": 0, "reads": 0, "read_hits": 0, "compactions": 0, "deleted": 0}
+
+        # Create the file owner-only before SQLite opens it: SQLite gives the
+        # -wal and -shm files it creates later the database file's permissions
+        os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+        with self._write_lock:
+            conn = self._connect()
+            # auto_vacuum only takes effect before the first table is created
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.executescript(_SCHEMA)
+        for path in (self.path, Path(f"{self.path}-wal"), Path(f"{self.path}-shm")):
+            if path.exists():
+                os.chmod(path, 0o600)
+        self.compact()
+
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's connection (SQLite connections are not shared between threads)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute("PRAGMA busy_timeout = 30000")
+            self._local.conn = conn
+        return conn
+
+    def put(self, key: str, data: Dict[str, Any], kind: str = KIND_SCRAPE) -> int:
+        """
+        Store a snapshot and trim the user's history to `keep` snapshots
+
+        Args:
+            key: User key (see snapshot_cache.user_key)
+            data: Snapshot with a "courses" list
+            kind: KIND_SCRAPE or KIND_SYNC
+
+        Returns:
+            Snapshot ID
+        """
+        courses = data.get("courses", [])
+        meta = {name: value for name, value in data.items() if name != "courses"}
+        now = time.time()
+
+        with self._write_lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                snapshot_id = conn.execute(
+                    "INSERT INTO snapshots (user_key, kind, created_at, meta) VALUES (?, ?, ?, ?)",
+                    (key, kind, now, json.dumps(meta, ensure_ascii=False, default=str))
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO courses (snapshot_id, position, user_key, course_id, name, data) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (snapshot_id, position, key, str(course.get("id", "")), course.get("name"),
+                         json.dumps(course, ensure_ascii=False, default=str))
+                        for position, course in enumerate(courses)
+                    ]
+                )
+                conn.executemany(
+                    "INSERT INTO activities (snapshot_id, user_key, course_id, section_index, type, name, url) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (snapshot_id, key, str(course.get("id", "")), section.get("index", index),
+                         activity.get("type") or activity.get("modname"), activity.get("name"), activity.get("url"))
+                        for course in courses
+                        for index, section in enumerate(_course_sections(course))
+                        for activity in section.get("activities", [])
+                    ]
+                )
+                deleted = conn.execute(
+                    "DELETE FROM snapshots WHERE user_key = ? AND kind = ? AND id NOT IN "
+                    "(SELECT id FROM snapshots WHERE user_key = ? AND kind = ? ORDER BY created_at DESC LIMIT ?)",
+                    (key, kind, key, kind, self.keep)
+                ).rowcount
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        with self._stats_lock:
+            self._stats["writes"] += 1
+            self._stats["deleted"] += deleted
+
+        if time.time() - self._last_compaction >= self.compact_interval:
+            self.compact()
+        return snapshot_id
+
+    def latest(self, key: str, kind: str = KIND_SCRAPE) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Get a user's most recent snapshot
+
+        Returns:
+            (snapshot, age in seconds), or None if nothing is stored
+        """
+        conn = self._connect()
+        # One read transaction, so a concurrent trim cannot remove the courses in between
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute(
+                "SELECT id, created_at, meta FROM snapshots WHERE user_key = ? AND kind = ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (key, kind)
+            ).fetchone()
+            courses = [] if not row else [
+                json.loads(data) for (data,) in conn.execute(
+                    "SELECT data FROM courses WHERE snapshot_id = ? ORDER BY position", (row[0],)
+                )
+            ]
+        finally:
+            conn.execute("COMMIT")
+
+        self._count_read(row is not None)
+        if not row:
+            return None
+        _, created_at, meta = row
+        return {**json.loads(meta), "courses": courses}, time.time() - created_at
+
+    def get_course(
+        self,
+        key: str,
+        course_id: str,
+        kind: str = KIND_SCRAPE
+    ) -> Optional[Tuple[Optional[Dict[str, Any]], float]]:
+        """
+        Get one course from a user's most recent snapshot without loading the others
+
+        Returns:
+            (course, snapshot age in seconds) with course None if the latest
+            snapshot lacks it, or None if nothing is stored
+        """
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            snapshot = self._latest_snapshot(conn, key, kind)
+            row = None if not snapshot else conn.execute(
+                "SELECT data FROM courses WHERE snapshot_id = ? AND course_id = ?", (snapshot[0], str(course_id))
+            ).fetchone()
+        finally:
+            conn.execute("COMMIT")
+
+        self._count_read(row is not None)
+        if not snapshot:
+            return None
+        return (json.loads(row[0]) if row else None), time.time() - snapshot[1]
+
+    def activities(
+        self,
+        key: str,
+        course_id: Optional[str] = None,
+        types: Optional[List[str]] = None,
+        kind: str = KIND_SCRAPE
+    ) -> Optional[Tuple[List[Dict[str, Any]], float]]:
+        """
+        Activities of a user's most recent snapshot, optionally by course and type
+
+        Args:
+            key: User key
+            course_id: Only activities of this course
+            types: Only activities whose type is one of these (case-insensitive)
+            kind: KIND_SCRAPE or KIND_SYNC
+
+        Returns:
+            (dicts with course_id, course_name, section_index, type, name and url,
+            snapshot age in seconds), or None if nothing is stored
+        """
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            snapshot = self._latest_snapshot(conn, key, kind)
+            rows = []
+            if snapshot:
+                query = (
+                    "SELECT a.course_id, c.name, a.section_index, a.type, a.name, a.url FROM activities a "
+                    "LEFT JOIN courses c ON c.snapshot_id = a.snapshot_id AND c.course_id = a.course_id "
+                    "WHERE a.snapshot_id = ?"
+                )
+                params: List[Any] = [snapshot[0]]
+                if course_id is not None:
+                    query += " AND a.course_id = ?"
+                    params.append(str(course_id))
+                if types:
+                    query += f" AND LOWER(a.type) IN ({', '.join('?' * len(types))})"
+                    params.extend(t.lower() for t in types)
+                rows = conn.execute(query + " ORDER BY a.rowid", params).fetchall()
+        finally:
+            conn.execute("COMMIT")
+
+        self._count_read(snapshot is not None)
+        if not snapshot:
+            return None
+        columns = ("course_id", "course_name", "section_index", "type", "name", "url")
+        return [dict(zip(columns, row)) for row in rows], time.time() - snapshot[1]
+
+    @staticmethod
+    def _latest_snapshot(conn: sqlite3.Connection, key: str, kind: str) -> Optional[Tuple[int, float]]:
+        """(id, created_at) of a user's most recent snapshot"""
+        return conn.execute(
+            "SELECT id, created_at FROM snapshots WHERE user_key = ? AND kind = ? ORDER BY created_at DESC LIMIT 1",
+            (key, kind)
+        ).fetchone()
+
+    def delete_user(self, key: str) -> int:
+        """
+        Forget every snapshot of a user
+
+        Returns:
+            Number of snapshots deleted
+        """
+        with self._write_lock:
+            deleted = self._connect().execute("DELETE FROM snapshots WHERE user_key = ?", (key,)).rowcount
+        with self._stats_lock:
+            self._stats["deleted"] += deleted
+        return deleted
+
+    def compact(self):
+        """Delete snapshots older than max_age, reclaim free pages and truncate the WAL"""
+        with self._write_lock:
+            conn = self._connect()
+            deleted = conn.execute(
+                "DELETE FROM snapshots WHERE created_at < ?", (time.time() - self.max_age,)
+            ).rowcount
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._last_compaction = time.time()
+        with self._stats_lock:
+            self._stats["compactions"] += 1
+            self._stats["deleted"] += deleted
+        if deleted:
+            logger.info(f"✓ Snapshot store compacted: {deleted} old snapshots removed")
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        snapshots, users = conn.execute("SELECT COUNT(*), COUNT(DISTINCT user_key) FROM snapshots").fetchone()
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        with self._stats_lock:
+            counters = dict(self._stats)
+        return {
+            **counters,
+            "snapshots": snapshots,
+            "users": users,
+            "size_bytes": page_count * page_size,
+        }
+
+    def close(self):
+        """Close this thread's connection (other threads' connections close with them)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _count_read(self, hit: bool):
+        with self._stats_lock:
+            self._stats["reads"] += 1
+            if hit:
+                self._stats["read_hits"] += 1
@@ -0,0 +1,132 @@
+"""
+Web Services 同步規劃
+
+一次同步只呼叫一次 core_webservice_get_site_info、core_enrol_get_users_courses
+與 mod_assign_get_assignments，之後每門課程只呼叫 core_course_get_contents
+（以並行上限同時進行），並統計 Web Service 呼叫次數與回應位元組數。
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+from .async_api_client import AsyncMoodleAPIClient
+from .moodle_api_client import WSCallStats
+from .progress import ProgressReporter
+from .resilience import CircuitBreaker, RetryPolicy
+from .rate_limiter import SiteRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# 課程完成函式：接收 (課程, 課程內容, 該課程的作業)
+CourseContentsCallback = Callable[[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]], None]
+
+
+class SyncPlanner:
+    """以最少的 Web Service 呼叫取得一次同步所需的全部資料"""
+
+    def __init__(
+        self,
+        base_url: str,
+        username: str = None,
+        password: str = None,
+        token: str = None,
+        max_concurrency: int = 4,
+        stats: Optional[WSCallStats] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        rate_limiter: Optional[SiteRateLimiter] = None
+    ):
+        """
+        Args:
+            base_url: Moodle 網站基礎 URL
+            username: 登入帳號（沒有 token 時用於獲取 token）
+            password: 登入密碼
+            token: 已取得的 Web Service Token（token 失效後重新獲取時，run() 結束後更新為新的 token）
+            max_concurrency: 同時進行的課程內容請求上限
+            stats: Web Service 呼叫統計（預設每次規劃各自統計）
+            retry_policy: 暫時性錯誤的重試策略
+            breaker: 網站的斷路器
+            rate_limiter: 網站的速率限制
+        """
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.token = token
+        self.max_concurrency = max_concurrency
+        self.stats = stats or WSCallStats()
+        self.retry_policy = retry_policy
+        self.breaker = breaker
+        self.rate_limiter = rate_limiter
+
+    async def run(
+        self,
+        on_course: Optional[CourseContentsCallback] = None,
+        progress: Optional[ProgressReporter] = None
+    ) -> Dict[str, Any]:
+        """
+        執行同步：網站資訊 -> 選課 -> 作業 -> 各課程內容（並行）
+
+        Args:
+            on_course: 每門課程內容取得後呼叫（用於串流輸出）
+            progress: 進度回報
+
+        Returns:
+            {'site_info', 'courses', 'assignments', 'contents': {課程 ID: 內容（獲取失敗時為 None）}, 'stats'}
+        """
+        async with AsyncMoodleAPIClient(
+            self.base_url,
+            self.username,
+            self.password,
+            token=self.token,
+            max_concurrency=self.max_concurrency,
+            stats=self.stats,
+            retry_policy=self.retry_policy,
+            breaker=self.breaker,
+            rate_limiter=self.rate_limiter
+        ) as client:
+            try:
+                progress = progress or ProgressReporter()
+                site_info = await client.get_site_info()
+                progress.emit('login', ok=True)
+
+                courses = await client.get_user_courses(user_id=site_info.get('userid'))
+                progress.courses_found(len(courses))
+                assignments = await client.get_assignments()
+
+                by_id = {int(course['id']): course for course in courses}
+
+                def course_done(course_id: int, contents: Optional[List[Dict[str, Any]]]):
+                    course = by_id[course_id]
+                    if contents is None:
+                        # 與沒有內容的課程區分，差異同步不會將其內容視為已刪除
+                        course['error'] = 'contents'
+                    if on_course:
+                        on_course(course, contents or [], [a for a in assignments if a['course_id'] == course['id']])
+                    progress.course_done(course)
+
+                contents = await client.get_courses_contents(list(by_id), on_done=course_done)
+            finally:
+                self.token = client.token
+
+        stats = self.stats.as_dict()
+        progress.emit('finished', courses=len(courses), **stats)
+        logger.info(
+            f"✓ 同步規劃完成: {len(courses)} 門課程，{stats['ws_calls']} 次 Web Service 呼叫，"
+            f"{stats['ws_bytes']} bytes"
+        )
+        return {
+            'site_info': site_info,
+            'courses': courses,
+            'assignments': assignments,
+            'contents': {str(course_id): sections for course_id, sections in contents.items()},
+            'stats': stats,
+        }
+
+    def run_sync(
+        self,
+        on_course: Optional[CourseContentsCallback] = None,
+        progress: Optional[ProgressReporter] = None
+    ) -> Dict[str, Any]:
+        """在目前（非事件迴圈）執行緒中執行 run()"""
+        return asyncio.run(self.run(on_course, progress))
@@ -0,0 +1,284 @@
+"""
+Structured logging and tracing spans
+
+Every log line carries the ID of the request or background job it belongs to,
+so the output of concurrent syncs can be told apart. Records are handed to a
+background thread through a queue, keeping console I/O off the scraping hot
+path, and can be written as JSON lines.
+
+Spans time the phases of a sync (login, course list, each course, adapter
+conversion) as a tree per request and are exported as JSON lines to a local
+file. With no exporter configured, span() and traced() do no work beyond one
+check.
+"""
+
+import functools
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+
+# Standard LogRecord attributes; anything else passed via extra= goes into JSON output
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id() -> Optional[str]:
+    """ID of the request or job the current code runs for (None outside one)"""
+    return _request_id.get()
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Attribute logs and spans within the block to a request or job
+
+    Args:
+        request_id: ID to use; a new one is generated when omitted
+
+    Yields:
+        The request ID
+    """
+    request_id = request_id or new_request_id()
+    token = _request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(token)
+
+
+def propagate(fn: Callable[..., T]) -> Callable[..., T]:
+    """
+    Wrap fn to run in the caller's context when called from another thread
+
+    Thread pools do not inherit context variables, so without this, logs and
+    spans of worker threads lose their request ID and parent span.
+    """
+    context = copy_context()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        # A Context can only be entered by one thread at a time
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds request_id and span_id of the emitting context to each record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get() or "-"
+        span = _current_span.get()
+        record.span_id = span.span_id if span else None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "span_id": getattr(record, "span_id", None),
+            "thread": record.threadName,
+        }
+        entry.update({
+            name: value for name, value in vars(record).items()
+            if name not in _RECORD_ATTRIBUTES and name not in entry
+        })
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str = "INFO", fmt: str = "text") -> logging.handlers.QueueListener:
+    """
+    Route all logging through a queue to a console handler on a background thread
+
+    Args:
+        level: Root log level (DEBUG shows every scraping step)
+        fmt: "json" for one JSON object per line, otherwise plain text
+
+    Returns:
+        The started listener (stop() it on shutdown to flush pending records)
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    records: "queue.Queue[logging.LogRecord]" = queue.Queue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    # Runs in the emitting thread, where the request context is still set
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level.upper())
+
+    listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+class Span:
+    """A timed operation within a request"""
+
+    __slots__ = ("name", "span_id", "parent_id", "trace_id", "attributes", "start", "_started", "duration", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = _request_id.get() or (parent.trace_id if parent else new_request_id())
+        self.attributes = attributes
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        """Add attributes (e.g. counts known only at the end of the operation)"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": datetime.fromtimestamp(self.start, timezone.utc).isoformat(),
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled"""
+
+    def set(self, **attributes: Any):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JsonSpanExporter:
+    """Appends finished spans to a file, one JSON object per line"""
+
+    def __init__(self, path: str):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self.exported = 0
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.exported += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+_exporter: Optional[JsonSpanExporter] = None
+
+
+def configure_tracing(path: Optional[str]) -> Optional[JsonSpanExporter]:
+    """
+    Export spans to a JSON lines file (None or "" disables tracing)
+
+    Returns:
+        The exporter, or None when disabled
+    """
+    global _exporter
+    if _exporter:
+        _exporter.close()
+    _exporter = JsonSpanExporter(path) if path else None
+    if _exporter:
+        logger.info(f"Tracing spans exported to {_exporter.path}")
+    return _exporter
+
+
+def tracing_stats() -> Optional[Dict[str, Any]]:
+    exporter = _exporter
+    return {"path": str(exporter.path), "exported": exporter.exported} if exporter else None
+
+
+def current_span():
+    """The innermost open span, or a no-op span outside one or while disabled"""
+    return _current_span.get() or NOOP_SPAN
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """
+    Time the block as a child of the current span
+
+    Args:
+        name: Operation name, e.g. "scraper.login"
+        attributes: Values recorded with the span
+
+    Yields:
+        The span (or NOOP_SPAN while tracing is disabled), to add attributes
+    """
+    exporter = _exporter
+    if exporter is None:
+        yield NOOP_SPAN
+        return
+
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.duration = time.perf_counter() - current._started
+        try:
+            exporter.export(current)
+        except Exception as e:
+            logger.warning(f"Failed to export span {name}: {e}")
+
+
+def traced(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Decorator running the function inside span(name)"""
+    def decorate(fn: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _exporter is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -44,6 +44,13 @@ export interface MoodleAssignment {
   description?: string
 }
 
+export interface MoodleSyncStats {
+  ws_calls: number
+  ws_bytes: number
+  ws_seconds: number
+  calls_by_function: Record<string, number>
+}
+
 export interface MoodleSyncResponse {
   success: boolean
   message: string
@@ -54,6 +61,69 @@ export interface MoodleSyncResponse {
     assignments: MoodleAssignment[]
     synced_at: string
   }
+  /** Web Services call statistics (API mode only) */
+  stats?: MoodleSyncStats
+}
+
+export interface MoodleChanges<TAdded, TRemoved = string> {
+  added: TAdded[]
+  changed: TAdded[]
+  removed: TRemoved[]
+}
+
+export interface MoodleDeltaSyncResponse {
+  success: boolean
+  message: string
+  courses_count: number
+  assignments_count: number
+  cursor?: string
+  full: boolean
+  changes_count: number
+  delta: {
+    courses: MoodleChanges<MoodleCourseDetail>
+    sections: MoodleChanges<
+      { course_id: string; section_key: string; section: MoodleCourseContent },
+      { course_id: string; section_key: string }
+    >
+    activities: MoodleChanges<
+      { course_id: string; section_key: string; activity: MoodleCourseContent['activities'][number] },
+      { course_id: string; section_key: string; activity_key: string }
+    >
+    assignments: MoodleChanges<MoodleAssignment>
+  }
+  synced_at?: string
+}
+
+export interface MoodleSyncJob {
+  job_id: string
+  status: 'queued' | 'running' | 'succeeded' | 'failed'
+  progress: {
+    phase?: string
+    courses_done?: number
+    courses_total?: number
+    [key: string]: unknown
+  }
+  created_at: string
+  started_at?: string
+  finished_at?: string
+  result?: MoodleSyncResponse
+  error?: string
+}
+
+export interface MoodleScheduledUser {
+  user_id: string
+  base_url: string
+  username: string
+  running: boolean
+  urgent: boolean
+  next_run_in: number
+  syncs: number
+  failures: number
+  registered_at: string
+  last_run_at?: string
+  last_success_at?: string
+  last_error?: string
+  next_deadline?: string
 }
 
 export interface MoodleLoginResponse {
@@ -70,6 +140,7 @@ export interface MoodleLoginResponse {
 export class MoodleClient {
   private baseUrl: string
   private apiKey: string
+  private etagCache = new Map<string, { etag: string; body: unknown }>()
 
   constructor() {
     this.baseUrl = process.env.MOODLE_SERVICE_URL || 'http://localhost:8000'
@@ -99,6 +170,10 @@ export class MoodleClient {
         throw new Error(error.detail || `HTTP ${response.status}`)
       }
 
+      if (response.status === 204) {
+        return undefined as T
+      }
+
       return response.json()
     } catch (error) {
       console.error(`Moodle API Error (${endpoint}):`, error)
@@ -106,6 +181,43 @@ export class MoodleClient {
     }
   }
 
+  /**
+   * GET with ETag revalidation: a 304 response reuses the last body
+   */
+  private async fetchConditional<T>(endpoint: string): Promise<T> {
+    const cached = this.etagCache.get(endpoint)
+    const url = `${this.baseUrl}${endpoint}`
+
+    try {
+      const response = await fetch(url, {
+        headers: {
+          'Content-Type': 'application/json',
+          'X-API-Key': this.apiKey,
+          ...(cached ? { 'If-None-Match': cached.etag } : {}),
+        },
+      })
+
+      if (response.status === 304 && cached) {
+        return cached.body as T
+      }
+
+      if (!response.ok) {
+        const error = await response.json().catch(() => ({ detail: 'Unknown error' }))
+        throw new Error(error.detail || `HTTP ${response.status}`)
+      }
+
+      const body = (await response.json()) as T
+      const etag = response.headers.get('ETag')
+      if (etag) {
+        this.etagCache.set(endpoint, { etag, body })
+      }
+      return body
+    } catch (error) {
+      console.error(`Moodle API Error (${endpoint}):`, error)
+      throw error
+    }
+  }
+
   /**
    * Test connection to Moodle service
    */
@@ -127,14 +239,14 @@ export class MoodleClient {
    * Get all courses
    */
   async getCourses(): Promise<MoodleCourse[]> {
-    return this.fetchWithAuth('/api/moodle/courses')
+    return this.fetchConditional('/api/moodle/courses')
   }
 
   /**
    * Get course detail with contents
    */
   async getCourseDetail(courseId: string): Promise<MoodleCourseDetail> {
-    return this.fetchWithAuth(`/api/moodle/courses/${courseId}`)
+    return this.fetchConditional(`/api/moodle/courses/${courseId}`)
   }
 
   /**
@@ -144,20 +256,92 @@ export class MoodleClient {
     const endpoint = courseId
       ? `/api/moodle/assignments?course_id=${courseId}`
       : '/api/moodle/assignments'
-    return this.fetchWithAuth(endpoint)
+    return this.fetchConditional(endpoint)
   }
 
   /**
-   * Perform full sync of Moodle data
+   * Sync and return only changes since the cursor of a previous delta sync
    *
-   * This operation may take several minutes depending on the number of courses.
+   * Store the returned cursor and pass it as `since` next time. When `full`
+   * is true the cursor was unknown and every item is reported as added.
+   */
+  async syncDelta(
+    credentials: MoodleCredentials,
+    since?: string
+  ): Promise<MoodleDeltaSyncResponse> {
+    return this.fetchWithAuth('/api/moodle/sync/delta', {
+      method: 'POST',
+      body: JSON.stringify({ ...credentials, since }),
+    })
+  }
+
+  /**
+   * Start a background sync job (returns immediately)
+   */
+  async startSync(credentials: MoodleCredentials): Promise<MoodleSyncJob> {
+    return this.fetchWithAuth('/api/moodle/sync?wait=false', {
+      method: 'POST',
+      body: JSON.stringify(credentials),
+    })
+  }
+
+  /**
+   * Get status, progress and result of a sync job
+   */
+  async getSyncJob(jobId: string): Promise<MoodleSyncJob> {
+    return this.fetchWithAuth(`/api/moodle/sync/${jobId}`)
+  }
+
+  /**
+   * Register a user for periodic background sync (keeps their reads cached)
    */
-  async syncAll(credentials: MoodleCredentials): Promise<MoodleSyncResponse> {
-    return this.fetchWithAuth('/api/moodle/sync', {
+  async scheduleSync(credentials: MoodleCredentials): Promise<MoodleScheduledUser> {
+    return this.fetchWithAuth('/api/moodle/scheduler/users', {
       method: 'POST',
       body: JSON.stringify(credentials),
     })
   }
+
+  /**
+   * Stop background sync for a registered user
+   */
+  async unscheduleSync(userId: string): Promise<void> {
+    await this.fetchWithAuth(`/api/moodle/scheduler/users/${userId}`, {
+      method: 'DELETE',
+    })
+  }
+
+  /**
+   * Perform full sync of Moodle data
+   *
+   * This operation may take several minutes depending on the number of courses,
+   * so it runs as a background job that is polled until it finishes.
+   */
+  async syncAll(
+    credentials: MoodleCredentials,
+    onProgress?: (job: MoodleSyncJob) => void,
+    pollIntervalMs = 2000
+  ): Promise<MoodleSyncResponse> {
+    let job = await this.startSync(credentials)
+
+    while (job.status === 'queued' || job.status === 'running') {
+      onProgress?.(job)
+      await new Promise((resolve) => setTimeout(resolve, pollIntervalMs))
+      job = await this.getSyncJob(job.job_id)
+    }
+
+    if (job.result) {
+      return job.result
+    }
+
+    return {
+      success: false,
+      message: job.error || 'Sync failed',
+      courses_count: 0,
+      assignments_count: 0,
+      data: { courses: [], assignments: [], synced_at: new Date().toISOString() },
+    }
+  }
 }
 
 // Singleton instance